@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""run_benchmarks.py times the utils.py hot paths on synthetic league data and records the results as JSON.
+
+For every scale (1x, 10x, 100x a 2019 season by default) a synthetic league is generated (see synthetic_league.py)
+and each benchmark is timed (best of --repeat runs) and then run once more under tracemalloc for its peak memory.
+
+Example:
+        python benchmarks/run_benchmarks.py --scales 1,10 --output benchmarks/results/run.json
+        python benchmarks/run_benchmarks.py --compare benchmarks/results/before.json benchmarks/results/after.json
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, os.pardir))
+
+from synthetic_league import generate_league
+from utils import (collect_and_plot_passes_nb, collect_stats_for_teams, flatten_out_games, get_avg_hangtime, get_event_counts,
+                   get_season_sequences, get_sequences)
+
+def get_benchmarks(teams_dict):
+    ''' The benchmarked calls for one synthetic league: list of (name, rows processed, zero-argument callable)
+    '''
+    teams_list = list(teams_dict.keys())
+    df_league = pd.concat(teams_dict.values(), ignore_index=True)
+    df_team = teams_dict[teams_list[0]]
+    ## get_sequences takes a single game, without its Cessation rows (as get_season_sequences feeds it)
+    df_game = df_team[(df_team['Date/Time'] == df_team['Date/Time'].iloc[0]) & (df_team['Event Type'] != 'Cessation')]
+    n_rows = len(df_league)
+    game_dict = collect_stats_for_teams(teams_dict)
+
+    return([('get_event_counts', n_rows, lambda: get_event_counts(df_league)),
+            ('get_event_counts[offense]', n_rows, lambda: get_event_counts(df_league, line='offense')),
+            ('get_avg_hangtime', n_rows, lambda: get_avg_hangtime(df_league)),
+            ('collect_stats_for_teams', n_rows, lambda: collect_stats_for_teams(teams_dict)),
+            ('flatten_out_games', len(game_dict), lambda: flatten_out_games(game_dict)),
+            ('get_sequences[one game]', len(df_game), lambda: get_sequences(df_game)),
+            ('get_season_sequences[one team season]', len(df_team), lambda: get_season_sequences(teams_dict, teams_list[:1])),
+            ('get_season_sequences', n_rows, lambda: get_season_sequences(teams_dict, teams_list)),
+            ('collect_and_plot_passes_nb[headless]', n_rows,
+             lambda: collect_and_plot_passes_nb(teams_list=teams_list, teams_dict=teams_dict, plot_output=None))])
+
+def time_call(func, repeat=3):
+    ''' Best wall time (seconds) of repeat calls, and the peak traced memory (bytes) of one more call
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return(min(times), peak)
+
+def get_run_metadata():
+    ''' Environment of the run, so results from different machines/commits can be told apart
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return({'timestamp':datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit':commit or None,
+            'python':platform.python_version(),
+            'pandas':pd.__version__,
+            'numpy':np.__version__,
+            'platform':platform.platform(),
+            'cpu_count':os.cpu_count()})
+
+def run_benchmarks(scales=(1, 10, 100), repeat=3, seed=0, only=None):
+    ''' Run every benchmark at every scale
+
+        Parameters:
+            scales           -     league sizes, in seasons
+            repeat           -     timed runs per benchmark (the best is kept)
+            seed             -     synthetic data seed
+            only             -     optional list of benchmark names to run
+
+        Returns:
+            results          -     dictionary with the run metadata and one record per (scale, benchmark)
+    '''
+    records = []
+    for scale in scales:
+        teams_dict = generate_league(scale=scale, seed=seed)
+        for name, n_rows, func in get_benchmarks(teams_dict):
+            if only and name not in only:
+                continue
+            seconds, peak = time_call(func, repeat=repeat)
+            records.append({'scale':scale, 'benchmark':name, 'rows':n_rows,
+                            'seconds':round(seconds, 6), 'peak_memory_mb':round(peak / 2**20, 3)})
+            print("{:>4}x  {:<40} {:>10} rows  {:>10.4f} s  {:>10.1f} MB".format(scale, name, n_rows, seconds, peak / 2**20))
+    return({'metadata':get_run_metadata(), 'seed':seed, 'repeat':repeat, 'results':records})
+
+def compare_results(before, after):
+    ''' Print the time and memory ratio (after / before) of the benchmarks present in both result files
+    '''
+    previous = {(r['scale'], r['benchmark']):r for r in before['results']}
+    for r in after['results']:
+        old = previous.get((r['scale'], r['benchmark']))
+        if old is None:
+            continue
+        print("{:>4}x  {:<40} time x{:.2f}   memory x{:.2f}".format(r['scale'], r['benchmark'],
+              r['seconds'] / old['seconds'] if old['seconds'] else float('nan'),
+              r['peak_memory_mb'] / old['peak_memory_mb'] if old['peak_memory_mb'] else float('nan')))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the utils.py hot paths on synthetic league data")
+    parser.add_argument('--scales', default='1,10,100', help="comma separated league sizes, in seasons")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', default=None, help="comma separated benchmark names to run")
+    parser.add_argument('--output', default=None, help="results JSON path (default benchmarks/results/benchmark_<timestamp>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two results files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            compare_results(json.load(f_before), json.load(f_after))
+        return
+
+    warnings.simplefilter('ignore')
+    results = run_benchmarks(scales=[int(s) for s in args.scales.split(',')], repeat=args.repeat, seed=args.seed,
+                             only=args.only.split(',') if args.only else None)
+
+    output = args.output or os.path.join(BENCHMARK_DIR, 'results',
+                                         'benchmark_{}.json'.format(datetime.datetime.now().strftime('%Y%m%d_%H%M%S')))
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print("Results written to {}".format(output))
+
+if __name__ == '__main__':
+    main()
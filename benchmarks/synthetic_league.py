@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""synthetic_league.py generates synthetic play-by-play with the same columns as the data/*-stats.csv files.
+
+Each season is a schedule of weekly games between n_teams teams.  Every game is simulated once and written from
+both teams' perspectives, the way the real files are: a team's file holds its own Offense events, the Defense
+events it saw (pulls, Ds, opponent throwaways and goals), Cessation events at the quarter breaks and, for
+"tracked" games, OpponentPull/OpponentCatch events and field coordinates.
+
+scale multiplies the number of seasons, so scale=10 is ten seasons (dates 2019..2028) of the same league.
+
+Example:
+        from synthetic_league import generate_league
+        teams_dict = generate_league(scale=1, seed=0)
+
+"""
+
+import datetime
+import os
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from league_loader import TEAM_NAMES
+
+COLUMNS = ['Date/Time', 'Tournamemnt', 'Opponent', 'Point Elapsed Seconds', 'Line', 'Our Score - End of Point',
+           'Their Score - End of Point', 'Event Type', 'Action', 'Passer', 'Receiver', 'Defender', 'Hang Time (secs)'] + \
+          ['Player {}'.format(i) for i in range(28)] + \
+          ['Elapsed Time (secs)', 'Begin Area', 'Begin X', 'Begin Y', 'End Area', 'End X', 'End Y',
+           'Distance Unit of Measure', 'Absolute Distance', 'Lateral Distance', 'Toward Our Goal Distance']
+
+FIELD_WIDTH_YDS = 53.3
+FIELD_LENGTH_YDS = 120.0
+ENDZONE_SHARE = 20.0 / 120.0
+THROW_ACTIONS = ['Catch', 'Goal', 'Throwaway', 'Drop', 'OpponentCatch', 'Pull', 'PullOb', 'D']
+
+def get_team_names(n_teams):
+    ''' Team names for the synthetic league: the 2019 teams first, then 'Team <n>'
+    '''
+    names = sorted(TEAM_NAMES.values())
+    return((names + ['Team {}'.format(i) for i in range(len(names), n_teams)])[:n_teams])
+
+def _simulate_game(py_rng, np_rng, rosters, tracked):
+    ''' Simulate one game between rosters[0] and rosters[1]
+
+        Returns:
+            sides            -     for each of the two teams, a list of (point, event type, action, passer, receiver, defender,
+                                   hang time, elapsed seconds) rows in game order
+            points           -     dictionary with the per-point lineups, lines, end scores and durations
+    '''
+    nan = float('nan')
+    sides = ([], [])
+    lineups = ([], [])
+    lines = ([], [])
+    end_scores = []
+    durations = []
+    scores = [0, 0]
+
+    n_points = py_rng.randint(34, 46)
+    cessations = {round(n_points/4) - 1:'EndOfFirstQuarter', round(n_points/2) - 1:'Halftime',
+                  round(3*n_points/4) - 1:'EndOfThirdQuarter', n_points - 1:'GameOver'}
+    pulling = py_rng.randint(0, 1)
+    clock = 0
+
+    for point in range(n_points):
+        receiving = 1 - pulling
+        for side in (0, 1):
+            lineups[side].append(py_rng.sample(rosters[side], 7))
+            lines[side].append('O' if side == receiving else 'D')
+        point_start = clock
+
+        puller = py_rng.choice(lineups[pulling][point])
+        if py_rng.random() < 0.07:
+            pull, hang = 'PullOb', nan
+        else:
+            pull, hang = 'Pull', (round(py_rng.gauss(6.3, 1.0), 3) if py_rng.random() < 0.8 else nan)
+        sides[pulling].append((point, 'Defense', pull, nan, nan, puller, hang, clock))
+        if tracked:
+            sides[receiving].append((point, 'Offense', 'Opponent' + pull, nan, nan, nan, nan, clock))
+        clock += py_rng.randint(5, 12)
+
+        offense = receiving
+        while True:
+            defense = 1 - offense
+            lineup = lineups[offense][point]
+            holder = py_rng.choice(lineup)
+            for _ in range(int(np_rng.negative_binomial(1.8, 0.25))):
+                receiver = py_rng.choice(lineup)
+                sides[offense].append((point, 'Offense', 'Catch', holder, receiver, nan, nan, clock))
+                if tracked:
+                    sides[defense].append((point, 'Defense', 'OpponentCatch', nan, nan, nan, nan, clock))
+                holder = receiver
+                clock += py_rng.randint(2, 6)
+
+            outcome = py_rng.random()
+            if outcome < 0.52:
+                sides[offense].append((point, 'Offense', 'Goal', holder, py_rng.choice(lineup), nan, nan, clock))
+                sides[defense].append((point, 'Defense', 'Goal', nan, nan, 'Anonymous', nan, clock))
+                scores[offense] += 1
+                break
+            elif outcome < 0.88:
+                sides[offense].append((point, 'Offense', 'Throwaway', holder, 'Anonymous', nan, nan, clock))
+                sides[defense].append((point, 'Defense', 'Throwaway', nan, nan, 'Anonymous', nan, clock))
+            elif outcome < 0.96:
+                sides[offense].append((point, 'Offense', 'Throwaway', holder, 'Anonymous', nan, nan, clock))
+                sides[defense].append((point, 'Defense', 'D', nan, nan, py_rng.choice(lineups[defense][point]), nan, clock))
+            else:
+                sides[offense].append((point, 'Offense', 'Drop', holder, py_rng.choice(lineup), nan, nan, clock))
+                sides[defense].append((point, 'Defense', 'Throwaway', nan, nan, 'Anonymous', nan, clock))
+            clock += py_rng.randint(3, 20)
+            offense = defense
+
+        end_scores.append(tuple(scores))
+        durations.append(clock - point_start)
+        if point in cessations:
+            for side in (0, 1):
+                sides[side].append((point, 'Cessation', cessations[point], nan, nan, nan, nan, clock))
+        pulling = offense
+        clock += py_rng.randint(40, 90)
+
+    points = {'lineups':lineups, 'lines':lines, 'end_scores':np.array(end_scores), 'durations':np.array(durations)}
+    return(sides, points)
+
+def _side_columns(rows, points, side, date_str, opponent):
+    ''' Column arrays of one team's view of a simulated game
+    '''
+    point, event_type, action, passer, receiver, defender, hang, elapsed = zip(*rows)
+    point = np.array(point)
+    lineup = np.array(points['lineups'][side], dtype=object)[point]
+
+    columns = {'Date/Time':np.full(len(rows), date_str, dtype=object),
+               'Tournamemnt':np.full(len(rows), 'AUDL', dtype=object),
+               'Opponent':np.full(len(rows), opponent, dtype=object),
+               'Point Elapsed Seconds':points['durations'][point],
+               'Line':np.array(points['lines'][side], dtype=object)[point],
+               'Our Score - End of Point':points['end_scores'][point, side],
+               'Their Score - End of Point':points['end_scores'][point, 1 - side],
+               'Event Type':np.array(event_type, dtype=object),
+               'Action':np.array(action, dtype=object),
+               'Passer':np.array(passer, dtype=object),
+               'Receiver':np.array(receiver, dtype=object),
+               'Defender':np.array(defender, dtype=object),
+               'Hang Time (secs)':np.array(hang, dtype=float),
+               'Elapsed Time (secs)':np.array(elapsed)}
+    for i in range(7):
+        columns['Player {}'.format(i)] = lineup[:, i]
+    return(columns)
+
+def _add_coordinates(df, tracked_rows, np_rng):
+    ''' Fill the field coordinate columns of the tracked games' throws, pulls and Ds
+    '''
+    rows = tracked_rows & df['Action'].isin(THROW_ACTIONS).to_numpy()
+    n = int(rows.sum())
+    begin = np_rng.random((n, 2))
+    end = np.clip(begin + np_rng.normal(0, [0.25, 0.12], (n, 2)), 0, 0.999)
+    dx = (end[:, 0] - begin[:, 0]) * FIELD_WIDTH_YDS
+    dy = (end[:, 1] - begin[:, 1]) * FIELD_LENGTH_YDS
+
+    def area(y):
+        return(np.where(y < ENDZONE_SHARE, 'Endzone A', np.where(y > 1 - ENDZONE_SHARE, 'Endzone B', 'Field')).astype(object))
+
+    df.loc[rows, 'Begin Area'] = area(begin[:, 1])
+    df.loc[rows, 'Begin X'] = begin[:, 0].round(3)
+    df.loc[rows, 'Begin Y'] = begin[:, 1].round(3)
+    df.loc[rows, 'End Area'] = area(end[:, 1])
+    df.loc[rows, 'End X'] = end[:, 0].round(3)
+    df.loc[rows, 'End Y'] = end[:, 1].round(3)
+    df.loc[rows, 'Distance Unit of Measure'] = 'yds'
+    df.loc[rows, 'Absolute Distance'] = np.hypot(dx, dy).round(1)
+    df.loc[rows, 'Lateral Distance'] = np.abs(dx).round(1)
+    df.loc[rows, 'Toward Our Goal Distance'] = dy.round(1)
+
+def generate_league(scale=1, n_teams=21, games_per_team=12, first_season=2019, tracked_share=0.1, roster_size=24, seed=0):
+    ''' Generate synthetic team season files
+
+        Parameters:
+            scale            -     number of seasons to generate (1 is about the size of the 2019 data)
+            n_teams          -     number of teams in the league
+            games_per_team   -     weeks in each season's schedule (each team plays at most once a week)
+            first_season     -     year of the first season
+            tracked_share    -     share of games with OpponentPull/OpponentCatch events and field coordinates
+            roster_size      -     players per team
+            seed             -     random seed
+
+        Returns:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe with the data/*-stats.csv columns
+    '''
+    py_rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    teams = get_team_names(n_teams)
+    rosters = {tm:['{} {}'.format(''.join(w[0] for w in tm.split()), k) for k in range(roster_size)] for tm in teams}
+
+    team_columns = {tm:[] for tm in teams}
+    team_tracked = {tm:[] for tm in teams}
+    for season in range(first_season, first_season + scale):
+        opening_day = datetime.date(season, 4, 6)
+        for week in range(games_per_team):
+            day = opening_day + datetime.timedelta(days=7*week)
+            date_str = '{}/{}/{} 0:00'.format(day.month, day.day, day.year)
+            schedule = list(teams)
+            py_rng.shuffle(schedule)
+            for team_a, team_b in zip(schedule[0::2], schedule[1::2]):
+                tracked = py_rng.random() < tracked_share
+                sides, points = _simulate_game(py_rng, np_rng, (rosters[team_a], rosters[team_b]), tracked)
+                for side, (tm, opponent) in enumerate([(team_a, team_b), (team_b, team_a)]):
+                    team_columns[tm].append(_side_columns(sides[side], points, side, date_str, opponent))
+                    team_tracked[tm].append(np.full(len(sides[side]), tracked))
+
+    teams_dict = {}
+    for tm in teams:
+        games = team_columns[tm]
+        n = sum(len(g['Action']) for g in games)
+        data = {}
+        for col in COLUMNS:
+            if col in games[0]:
+                data[col] = np.concatenate([g[col] for g in games])
+            elif col in ['Begin Area', 'End Area', 'Distance Unit of Measure'] or col.startswith('Player '):
+                data[col] = np.full(n, np.nan, dtype=object)
+            else:
+                data[col] = np.full(n, np.nan)
+        df = pd.DataFrame(data, columns=COLUMNS)
+        _add_coordinates(df, np.concatenate(team_tracked[tm]), np_rng)
+        teams_dict[tm] = df
+    return(teams_dict)
+
+def write_league(teams_dict, directory):
+    ''' Write a generated league as <TeamName><season>-stats.csv files, one file per team and season
+    '''
+    os.makedirs(directory, exist_ok=True)
+    for tm, df in teams_dict.items():
+        years = df['Date/Time'].str.split(' ').str[0].str.split('/').str[2]
+        for year, df_season in df.groupby(years, sort=True):
+            df_season.to_csv(os.path.join(directory, '{}{}-stats.csv'.format(tm.replace(' ', ''), year)), index=False)
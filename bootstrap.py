@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""bootstrap.py puts confidence intervals on the possession model fit and on the per-game turnover stats.
+
+Every resample of a team is a row of a weight matrix (how many times each game, or each possession, was drawn), so
+the resamples of a team are refit together with array operations instead of a Python loop:
+ - game resamples come from a (n_resamples x n_games) index matrix, turned into per-game weights
+ - possession resamples are drawn directly as multinomial catch count histograms, which is the same distribution
+   as resampling the possessions one by one
+ - the negative binomial refit (moments, or a vectorized golden section search for mle) works on the resampled
+   histograms, and the turnover medians/means on the resampled game values
+ - the parametric ('monte carlo') option simulates seasons from the fitted model and refits them
+
+Each team gets its own child of np.random.SeedSequence(seed), so results are reproducible and do not depend on the
+backend (see team_executor.map_teams) used to spread the teams over workers.
+
+Example:
+        from bootstrap import bootstrap_team_possession_models, bootstrap_turnover_stats
+        _, team_sequences, _ = collect_and_plot_passes_nb(teams_list, teams_dict, plot_output=None)
+        df_ci = bootstrap_team_possession_models(team_sequences, n_resamples=10000, seed=2019)
+        df_to_ci = bootstrap_turnover_stats(get_team_games(df_stats), seed=2019)
+
+"""
+
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from scipy.special import gammaln
+
+from team_executor import map_teams
+
+UNITS = ['game', 'possession', 'parametric']
+NB_STATS = ['nb_r', 'nb_probability', 'avg_passes', 'var_passes']
+TURNOVER_STATS = {'Median_O':('turnovers_committed', 'median'),
+                  'Median_D':('turnovers_forced', 'median'),
+                  'Mean_O':('turnovers_committed', 'mean'),
+                  'Mean_D':('turnovers_forced', 'mean')}
+CI_COLUMNS = ['estimate', 'mean', 'std_error', 'ci_low', 'ci_high']
+
+def get_resample_weights(n_units, n_resamples, rng):
+    ''' Bootstrap weights from a batched index matrix
+
+        Parameters:
+            n_units          -     number of units (games) to resample
+            n_resamples      -     number of resamples
+            rng              -     np.random.Generator
+
+        Returns:
+            weights          -     (n_resamples x n_units) array, weights[b, i] is how many times unit i is drawn in resample b
+    '''
+    idx = rng.integers(0, n_units, size=(n_resamples, n_units))
+    flat = (np.arange(n_resamples)[:, None] * n_units + idx).ravel()
+    return(np.bincount(flat, minlength=n_resamples * n_units).reshape(n_resamples, n_units))
+
+def resample_histogram(n_k, n_resamples, rng):
+    ''' Resample the possessions behind a catch count histogram
+
+        Returns:
+            histograms       -     (n_resamples x len(n_k)) array of resampled bincount histograms
+    '''
+    n = n_k.sum()
+    return(rng.multinomial(n, n_k / n, size=n_resamples))
+
+def simulate_histograms(r, p, n_possessions, n_simulations, rng, batch_size=1000):
+    ''' Monte Carlo seasons of n_possessions catch counts drawn from the negative binomial model
+
+        Returns:
+            histograms       -     (n_simulations x max count + 1) array of simulated bincount histograms
+    '''
+    blocks = []
+    for start in range(0, n_simulations, batch_size):
+        size = min(batch_size, n_simulations - start)
+        draws = rng.negative_binomial(r, p, size=(size, n_possessions))
+        width = draws.max() + 1
+        flat = (np.arange(size)[:, None] * width + draws).ravel()
+        blocks.append(np.bincount(flat, minlength=size * width).reshape(size, width))
+    width = max(block.shape[1] for block in blocks)
+    return(np.vstack([np.pad(block, ((0, 0), (0, width - block.shape[1]))) for block in blocks]))
+
+def get_histogram_moments(histograms):
+    ''' Mean and sample variance (ddof=1) of every row of a matrix of bincount histograms
+    '''
+    histograms = np.atleast_2d(histograms)
+    k = np.arange(histograms.shape[1])
+    n = histograms.sum(axis=1)
+    mu = histograms @ k / n
+    var = (histograms @ k**2 - n * mu**2) / (n - 1)
+    return(mu, var)
+
+def fit_nb_moments_batch(histograms):
+    ''' possession_model.fit_nb_moments of every row of a matrix of histograms
+         - rows without overdispersion (var <= mean) have no negative binomial fit and get NaN
+
+        Returns:
+            r, p             -     arrays of the fitted parameters
+    '''
+    mu, var = get_histogram_moments(histograms)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.where(var > mu, mu**2 / (var - mu), np.nan)
+        p = np.where(var > mu, mu / var, np.nan)
+    return(r, p)
+
+def get_nb_loglikelihood_batch(histograms, r, p):
+    ''' possession_model.get_nb_loglikelihood of every row of a matrix of histograms, with one (r, p) per row
+    '''
+    k = np.arange(histograms.shape[1])
+    r, p = r[:, None], p[:, None]
+    logpmf = gammaln(k + r) - gammaln(k + 1) - gammaln(r) + r * np.log(p) + k * np.log1p(-p)
+    return((histograms * np.where(histograms > 0, logpmf, 0)).sum(axis=1))
+
+def fit_nb_mle_batch(histograms, r_bounds=(1e-6, 1e6), n_iter=60):
+    ''' possession_model.fit_nb_mle of every row of a matrix of histograms
+         - r is found by a golden section search on log r run on all rows at once, with p = r/(r + mean)
+
+        Returns:
+            r, p             -     arrays of the fitted parameters
+    '''
+    mu, _ = get_histogram_moments(histograms)
+    profile = lambda log_r: -get_nb_loglikelihood_batch(histograms, np.exp(log_r), np.exp(log_r) / (np.exp(log_r) + mu))
+
+    golden = (np.sqrt(5) - 1) / 2
+    lo = np.full(len(mu), np.log(r_bounds[0]))
+    hi = np.full(len(mu), np.log(r_bounds[1]))
+    x1, x2 = hi - golden * (hi - lo), lo + golden * (hi - lo)
+    f1, f2 = profile(x1), profile(x2)
+    for _ in range(n_iter):
+        ## keep [lo, x2] where f1 < f2, else [x1, hi]; one of the two inner points carries over
+        left = f1 < f2
+        lo, hi = np.where(left, lo, x1), np.where(left, x2, hi)
+        x_new = np.where(left, hi - golden * (hi - lo), lo + golden * (hi - lo))
+        f_new = profile(x_new)
+        x1, x2, f1, f2 = (np.where(left, x_new, x2), np.where(left, x1, x_new),
+                          np.where(left, f_new, f2), np.where(left, f1, f_new))
+    r = np.exp((lo + hi) / 2)
+    p = r / (r + mu)
+    return(r, p)
+
+def fit_nb_batch(histograms, method='moments'):
+    ''' Negative binomial stats of every row of a matrix of histograms (the NB_STATS of possession_model.fit_possession_model)
+
+        Returns:
+            stats            -     dictionary key: stat name, value: array with one value per row
+    '''
+    histograms = np.atleast_2d(histograms)
+    if method == 'moments':
+        r, p = fit_nb_moments_batch(histograms)
+    elif method == 'mle':
+        r, p = fit_nb_mle_batch(histograms)
+    else:
+        raise ValueError("method must be 'moments' or 'mle', not {!r}".format(method))
+    _, var = get_histogram_moments(histograms)
+    return({'nb_r':r, 'nb_probability':p, 'avg_passes':r * (1 - p) / p, 'var_passes':var})
+
+def get_game_histograms(date_sequences):
+    ''' Catch count histogram of every game of a team (one row per game)
+         - like convert_date_sequences_to_list_and_count, the single largest count of the season is left out, so the
+           rows add up to the histogram of the team's counts
+
+        Parameters:
+            date_sequences   -     dictionary key: 'date | opponent', value: possessions of the game (see get_season_sequences)
+
+        Returns:
+            histograms       -     (n_games x max count + 1) array
+    '''
+    game_counts = [np.array([len(possession) - 1 for point in sequences.values() for possession in point], dtype=np.int64)
+                   for sequences in date_sequences.values()]
+    game_counts = [counts for counts in game_counts if len(counts) > 0]
+    width = max(counts.max() for counts in game_counts) + 1
+    histograms = np.vstack([np.bincount(counts, minlength=width) for counts in game_counts])
+    histograms[np.argmax(histograms[:, -1] > 0), -1] -= 1
+    return(histograms)
+
+def summarize_samples(estimates, samples, ci=0.95):
+    ''' Point estimate, bootstrap mean, standard error and percentile interval of each stat
+
+        Parameters:
+            estimates        -     dictionary key: stat, value: point estimate
+            samples          -     dictionary key: stat, value: array of resampled values
+            ci               -     confidence level
+
+        Returns:
+            df_ci            -     dataframe indexed by stat with the CI_COLUMNS
+    '''
+    tail = (1 - ci) / 2 * 100
+    rows = {}
+    for stat, values in samples.items():
+        values = np.asarray(values, dtype=float)
+        if np.isnan(values).all():
+            rows[stat] = [estimates[stat]] + [np.nan] * 4
+            continue
+        low, high = np.nanpercentile(values, [tail, 100 - tail])
+        rows[stat] = [estimates[stat], np.nanmean(values), np.nanstd(values, ddof=1), low, high]
+    return(pd.DataFrame.from_dict(rows, orient='index', columns=CI_COLUMNS))
+
+def _bootstrap_team_possessions(tm, task, unit='game', n_resamples=10000, method='moments', ci=0.95):
+    histograms, seed_seq = task
+    rng = np.random.default_rng(seed_seq)
+    n_k = histograms.sum(axis=0)
+    estimates = {stat:values[0] for stat, values in fit_nb_batch(n_k, method=method).items()}
+
+    if unit == 'game':
+        resampled = get_resample_weights(len(histograms), n_resamples, rng) @ histograms
+    elif unit == 'possession':
+        resampled = resample_histogram(n_k, n_resamples, rng)
+    else:
+        resampled = simulate_histograms(estimates['nb_r'], estimates['nb_probability'], int(n_k.sum()), n_resamples, rng)
+    return(summarize_samples(estimates, fit_nb_batch(resampled, method=method), ci=ci))
+
+def bootstrap_team_possession_models(team_sequences, teams_list=None, unit='game', n_resamples=10000, method='moments',
+                                     ci=0.95, seed=None, backend='serial', workers=None):
+    ''' Confidence intervals of every team's negative binomial possession model (see collect_and_plot_passes_nb)
+
+        Parameters:
+            team_sequences   -     dictionary key: team, value: possessions of each game (see get_season_sequences)
+            teams_list       -     teams to resample.  Leave blank for every team in team_sequences
+            unit             -     'game' resamples whole games, 'possession' resamples possessions, 'parametric' simulates
+                                   seasons from the fitted model (monte carlo)
+            n_resamples      -     number of resamples per team
+            method           -     'moments' or 'mle' fit (see possession_model.fit_possession_model)
+            ci               -     confidence level of the percentile intervals
+            seed             -     seed of the random generator, for reproducible intervals
+            backend          -     'serial', 'thread' or 'process' (see team_executor.map_teams)
+            workers          -     pool size for the 'thread' and 'process' backends
+
+        Returns:
+            df_ci            -     dataframe indexed by (team, stat) with the point estimate, bootstrap mean, standard error
+                                   and interval of nb_r, nb_probability, avg_passes and var_passes
+    '''
+    if unit not in UNITS:
+        raise ValueError("unit must be one of {}, not {!r}".format(UNITS, unit))
+    if teams_list is None:
+        teams_list = list(team_sequences.keys())
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(teams_list))
+    tasks = {tm:(get_game_histograms(team_sequences[tm]), seed_seq) for tm, seed_seq in zip(teams_list, seed_seqs)}
+
+    func = partial(_bootstrap_team_possessions, unit=unit, n_resamples=n_resamples, method=method, ci=ci)
+    results = map_teams(func, tasks, teams_list, backend=backend, workers=workers)
+    return(pd.concat(results, keys=teams_list, names=['team', 'stat']))
+
+def _bootstrap_team_turnovers(tm, task, n_resamples=10000, ci=0.95):
+    df_team, seed_seq = task
+    rng = np.random.default_rng(seed_seq)
+    idx = rng.integers(0, len(df_team), size=(n_resamples, len(df_team)))
+
+    estimates, samples = {}, {}
+    for stat, (column, how) in TURNOVER_STATS.items():
+        values = df_team[column].to_numpy(dtype=float)
+        aggregate = np.median if how == 'median' else np.mean
+        estimates[stat] = aggregate(values)
+        samples[stat] = aggregate(values[idx], axis=1)
+    return(summarize_samples(estimates, samples, ci=ci))
+
+def bootstrap_turnover_stats(team_games, teams_list=None, n_resamples=10000, ci=0.95, seed=None, backend='serial', workers=None):
+    ''' Confidence intervals of every team's median and mean turnovers committed (O) and forced (D) per game,
+        by resampling the team's games (see get_turnover_plot_data and get_team_season_summary)
+
+        Parameters:
+            team_games       -     the dataframe output from get_team_games
+            teams_list       -     teams to resample.  Leave blank for every team in team_games
+            n_resamples      -     number of resamples per team
+            ci               -     confidence level of the percentile intervals
+            seed             -     seed of the random generator, for reproducible intervals
+            backend          -     'serial', 'thread' or 'process' (see team_executor.map_teams)
+            workers          -     pool size for the 'thread' and 'process' backends
+
+        Returns:
+            df_ci            -     dataframe indexed by (team, stat) with the point estimate, bootstrap mean, standard error
+                                   and interval of Median_O, Median_D, Mean_O and Mean_D
+    '''
+    if teams_list is None:
+        teams_list = list(team_games.index.unique())
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(teams_list))
+    tasks = {tm:(team_games.loc[[tm]], seed_seq) for tm, seed_seq in zip(teams_list, seed_seqs)}
+
+    func = partial(_bootstrap_team_turnovers, n_resamples=n_resamples, ci=ci)
+    results = map_teams(func, tasks, teams_list, backend=backend, workers=workers)
+    return(pd.concat(results, keys=teams_list, names=['team', 'stat']))
+
+def get_error_bars(df_ci, stat, teams_list=None):
+    ''' Plotly error_y (or error_x) settings for one stat of a bootstrap output, asymmetric around the point estimate
+
+        Returns:
+            error_bars       -     dictionary to pass as error_y, in teams_list order
+    '''
+    df_stat = df_ci.xs(stat, level='stat')
+    if teams_list is not None:
+        df_stat = df_stat.reindex(teams_list)
+    return(dict(type='data', symmetric=False,
+                array=(df_stat['ci_high'] - df_stat['estimate']).to_numpy(),
+                arrayminus=(df_stat['estimate'] - df_stat['ci_low']).to_numpy()))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""game_cache.py memoizes the per-game stat functions (get_event_counts, get_avg_hangtime, ...) on game slices.
+
+Results are kept in a bounded LRU cache keyed by (function, team, Date/Time, opponent, line filter, data version):
+ - a game's rows are found through a (Date/Time, Opponent) -> row positions index built once per team frame (and a
+   Date/Time -> games index for calls without an opponent), instead of refiltering the whole frame on every call
+ - the data version is a hash of the team frame; it is recomputed whenever a different frame (told apart by a weak
+   reference, not by id) or a resized one is passed for the team, and old entries of the team are dropped.  After
+   editing a frame in place call invalidate_game_cache (or pass check_data=True)
+ - the cache is bounded both in number of entries and in (estimated) bytes, and keeps hit/miss/eviction counts
+
+Example:
+        from game_cache import cached_event_counts, get_cache_stats
+        counts_o, counts_d = cached_event_counts(teams_dict, 'San Jose Spiders', '4/20/2019 0:00', line='offense')
+        get_cache_stats()
+
+"""
+
+import hashlib
+import sys
+import threading
+import weakref
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from profiling import profile_stage
+from utils import get_avg_hangtime, get_event_counts
+
+def create_game_cache(max_entries=4096, max_bytes=32 * 2**20):
+    ''' A new, empty game cache
+
+        Parameters:
+            max_entries      -     most results kept before the least recently used ones are evicted
+            max_bytes        -     most (estimated) bytes of results kept before the least recently used ones are evicted
+
+        Returns:
+            cache            -     dictionary holding the LRU entries, the per-team game indexes and versions, and the counters
+    '''
+    cache = {'entries':OrderedDict(),
+             'max_entries':max_entries,
+             'max_bytes':max_bytes,
+             'bytes':0,
+             'teams':{},
+             'hits':0,
+             'misses':0,
+             'evictions':0,
+             'lock':threading.RLock()}
+    return(cache)
+
+## Used by the cached_* functions when no cache is passed
+DEFAULT_GAME_CACHE = create_game_cache()
+
+def get_data_version(df):
+    ''' Content hash of a team frame (values and index)
+    '''
+    row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    columns = '|'.join(map(str, df.columns)).encode()
+    return(hashlib.sha1(row_hashes.tobytes() + columns).hexdigest())
+
+def get_result_size(obj):
+    ''' Rough size in bytes of a cached result (dicts, lists, scalars, arrays and dataframes)
+    '''
+    if isinstance(obj, pd.DataFrame):
+        return(int(obj.memory_usage(deep=True).sum()))
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return(int(obj.memory_usage(deep=True)))
+    if isinstance(obj, np.ndarray):
+        return(obj.nbytes)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(get_result_size(k) + get_result_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(get_result_size(v) for v in obj)
+    return(size)
+
+def _get_team_state(cache, team_dict, team, check_data=False):
+    ''' Game index and data version of a team frame, rebuilt when the frame changed
+    '''
+    df = team_dict[team]
+    state = cache['teams'].get(team)
+    ## the frame is held through a weak reference: a new frame that reuses the id of a collected one is not mistaken for it
+    if state is not None and state['frame']() is df and state['shape'] == df.shape and not check_data:
+        return(df, state)
+
+    version = get_data_version(df)
+    if state is not None and state['version'] == version:
+        state.update({'frame':weakref.ref(df), 'shape':df.shape})
+        return(df, state)
+    if state is not None:
+        _drop_team_entries(cache, team)
+    games = df.groupby(['Date/Time', 'Opponent'], sort=False, dropna=False).indices
+    dates = {}
+    for kee in games.keys():
+        dates.setdefault(kee[0], []).append(kee)
+    state = {'frame':weakref.ref(df), 'shape':df.shape, 'version':version, 'games':games, 'dates':dates}
+    cache['teams'][team] = state
+    return(df, state)
+
+def _drop_team_entries(cache, team):
+    for key in [key for key in cache['entries'].keys() if key[1] == team]:
+        size = cache['entries'].pop(key)[1]
+        cache['bytes'] -= size
+
+def _evict(cache):
+    entries = cache['entries']
+    while entries and (len(entries) > cache['max_entries'] or cache['bytes'] > cache['max_bytes']):
+        _, (_, size) = entries.popitem(last=False)
+        cache['bytes'] -= size
+        cache['evictions'] += 1
+
+@profile_stage('game_filter', result_rows=len)
+def get_game_rows(team_dict, team, date_time, opponent=None, cache=None, check_data=False):
+    ''' The rows of one game in a team frame, through the cached game index
+
+        Parameters:
+            team_dict        -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            team             -     team whose frame to read
+            date_time        -     the game's 'Date/Time' value
+            opponent         -     the game's 'Opponent' value.  Leave blank for every game on date_time
+            cache            -     cache from create_game_cache.  Leave blank for DEFAULT_GAME_CACHE
+            check_data       -     rehash the team frame to catch in-place edits
+
+        Returns:
+            df_game          -     dataframe of the game's rows (empty if there is no such game)
+    '''
+    if cache is None:
+        cache = DEFAULT_GAME_CACHE
+    with cache['lock']:
+        df, state = _get_team_state(cache, team_dict, team, check_data)
+        if opponent is None:
+            positions = [state['games'][kee] for kee in state['dates'].get(date_time, [])]
+        else:
+            rows = state['games'].get((date_time, opponent))
+            positions = [] if rows is None else [rows]
+    if len(positions) == 0:
+        return(df.iloc[[]])
+    return(df.iloc[np.sort(np.concatenate(positions))])
+
+def cached_game_stat(func, team_dict, team, date_time, opponent=None, line=None, cache=None, check_data=False):
+    ''' Memoized func(game rows) or func(game rows, line=line)
+
+        Parameters:
+            func             -     per-game stat function taking a game's dataframe (and a line filter, when line is given)
+            team_dict        -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            team             -     team whose frame to read
+            date_time        -     the game's 'Date/Time' value
+            opponent         -     the game's 'Opponent' value.  Leave blank for every game on date_time
+            line             -     line filter passed on to func ('offense' or 'defense').  Leave blank for no filter
+            cache            -     cache from create_game_cache.  Leave blank for DEFAULT_GAME_CACHE
+            check_data       -     rehash the team frame to catch in-place edits
+
+        Returns:
+            result           -     func's output (shared with the cache: do not modify it)
+    '''
+    if cache is None:
+        cache = DEFAULT_GAME_CACHE
+    with cache['lock']:
+        _, state = _get_team_state(cache, team_dict, team, check_data)
+        key = (func.__module__ + '.' + func.__qualname__, team, date_time, opponent, line, state['version'])
+        entry = cache['entries'].get(key)
+        if entry is not None:
+            cache['entries'].move_to_end(key)
+            cache['hits'] += 1
+            return(entry[0])
+        cache['misses'] += 1
+
+    df_game = get_game_rows(team_dict, team, date_time, opponent, cache=cache)
+    result = func(df_game) if line is None else func(df_game, line=line)
+
+    with cache['lock']:
+        size = get_result_size(result)
+        if key not in cache['entries']:
+            cache['entries'][key] = (result, size)
+            cache['bytes'] += size
+            _evict(cache)
+    return(result)
+
+def cached_event_counts(team_dict, team, date_time, opponent=None, line=None, cache=None, check_data=False):
+    ''' Memoized get_event_counts of one game (see cached_game_stat)
+
+        Returns:
+            dict_out_off, dict_out_def   -     as get_event_counts
+    '''
+    return(cached_game_stat(get_event_counts, team_dict, team, date_time, opponent, line, cache, check_data))
+
+def cached_avg_hangtime(team_dict, team, date_time, opponent=None, cache=None, check_data=False):
+    ''' Memoized get_avg_hangtime of one game (see cached_game_stat)
+    '''
+    return(cached_game_stat(get_avg_hangtime, team_dict, team, date_time, opponent, None, cache, check_data))
+
+def invalidate_game_cache(team=None, cache=None):
+    ''' Drop the cached results (and game index) of one team, or of every team
+    '''
+    if cache is None:
+        cache = DEFAULT_GAME_CACHE
+    with cache['lock']:
+        if team is None:
+            cache['entries'].clear()
+            cache['teams'].clear()
+            cache['bytes'] = 0
+        else:
+            _drop_team_entries(cache, team)
+            cache['teams'].pop(team, None)
+
+def get_cache_stats(cache=None):
+    ''' Hit/miss statistics of a game cache
+
+        Returns:
+            stats            -     dictionary with hits, misses, hit_rate, evictions, entries, bytes, max_entries and max_bytes
+    '''
+    if cache is None:
+        cache = DEFAULT_GAME_CACHE
+    with cache['lock']:
+        calls = cache['hits'] + cache['misses']
+        stats = {'hits':cache['hits'], 'misses':cache['misses'], 'hit_rate':cache['hits'] / calls if calls else None,
+                 'evictions':cache['evictions'], 'entries':len(cache['entries']), 'bytes':cache['bytes'],
+                 'max_entries':cache['max_entries'], 'max_bytes':cache['max_bytes']}
+    return(stats)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""league_loader.py discovers and loads every team's season play-by-play file in a data directory.
+
+Files are expected to be named <TeamName><season>-stats.csv (e.g. data/AtlantaHustle2019-stats.csv).
+The result is the teams_dict (key: team_name, value: dataframe) that the utils functions accept.  When every season
+is loaded (season=None), a team's files are concatenated into one frame with a 'Season' column, oldest season first.
+
+Example:
+        from league_loader import load_league
+        teams_dict = load_league("data", season=2019)
+
+"""
+
+import os
+import re
+
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+
+from profiling import count_frame_rows, profile_stage
+
+## File name stem -> team name as it appears in the 'Opponent' column of the other teams' files
+TEAM_NAMES = {"AtlantaHustle":"Atlanta Hustle",
+              "AustinSol":"Austin Sol",
+              "ChicagoWildfire":"Chicago Wildfire",
+              "DCBreeze":"DC Breeze",
+              "DallasRoughnecks":"Dallas Roughnecks",
+              "DetroitMechanix":"Detroit Mechanix",
+              "IndianapolisAlleyCats":"Indianapolis AlleyCats",
+              "LosAngelesAviators":"Los Angeles Aviators",
+              "MadisonRadicals":"Madison Radicals",
+              "MinnesotaWindChill":"Minnesota Wind Chill",
+              "MontrealRoyal":"Montreal Royal",
+              "NewYorkEmpire":"New York Empire",
+              "OttawaOutlaws":"Ottawa Outlaws",
+              "PhiladelphiaPhoenix":"Philadelphia Phoenix",
+              "PittsburghThunderbirds":"Pittsburgh Thunderbirds",
+              "RaleighFlyers":"Raleigh Flyers",
+              "SanDiegoGrowlers":"San Diego Growlers",
+              "SanJoseSpiders":"San Jose Spiders",
+              "SeattleCascades":"Seattle Cascades",
+              "TampaBayCannons":"Tampa Bay Cannons",
+              "TorontoRush":"Toronto Rush"}
+
+## Team colors used in the season plots
+TEAM_COLORS = {"San Jose Spiders":'gold',
+               "Seattle Cascades":'midnightblue',
+               "Los Angeles Aviators":'crimson',
+               "San Diego Growlers":'black',
+               "Atlanta Hustle":'indigo',
+               "Austin Sol":'blue',
+               "Dallas Roughnecks":'whitesmoke',
+               "Raleigh Flyers":'red',
+               "Tampa Bay Cannons":'yellow',
+               "Indianapolis AlleyCats":'darkgreen',
+               "Chicago Wildfire":'orangered',
+               "Madison Radicals":'goldenrod',
+               "Minnesota Wind Chill":'lightsteelblue',
+               "Pittsburgh Thunderbirds":'orange',
+               "Detroit Mechanix":'maroon',
+               "DC Breeze":'navy',
+               "Philadelphia Phoenix":'firebrick',
+               "New York Empire":'limegreen',
+               "Toronto Rush":'tomato',
+               "Ottawa Outlaws":'olivedrab',
+               "Montreal Royal":'royalblue'}
+
+FILE_PATTERN = re.compile(r'^(?P<team>.+?)(?P<season>\d{4})-stats\.csv$')
+
+def get_team_name(file_stem):
+    ''' Map a file name stem (e.g. 'SanJoseSpiders') to the canonical team name
+         - teams not in TEAM_NAMES are split on their capital letters ('DCBreeze' -> 'DC Breeze')
+    '''
+    if file_stem in TEAM_NAMES:
+        return(TEAM_NAMES[file_stem])
+    name = re.sub(r'(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])', ' ', file_stem)
+    return(name)
+
+def find_team_files(directory="data", season=2019):
+    ''' Discover the team season files in a directory
+
+        Parameters:
+            directory        -     directory holding the <TeamName><season>-stats.csv files
+            season           -     season (year) to load.  Use None for files of every season
+
+        Returns:
+            team_files       -     list of (team_name, season, path) tuples, sorted by file name
+    '''
+    team_files = []
+    for file_name in sorted(os.listdir(directory)):
+        match = FILE_PATTERN.match(file_name)
+        if match is None:
+            continue
+        file_season = int(match.group('season'))
+        if season is not None and file_season != int(season):
+            continue
+        team_files.append((get_team_name(match.group('team')), file_season, os.path.join(directory, file_name)))
+    return(team_files)
+
+def _read_team_file(path, use_cache):
+    if use_cache:
+        from season_store import load_season_csv
+        return(load_season_csv(path))
+    return(pd.read_csv(path))
+
+@profile_stage('load', result_rows=lambda result: count_frame_rows(result[0] if isinstance(result, tuple) else result))
+def load_league(directory="data", season=2019, processes=None, use_cache=False, return_league_frame=False, validate=False,
+                issue_report=None, teams=None):
+    ''' Load every team file of a season into the teams_dict used by the utils functions
+         - the .csv files are parsed concurrently in a process pool
+         - with use_cache=True the files are read through the season_store columnar cache instead (in-process,
+           so the cached columns stay memory-mapped)
+         - with validate=True the frames are checked and cleaned once by validation.validate_league
+         - with season=None every season is loaded: each frame gets a 'Season' column and a team's seasons are
+           concatenated, so no file is dropped
+
+        Parameters:
+            directory            -     directory holding the <TeamName><season>-stats.csv files
+            season               -     season (year) to load.  Use None for every season
+            processes            -     number of worker processes.  Leave blank for one per CPU; 1 parses serially
+            use_cache            -     load through season_store.load_season_csv
+            return_league_frame  -     also return every team's rows in one dataframe with a 'Team' column
+            validate             -     clean the frames with validation.validate_league
+            issue_report         -     path of a .csv or .json file to write the validation issue report to (with validate)
+            teams                -     only load the files of these teams.  Leave blank for every team
+
+        Returns:
+            teams_dict           -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league            -     (only if return_league_frame) concatenated dataframe of all teams, with a 'Team' column
+    '''
+    all_team_files = find_team_files(directory, season=season)
+    team_files = [f for f in all_team_files if teams is None or f[0] in teams]
+    if len(team_files) == 0:
+        raise FileNotFoundError("No <Team>{}-stats.csv files found in {}".format(season, directory))
+
+    paths = [path for _, _, path in team_files]
+
+    if use_cache or processes == 1 or len(paths) == 1:
+        frames = [_read_team_file(path, use_cache) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            frames = list(executor.map(pd.read_csv, paths))
+
+    teams_dict = {}
+    for (tm, file_season, _), df in zip(team_files, frames):
+        if season is not None:
+            teams_dict[tm] = df
+            continue
+        df = df.assign(Season=file_season)
+        teams_dict[tm] = df if tm not in teams_dict else pd.concat([teams_dict[tm], df], ignore_index=True)
+
+    if validate:
+        from validation import validate_league, write_issue_report
+        team_names = list(TEAM_NAMES.values()) + [tm for tm, _, _ in all_team_files]
+        teams_dict, df_issues = validate_league(teams_dict, team_names=team_names)
+        if issue_report is not None:
+            write_issue_report(df_issues, issue_report)
+
+    if return_league_frame:
+        df_league = pd.concat([df.assign(Team=tm) for tm, df in teams_dict.items()], ignore_index=True)
+        return(teams_dict, df_league)
+    return(teams_dict)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""lineups.py measures how lines and player combinations do on the points they play together.
+
+The line of a point is read from the Player 0-27 columns of its first row.  Players become integer ids (one per team
+and name), so that:
+ - a line gets an order-independent 64 bit key: the wrapping sum of a splitmix64 hash of each of its player ids
+ - a pair or trio gets an exact integer key from its sorted ids (a * n_players + b, ...)
+The pairs/trios of every point are enumerated with index arrays, one batch per line size, and every stat is summed per
+key with np.unique/np.bincount.  Each point is credited to its line with: O/D points, holds, breaks, points scored and
+allowed, the team's possessions and turnovers, giving HoldRate, BreakRate, TurnoversPerPossession and
+ScoringEfficiency (points scored per possession).
+
+Example:
+        from lineups import get_lineup_stats, get_combination_stats
+        df_lines = get_lineup_stats(teams_dict, min_points=5)
+        df_pairs = get_combination_stats(teams_dict, size=2, min_points=20)
+
+"""
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from player_stats import PLACEHOLDER_PLAYERS, PLAYER_COLUMNS
+from point_table import get_league_frame, get_point_first_rows, get_point_ids, get_point_possessions, get_point_table
+
+## Offense actions that give the disc away
+TURNOVER_ACTIONS = ['Throwaway', 'Drop', 'Stall', 'Callahan']
+
+POINT_STAT_COLUMNS = ['Points', 'OPoints', 'DPoints', 'Holds', 'Breaks', 'Scored', 'Allowed', 'Possessions', 'Turnovers']
+LINEUP_STAT_COLUMNS = POINT_STAT_COLUMNS + ['HoldRate', 'BreakRate', 'TurnoversPerPossession', 'ScoringEfficiency']
+
+def splitmix64(values):
+    ''' splitmix64 hash of an integer array (uint64, wrapping arithmetic)
+    '''
+    z = np.asarray(values).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return(z ^ (z >> np.uint64(31)))
+
+def get_point_lines(df_league, point_ids, df_points):
+    ''' Player ids of the line of every point
+
+        Returns:
+            point_players    -     (n_points x 28) int64 array of player ids, sorted, padded with -1 after the last player
+            line_sizes       -     number of (known) players on each line
+            players          -     dataframe indexed by player id with the Team and Player name
+    '''
+    first = get_point_first_rows(point_ids)
+    names = df_league[PLAYER_COLUMNS].to_numpy(dtype=object)[first]
+    teams = np.repeat(df_points['Team'].to_numpy(dtype=object)[:, None], len(PLAYER_COLUMNS), axis=1)
+    known = pd.notna(names) & ~np.isin(names, PLACEHOLDER_PLAYERS)
+
+    df_known = pd.DataFrame({'Team':teams[known], 'Player':names[known]})
+    ids = np.full(names.shape, np.iinfo(np.int64).max)
+    ids[known] = df_known.groupby(['Team', 'Player'], sort=False).ngroup().to_numpy()
+    ids.sort(axis=1)
+    line_sizes = known.sum(axis=1)
+    ids[np.arange(ids.shape[1]) >= line_sizes[:, None]] = -1
+
+    players = df_known.drop_duplicates().reset_index(drop=True).rename_axis('player_id')
+    return(ids, line_sizes, players)
+
+def get_point_stats(df_league, point_ids, df_points):
+    ''' Stats credited to the line of every point (the POINT_STAT_COLUMNS), indexed like df_points
+    '''
+    offense = (df_league['Event Type'] == 'Offense').to_numpy()
+    turnover_rows = (point_ids >= 0) & offense & df_league['Action'].isin(TURNOVER_ACTIONS).to_numpy()
+    n_points = len(df_points)
+    line = df_points['Line'].to_numpy(dtype=object)
+    df_point_stats = pd.DataFrame({'Points':np.ones(n_points, dtype=np.int64),
+                                   'OPoints':(line == 'O').astype(np.int64),
+                                   'DPoints':(line == 'D').astype(np.int64),
+                                   'Holds':df_points['Hold'].to_numpy().astype(np.int64),
+                                   'Breaks':df_points['Break'].to_numpy().astype(np.int64),
+                                   'Scored':df_points['Scored'].to_numpy().astype(np.int64),
+                                   'Allowed':df_points['Allowed'].to_numpy().astype(np.int64),
+                                   'Possessions':get_point_possessions(df_league, point_ids, event_type='Offense')[df_points.index],
+                                   'Turnovers':np.bincount(point_ids[turnover_rows], minlength=n_points)[df_points.index]},
+                                  index=df_points.index)
+    return(df_point_stats)
+
+def create_lineup_table(teams_dict=None, df_league=None):
+    ''' Lines and per-point stats of a season, shared by get_lineup_stats and get_combination_stats
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+
+        Returns:
+            lineup_table     -     dictionary with point_players, line_sizes, players (see get_point_lines), lineup_keys
+                                   (uint64 key of every point's line), df_points and df_point_stats
+    '''
+    if df_league is None:
+        df_league = get_league_frame(teams_dict)
+    df_league = df_league.reset_index(drop=True)
+    point_ids = get_point_ids(df_league)
+    df_points = get_point_table(df_league, point_ids)
+
+    point_players, line_sizes, players = get_point_lines(df_league, point_ids, df_points)
+    lineup_keys = np.where(point_players >= 0, splitmix64(point_players), np.uint64(0)).sum(axis=1, dtype=np.uint64)
+
+    lineup_table = {'point_players':point_players,
+                    'line_sizes':line_sizes,
+                    'players':players,
+                    'lineup_keys':lineup_keys,
+                    'df_points':df_points,
+                    'df_point_stats':get_point_stats(df_league, point_ids, df_points)}
+    return(lineup_table)
+
+def aggregate_point_stats(keys, point_rows, df_point_stats):
+    ''' Sum the point stats of every key and add the rates
+
+        Parameters:
+            keys             -     integer key of every (point, group) pair
+            point_rows       -     position in df_point_stats of the point of every pair
+
+        Returns:
+            df_groups        -     dataframe indexed by key with the LINEUP_STAT_COLUMNS
+            first            -     position (in keys) of the first pair of every key
+    '''
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    point_values = df_point_stats[POINT_STAT_COLUMNS].to_numpy()
+    sums = {column:np.bincount(inverse, weights=point_values[point_rows, i], minlength=len(unique_keys)).astype(np.int64)
+            for i, column in enumerate(POINT_STAT_COLUMNS)}
+    df_groups = pd.DataFrame(sums, index=pd.Index(unique_keys, name='key'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df_groups['HoldRate'] = df_groups['Holds'] / df_groups['OPoints']
+        df_groups['BreakRate'] = df_groups['Breaks'] / df_groups['DPoints']
+        df_groups['TurnoversPerPossession'] = df_groups['Turnovers'] / df_groups['Possessions']
+        df_groups['ScoringEfficiency'] = df_groups['Scored'] / df_groups['Possessions']
+    return(df_groups, first)
+
+def get_player_names(lineup_table, player_ids):
+    ''' 'name, name, ...' of every row of a matrix of player ids (-1 entries are skipped)
+    '''
+    names = np.array(lineup_table['players']['Player'].tolist() + [''], dtype=object)[player_ids]
+    return([', '.join(name for name in row if name) for row in names.tolist()])
+
+def get_lineup_stats(teams_dict=None, df_league=None, lineup_table=None, line_size=7, min_points=0):
+    ''' Stats of every full line (set of players on the field for a point, in any order)
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+            lineup_table     -     alternatively, the output of create_lineup_table
+            line_size        -     only count points with this many known players.  Use None for every point
+            min_points       -     only return lines that played at least this many points
+
+        Returns:
+            df_lineups       -     dataframe indexed by the line key with Team, Players, Size and the LINEUP_STAT_COLUMNS,
+                                   sorted by points played
+    '''
+    if lineup_table is None:
+        lineup_table = create_lineup_table(teams_dict, df_league)
+    point_rows = np.arange(len(lineup_table['lineup_keys']))
+    if line_size is not None:
+        point_rows = point_rows[lineup_table['line_sizes'] == line_size]
+
+    df_lineups, first = aggregate_point_stats(lineup_table['lineup_keys'][point_rows], point_rows,
+                                              lineup_table['df_point_stats'])
+    first_rows = point_rows[first]
+    df_lineups.insert(0, 'Team', lineup_table['df_points']['Team'].to_numpy()[first_rows])
+    df_lineups.insert(1, 'Players', get_player_names(lineup_table, lineup_table['point_players'][first_rows]))
+    df_lineups.insert(2, 'Size', lineup_table['line_sizes'][first_rows])
+    df_lineups = df_lineups[df_lineups['Points'] >= min_points]
+    return(df_lineups.sort_values('Points', ascending=False, kind='stable'))
+
+def get_combination_keys(lineup_table, size=2):
+    ''' Every (point, pair/trio of its players) of a season
+
+        Returns:
+            keys             -     int64 key of each combination (its sorted player ids in base n_players)
+            point_rows       -     point of each combination
+            combination_ids  -     (n x size) array of the player ids of each combination
+    '''
+    point_players = lineup_table['point_players']
+    line_sizes = lineup_table['line_sizes']
+    n_players = len(lineup_table['players'])
+    weights = n_players ** np.arange(size - 1, -1, -1, dtype=np.int64)
+
+    keys, point_rows, combination_ids = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros((0, size), dtype=np.int64)]
+    for line_size in np.unique(line_sizes[line_sizes >= size]).tolist():
+        rows = np.flatnonzero(line_sizes == line_size)
+        index = np.array(list(combinations(range(line_size), size)))
+        ids = point_players[rows][:, index]
+        keys.append((ids @ weights).ravel())
+        point_rows.append(np.repeat(rows, len(index)))
+        combination_ids.append(ids.reshape(-1, size))
+    return(np.concatenate(keys), np.concatenate(point_rows), np.concatenate(combination_ids))
+
+def get_combination_stats(teams_dict=None, df_league=None, lineup_table=None, size=2, min_points=0):
+    ''' Stats of every pair (size=2) or trio (size=3) of teammates over the points they played together
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+            lineup_table     -     alternatively, the output of create_lineup_table
+            size             -     number of players in a combination
+            min_points       -     only return combinations that played at least this many points together
+
+        Returns:
+            df_combinations  -     dataframe indexed by the combination key with Team, Players and the LINEUP_STAT_COLUMNS,
+                                   sorted by points played
+    '''
+    if lineup_table is None:
+        lineup_table = create_lineup_table(teams_dict, df_league)
+    keys, point_rows, combination_ids = get_combination_keys(lineup_table, size=size)
+
+    df_combinations, first = aggregate_point_stats(keys, point_rows, lineup_table['df_point_stats'])
+    df_combinations.insert(0, 'Team', lineup_table['df_points']['Team'].to_numpy()[point_rows[first]])
+    df_combinations.insert(1, 'Players', get_player_names(lineup_table, combination_ids[first]))
+    df_combinations = df_combinations[df_combinations['Points'] >= min_points]
+    return(df_combinations.sort_values('Points', ascending=False, kind='stable'))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""markov_model.py models possessions as absorbing Markov chains of their actions.
+
+The chain has a Start state, one transient state per action that keeps the possession alive (Catch, OpponentPull,
+D, ...), and three absorbing states: Goal, Turnover (Throwaway, Drop, Stall, Callahan) and End (the possession
+stops on another action, e.g. at the end of a quarter).  Transition counts of every team are built in one pass over
+the int8 action stream of possession_table: consecutive actions of a possession, Start -> first action and last
+action -> End, keyed by (team, from, to) and counted with np.unique, then stored as scipy.sparse matrices.
+
+Absorption probabilities come from the fundamental matrix: B = (I - Q)^-1 R is solved with a sparse solver, where Q
+holds the transient -> transient and R the transient -> absorbing transition probabilities.  B[Start, Goal] is the
+probability that a possession ends in a goal.  Matrices are cached in the possession table under a filter name and a
+fingerprint of the mask, and any boolean mask over the possessions (see get_possession_context for O line, quarter
+and score margin) can be used.  Teams without a possession in the selection get NaN probabilities.
+
+Example:
+        from possession_table import create_possession_table
+        from markov_model import get_transition_matrices, get_team_absorption, get_possession_context
+        table = create_possession_table(teams_dict)
+        get_team_absorption(table)
+        context = get_possession_context(table)
+        get_team_absorption(table, mask=(context['Line'] == 'O').to_numpy(), cache_key='o_line')
+
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from point_table import get_point_table
+from possession_table import ACTIONS
+
+TERMINAL_ACTIONS = {'Goal':'Goal', 'Throwaway':'Turnover', 'Drop':'Turnover', 'Stall':'Turnover', 'Callahan':'Turnover'}
+ABSORBING_STATES = ['Goal', 'Turnover', 'End']
+TRANSIENT_STATES = ['Start'] + [action for action in ACTIONS if action not in TERMINAL_ACTIONS] + ['Other']
+STATES = TRANSIENT_STATES + ABSORBING_STATES
+
+def get_state_codes():
+    ''' Chain state of every action code, as an array indexed by action code + 1 (code -1 is an unknown action)
+    '''
+    states = [STATES.index('Other')]
+    for action in ACTIONS:
+        states.append(STATES.index(TERMINAL_ACTIONS[action]) if action in TERMINAL_ACTIONS else STATES.index(action))
+    return(np.array(states, dtype=np.int64))
+
+def get_transitions(table, possession_rows=None):
+    ''' Every transition of the selected possessions
+
+        Parameters:
+            table            -     output of possession_table.create_possession_table
+            possession_rows  -     positions of the possessions to use.  Leave blank for every possession
+
+        Returns:
+            possession_index -     position in table['possessions'] of the possession of each transition
+            from_states      -     state each transition leaves (index in STATES)
+            to_states        -     state each transition enters (index in STATES)
+    '''
+    possessions = table['possessions']
+    if possession_rows is None:
+        possession_rows = np.arange(len(possessions))
+    starts = possessions['start_row'][possession_rows]
+    lengths = possessions['end_row'][possession_rows] - starts
+
+    ## stream positions of the selected possessions, and the chain state of each
+    owner = np.repeat(np.arange(len(possession_rows)), lengths)
+    positions = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths) + np.arange(lengths.sum())
+    states = get_state_codes()[table['action_codes'][positions].astype(np.int64) + 1]
+
+    first = np.r_[0, np.cumsum(lengths)[:-1]][lengths > 0]
+    last = np.cumsum(lengths)[lengths > 0] - 1
+    inner = np.flatnonzero(owner[1:] == owner[:-1]) if len(owner) > 0 else np.zeros(0, dtype=np.int64)
+    ## nothing leaves an absorbing state; possessions stopping on a transient state go to End
+    inner = inner[states[inner] < len(TRANSIENT_STATES)]
+    open_last = last[states[last] < len(TRANSIENT_STATES)]
+
+    possession_index = np.concatenate([owner[first], owner[inner], owner[open_last]])
+    from_states = np.concatenate([np.full(len(first), STATES.index('Start')), states[inner], states[open_last]])
+    to_states = np.concatenate([states[first], states[inner + 1], np.full(len(open_last), STATES.index('End'))])
+    return(possession_rows[possession_index], from_states, to_states)
+
+def get_mask_fingerprint(mask):
+    ''' sha1 of the selected possession positions of a mask (None for no mask)
+    '''
+    if mask is None:
+        return(None)
+    return(hashlib.sha1(np.flatnonzero(mask).astype(np.int64).tobytes()).hexdigest())
+
+def get_transition_matrices(table, mask=None, cache_key=None):
+    ''' Transition count matrices of every team and of the league
+
+        Parameters:
+            table            -     output of possession_table.create_possession_table
+            mask             -     boolean array over table['possessions'] selecting the possessions to count.
+                                   Leave blank for every possession
+            cache_key        -     name under which the matrices are cached in the table (e.g. 'o_line'), together with
+                                   the mask fingerprint, so reusing a name with another mask does not return stale
+                                   matrices.  Leave blank not to cache a masked selection; the unmasked matrices are
+                                   cached under 'all'
+
+        Returns:
+            matrices         -     dictionary key: team (and 'all' for the league), value: scipy.sparse csr matrix of
+                                   transition counts, rows and columns in STATES order
+    '''
+    if cache_key is None and mask is None:
+        cache_key = 'all'
+    cache = table.setdefault('markov_cache', {})
+    if cache_key is not None:
+        cache_key = (cache_key, get_mask_fingerprint(mask))
+        if cache_key in cache:
+            return(cache[cache_key])
+
+    possession_rows = np.arange(len(table['possessions'])) if mask is None else np.flatnonzero(mask)
+    possession_index, from_states, to_states = get_transitions(table, possession_rows)
+
+    n_states = len(STATES)
+    teams = table['games']['Team'].to_numpy(dtype=object)
+    team_names, team_codes = np.unique(teams, return_inverse=True)
+    groups = team_codes[table['possessions']['game_id'][possession_index]]
+    keys, counts = np.unique((groups * n_states + from_states) * n_states + to_states, return_counts=True)
+    key_groups, key_cells = np.divmod(keys, n_states * n_states)
+    key_from, key_to = np.divmod(key_cells, n_states)
+
+    matrices = {}
+    bounds = np.searchsorted(key_groups, np.arange(len(team_names) + 1))
+    for g, tm in enumerate(team_names.tolist()):
+        cells = slice(bounds[g], bounds[g + 1])
+        matrices[tm] = sparse.csr_matrix((counts[cells], (key_from[cells], key_to[cells])), shape=(n_states, n_states))
+    matrices['all'] = sparse.csr_matrix((counts, (key_from, key_to)), shape=(n_states, n_states))
+
+    if cache_key is not None:
+        cache[cache_key] = matrices
+    return(matrices)
+
+def get_transition_probabilities(counts):
+    ''' Row-normalized transition matrix of a count matrix (rows without transitions stay empty)
+    '''
+    totals = np.asarray(counts.sum(axis=1)).ravel()
+    scale = np.divide(1.0, totals, out=np.zeros(len(totals)), where=totals > 0)
+    return(sparse.diags(scale) @ counts)
+
+def get_absorption_probabilities(counts):
+    ''' Probability of ending in each absorbing state, from every transient state
+
+        Parameters:
+            counts           -     transition count matrix (see get_transition_matrices)
+
+        Returns:
+            df_absorption    -     dataframe indexed by TRANSIENT_STATES with one column per ABSORBING_STATES and the
+                                   ExpectedActions (expected number of transitions before absorption)
+    '''
+    n_transient = len(TRANSIENT_STATES)
+    P = get_transition_probabilities(sparse.csr_matrix(counts, dtype=float))
+    Q = P[:n_transient, :n_transient]
+    R = P[:n_transient, n_transient:]
+    fundamental = sparse.identity(n_transient, format='csc') - Q.tocsc()
+    B = spsolve(fundamental, R.toarray())
+    expected_actions = spsolve(fundamental, np.ones(n_transient))
+    ## states that were never left have no outgoing probability: they absorb nowhere and take no steps
+    reached = np.asarray(P[:n_transient].sum(axis=1)).ravel() > 0
+    df_absorption = pd.DataFrame(np.atleast_2d(B), index=TRANSIENT_STATES, columns=ABSORBING_STATES)
+    df_absorption['ExpectedActions'] = np.where(reached, expected_actions, 0)
+    return(df_absorption)
+
+def get_team_absorption(table, mask=None, cache_key=None):
+    ''' Possession outcome probabilities of every team (and the league, 'all'), from the Start state
+
+        Parameters:
+            table            -     output of possession_table.create_possession_table
+            mask             -     boolean array over table['possessions'] (see get_transition_matrices)
+            cache_key        -     cache name of the masked selection (see get_transition_matrices)
+
+        Returns:
+            df_teams         -     dataframe indexed by team with the Goal, Turnover and End probabilities of a possession,
+                                   its ExpectedActions and the number of Possessions used, sorted by Goal probability.
+                                   Teams without possessions in the selection get NaN and are listed last
+    '''
+    matrices = get_transition_matrices(table, mask=mask, cache_key=cache_key)
+    start = STATES.index('Start')
+    rows = {}
+    for tm, counts in matrices.items():
+        n_possessions = int(counts[start].sum())
+        if n_possessions == 0:
+            rows[tm] = [np.nan] * (len(ABSORBING_STATES) + 1) + [0]
+            continue
+        absorption = get_absorption_probabilities(counts).loc['Start']
+        rows[tm] = absorption.tolist() + [n_possessions]
+    df_teams = pd.DataFrame.from_dict(rows, orient='index', columns=ABSORBING_STATES + ['ExpectedActions', 'Possessions'])
+    return(df_teams.sort_values('Goal', ascending=False))
+
+def get_possession_context(table):
+    ''' Point context of every possession, to build masks: Team, Line, Quarter and ScoreMargin (our score minus theirs
+        at the start of the point)
+
+        Returns:
+            df_context       -     dataframe aligned with table['possessions']
+    '''
+    df_points = table.get('df_points')
+    if df_points is None:
+        df_points = get_point_table(table['df_league'])
+        table['df_points'] = df_points
+    point_ids = table['possessions']['point_id']
+    df_context = df_points.loc[point_ids, ['Team', 'Line', 'Quarter', 'StartOurScore', 'StartTheirScore']].reset_index(drop=True)
+    df_context['ScoreMargin'] = df_context['StartOurScore'] - df_context['StartTheirScore']
+    return(df_context[['Team', 'Line', 'Quarter', 'ScoreMargin']])
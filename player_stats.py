@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""player_stats.py computes per-game and season player stats for every player in the league.
+
+Every stat is counted with vectorized masks and a melt of the Player 0-27 line columns, never row by row:
+ - event stats (completions, catches, assists, goals, Ds, throwaways, drops) credit the Passer/Receiver/Defender of the event
+ - points played count each player once per point (a point's rows repeat its line), split into O and D points
+ - PlusMinus is goals + assists + Ds - throwaways - drops; PointsFor/PointsAgainst are the points scored/allowed on field
+
+Example:
+        from player_stats import get_player_season_stats, get_player_leaderboard
+        df_players = get_player_season_stats(teams_dict)
+        get_player_leaderboard(df_players, 'Goals')
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from point_table import GAME_COLUMNS, get_league_frame, get_point_ids, get_point_table
+
+PLAYER_COLUMNS = ['Player {}'.format(i) for i in range(28)]
+
+## Names the stat keepers use when a player is unknown
+PLACEHOLDER_PLAYERS = ['Anonymous', 'Player']
+
+## Stat -> (event type, actions, column of the credited player)
+EVENT_STATS = [('Completions', 'Offense', ['Catch', 'Goal'], 'Passer'),
+               ('Catches', 'Offense', ['Catch', 'Goal'], 'Receiver'),
+               ('Assists', 'Offense', ['Goal'], 'Passer'),
+               ('Goals', 'Offense', ['Goal'], 'Receiver'),
+               ('Goals', 'Defense', ['Callahan'], 'Defender'),
+               ('Ds', 'Defense', ['D', 'Callahan'], 'Defender'),
+               ('Throwaways', 'Offense', ['Throwaway', 'Callahan'], 'Passer'),
+               ('Drops', 'Offense', ['Drop'], 'Receiver')]
+
+PLAYER_STAT_COLUMNS = ['PointsPlayed', 'OPointsPlayed', 'DPointsPlayed', 'Completions', 'Catches', 'Assists', 'Goals', 'Ds',
+                       'Throwaways', 'Drops', 'PlusMinus', 'PointsFor', 'PointsAgainst']
+
+def get_points_played(df_league, point_ids, df_points):
+    ''' Points played per player and game, counting each player once per point
+
+        Parameters:
+            df_league        -     dataframe of play-by-play rows with a 'Team' column
+            point_ids        -     output of point_table.get_point_ids(df_league)
+            df_points        -     output of point_table.get_point_table(df_league, point_ids)
+
+        Returns:
+            df_played        -     dataframe indexed by GAME_COLUMNS + ['Player'] with PointsPlayed, OPointsPlayed,
+                                   DPointsPlayed, PointsFor and PointsAgainst
+    '''
+    in_point = point_ids >= 0
+    ## most rows of a point repeat the same line, so drop them before melting
+    lines = df_league.loc[in_point, PLAYER_COLUMNS].assign(point=point_ids[in_point]).drop_duplicates()
+    on_field = lines.melt(id_vars='point', value_name='Player')[['point', 'Player']].dropna()
+    on_field = on_field[~on_field['Player'].isin(PLACEHOLDER_PLAYERS)].drop_duplicates()
+
+    point_info = df_points.loc[on_field['point'].to_numpy()]
+    df_played = pd.DataFrame({'Team':point_info['Team'].to_numpy(),
+                              'Date/Time':point_info['Date/Time'].to_numpy(),
+                              'Opponent':point_info['Opponent'].to_numpy(),
+                              'Player':on_field['Player'].to_numpy(),
+                              'PointsPlayed':1,
+                              'OPointsPlayed':(point_info['Line'] == 'O').to_numpy().astype(np.int64),
+                              'DPointsPlayed':(point_info['Line'] == 'D').to_numpy().astype(np.int64),
+                              'PointsFor':point_info['Scored'].to_numpy().astype(np.int64),
+                              'PointsAgainst':point_info['Allowed'].to_numpy().astype(np.int64)})
+    return(df_played.groupby(GAME_COLUMNS + ['Player'], sort=False, dropna=False).sum())
+
+def get_event_stats(df_league):
+    ''' Completions, catches, assists, goals, Ds, throwaways and drops per player and game (see EVENT_STATS)
+
+        Returns:
+            df_events        -     dataframe indexed by GAME_COLUMNS + ['Player'], one column per stat
+    '''
+    event_type = df_league['Event Type']
+    action = df_league['Action']
+    credits = []
+    for stat, etype, actions, column in EVENT_STATS:
+        rows = (event_type == etype) & action.isin(actions)
+        credited = df_league.loc[rows, GAME_COLUMNS].assign(Player=df_league.loc[rows, column], Stat=stat)
+        credits.append(credited)
+    credits = pd.concat(credits, ignore_index=True)
+    credits = credits[credits['Player'].notna() & ~credits['Player'].isin(PLACEHOLDER_PLAYERS)]
+
+    stat_names = list(dict.fromkeys(stat for stat, _, _, _ in EVENT_STATS))
+    df_events = credits.groupby(GAME_COLUMNS + ['Player', 'Stat'], sort=False, dropna=False).size().unstack('Stat', fill_value=0)
+    return(df_events.reindex(columns=stat_names, fill_value=0))
+
+def get_player_game_stats(teams_dict=None, df_league=None):
+    ''' Stats of every player in every game
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+                                   (e.g. from league_loader.load_league(..., return_league_frame=True))
+
+        Returns:
+            df_player_games  -     dataframe with the GAME_COLUMNS, Player and the PLAYER_STAT_COLUMNS, one row per player and game
+    '''
+    if df_league is None:
+        df_league = get_league_frame(teams_dict)
+    df_league = df_league.reset_index(drop=True)
+
+    point_ids = get_point_ids(df_league)
+    df_points = get_point_table(df_league, point_ids)
+    df_played = get_points_played(df_league, point_ids, df_points)
+    df_events = get_event_stats(df_league)
+
+    df_player_games = df_played.join(df_events, how='outer').fillna(0).astype(np.int64)
+    df_player_games['PlusMinus'] = (df_player_games['Goals'] + df_player_games['Assists'] + df_player_games['Ds']
+                                    - df_player_games['Throwaways'] - df_player_games['Drops'])
+    return(df_player_games[PLAYER_STAT_COLUMNS].reset_index())
+
+def get_player_season_stats(teams_dict=None, df_league=None, df_player_games=None):
+    ''' Season totals of every player (players are identified by team and name)
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+            df_player_games  -     alternatively, the output of get_player_game_stats
+
+        Returns:
+            df_players       -     dataframe with Team, Player, Games and the PLAYER_STAT_COLUMNS, one row per player
+    '''
+    if df_player_games is None:
+        df_player_games = get_player_game_stats(teams_dict, df_league)
+    players = df_player_games.groupby(['Team', 'Player'], sort=True)
+    df_players = players[PLAYER_STAT_COLUMNS].sum()
+    df_players.insert(0, 'Games', players.size())
+    return(df_players.reset_index())
+
+def get_player_leaderboard(df_players, stat, n=10, min_points=0):
+    ''' Top players by a stat
+
+        Parameters:
+            df_players       -     output of get_player_season_stats (or get_player_game_stats)
+            stat             -     column to rank by, e.g. 'Goals' or 'PlusMinus'
+            n                -     number of players to return
+            min_points       -     only rank players with at least this many points played
+
+        Returns:
+            df_leaders       -     the top n rows, ranked by stat (ties broken by fewer points played)
+    '''
+    df_leaders = df_players[df_players['PointsPlayed'] >= min_points]
+    df_leaders = df_leaders.sort_values([stat, 'PointsPlayed'], ascending=[False, True], kind='stable')
+    return(df_leaders.head(n).reset_index(drop=True))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""point_table.py numbers the points of a season once and summarizes each point in a table keyed by integer point id.
+
+get_point_ids labels every event row with its point (Cessation rows get -1), so any per-row result can be joined
+to the point table with df.assign(point_id=point_ids).join(df_points, on='point_id').  The point table holds the score
+at the start and end of the point, the line, who scored, the quarter, the point duration and the number of possessions.
+
+Example:
+        from point_table import get_league_frame, get_point_ids, get_point_table, get_hold_break_rates
+        df_league = get_league_frame(teams_dict)
+        point_ids = get_point_ids(df_league)
+        df_points = get_point_table(df_league, point_ids)
+        get_hold_break_rates(df_points)
+
+"""
+
+import numpy as np
+import pandas as pd
+
+GAME_COLUMNS = ['Team', 'Date/Time', 'Opponent']
+
+POINT_EVENT_TYPES = ['Offense', 'Defense']
+## 'Cessastion' is a typo in the 2019 Montreal file
+CESSATION_EVENT_TYPES = ['Cessation', 'Cessastion']
+PULL_ACTIONS = ['Pull', 'PullOb', 'OpponentPull', 'OpponentPullOb']
+
+POINT_TABLE_COLUMNS = GAME_COLUMNS + ['Line', 'Quarter', 'StartOurScore', 'StartTheirScore', 'EndOurScore', 'EndTheirScore',
+                                      'Scored', 'Allowed', 'ScoringTeam', 'Hold', 'Break', 'Duration', 'Possessions']
+
+def get_league_frame(teams_dict):
+    ''' Every team's rows in one dataframe, with a 'Team' column
+    '''
+    return(pd.concat([df.assign(Team=tm) for tm, df in teams_dict.items()], ignore_index=True))
+
+def get_point_ids(df_league):
+    ''' Number the points of the league frame
+         - a new point starts whenever the game, line, end of point score or point duration changes from the previous row
+
+        Parameters:
+            df_league        -     dataframe of play-by-play rows with a 'Team' column, in file order
+
+        Returns:
+            point_ids        -     integer array, the point of each row (0, 1, ...), -1 for rows outside of points (Cessation)
+    '''
+    in_point = df_league['Event Type'].isin(POINT_EVENT_TYPES).to_numpy()
+    keys = GAME_COLUMNS + ['Line', 'Our Score - End of Point', 'Their Score - End of Point', 'Point Elapsed Seconds']
+    key_ids = df_league.loc[in_point, keys].groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    starts = np.ones(len(key_ids), dtype=bool)
+    starts[1:] = key_ids[1:] != key_ids[:-1]
+
+    point_ids = np.full(len(df_league), -1, dtype=np.int64)
+    point_ids[in_point] = np.cumsum(starts) - 1
+    return(point_ids)
+
+def get_point_first_rows(point_ids):
+    ''' Position of the first row of every point (point_ids are numbered in row order)
+    '''
+    rows = np.flatnonzero(point_ids >= 0)
+    return(rows[np.r_[True, point_ids[rows[1:]] != point_ids[rows[:-1]]]])
+
+def get_point_possessions(df_league, point_ids, event_type=None):
+    ''' Number of possessions in each point
+         - a possession is a run of rows of the same Event Type (Offense: ours, Defense: theirs) within the point
+         - runs made only of pulls are not possessions
+         - event_type='Offense' (or 'Defense') only counts the team's (or the opponent's) possessions
+    '''
+    rows = np.flatnonzero(point_ids >= 0)
+    if len(rows) == 0:
+        return(np.zeros(0, dtype=np.int64))
+    points = point_ids[rows]
+    offense = (df_league['Event Type'].to_numpy(dtype=object)[rows] == 'Offense')
+    played = ~np.isin(df_league['Action'].to_numpy(dtype=object)[rows], PULL_ACTIONS)
+
+    run_starts = np.r_[True, (points[1:] != points[:-1]) | (offense[1:] != offense[:-1])]
+    run_ids = np.cumsum(run_starts) - 1
+    run_played = np.bincount(run_ids, weights=played) > 0
+    if event_type is not None:
+        run_played &= (offense[run_starts] == (event_type == 'Offense'))
+    return(np.bincount(points[run_starts], weights=run_played, minlength=points[-1] + 1).astype(np.int64))
+
+def get_point_table(df_league, point_ids=None):
+    ''' One row per point, indexed by point id
+
+        Parameters:
+            df_league        -     dataframe of play-by-play rows with a 'Team' column, in file order
+            point_ids        -     output of get_point_ids(df_league).  Leave blank to compute it
+
+        Returns:
+            df_points        -     dataframe with the POINT_TABLE_COLUMNS:
+                                    - Quarter: 1-4, 5 for overtime (counted from the Cessation rows before the point)
+                                    - Start/End Our/Their Score: score before and after the point
+                                    - Scored/Allowed: the team/opponent scored the point; ScoringTeam: name of the team that scored
+                                    - Hold/Break: scored on an O/D point
+                                    - Duration: 'Point Elapsed Seconds'
+                                    - Possessions: see get_point_possessions
+    '''
+    if point_ids is None:
+        point_ids = get_point_ids(df_league)
+    first = get_point_first_rows(point_ids)
+
+    is_cessation = df_league['Event Type'].isin(CESSATION_EVENT_TYPES).astype(np.int64)
+    quarter = is_cessation.groupby([df_league[c] for c in GAME_COLUMNS], sort=False, dropna=False).cumsum().to_numpy() + 1
+
+    df_points = df_league.iloc[first][GAME_COLUMNS + ['Line']].reset_index(drop=True)
+    df_points.index = pd.Index(point_ids[first], name='point_id')
+    df_points['Quarter'] = np.minimum(quarter[first], 5)
+    df_points['EndOurScore'] = df_league['Our Score - End of Point'].to_numpy()[first]
+    df_points['EndTheirScore'] = df_league['Their Score - End of Point'].to_numpy()[first]
+
+    games = df_points.groupby(GAME_COLUMNS, sort=False, dropna=False)
+    df_points['StartOurScore'] = games['EndOurScore'].shift(fill_value=0)
+    df_points['StartTheirScore'] = games['EndTheirScore'].shift(fill_value=0)
+    df_points['Scored'] = df_points['EndOurScore'] > df_points['StartOurScore']
+    df_points['Allowed'] = df_points['EndTheirScore'] > df_points['StartTheirScore']
+    df_points['ScoringTeam'] = df_points['Team'].where(df_points['Scored'], df_points['Opponent'].where(df_points['Allowed']))
+    df_points['Hold'] = df_points['Scored'] & (df_points['Line'] == 'O')
+    df_points['Break'] = df_points['Scored'] & (df_points['Line'] == 'D')
+    df_points['Duration'] = df_league['Point Elapsed Seconds'].to_numpy()[first]
+    df_points['Possessions'] = get_point_possessions(df_league, point_ids)[df_points.index.to_numpy()]
+    return(df_points[POINT_TABLE_COLUMNS])
+
+def get_hold_break_rates(df_points):
+    ''' Hold rate (share of O points scored) and break rate (share of D points scored) by team
+
+        Returns:
+            df_rates         -     dataframe indexed by team with OPoints, Holds, HoldRate, DPoints, Breaks, BreakRate
+                                   and the average point Duration
+    '''
+    teams = df_points.groupby('Team', sort=True)
+    o_points = (df_points['Line'] == 'O').groupby(df_points['Team'], sort=True).sum()
+    d_points = (df_points['Line'] == 'D').groupby(df_points['Team'], sort=True).sum()
+    df_rates = pd.DataFrame({'OPoints':o_points, 'Holds':teams['Hold'].sum(),
+                             'DPoints':d_points, 'Breaks':teams['Break'].sum(),
+                             'Duration':teams['Duration'].mean()})
+    df_rates['HoldRate'] = df_rates['Holds'] / df_rates['OPoints']
+    df_rates['BreakRate'] = df_rates['Breaks'] / df_rates['DPoints']
+    return(df_rates[['OPoints', 'Holds', 'HoldRate', 'DPoints', 'Breaks', 'BreakRate', 'Duration']])
+
+def get_clutch_points(df_points, min_quarter=4, max_margin=2):
+    ''' Points played late in close games
+
+        Parameters:
+            df_points        -     output of get_point_table
+            min_quarter      -     earliest quarter to keep (4 keeps the fourth quarter and overtime)
+            max_margin       -     largest score difference at the start of the point to keep
+
+        Returns:
+            df_clutch        -     the matching rows of df_points
+    '''
+    margin = (df_points['StartOurScore'] - df_points['StartTheirScore']).abs()
+    return(df_points[(df_points['Quarter'] >= min_quarter) & (margin <= max_margin)])
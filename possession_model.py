@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""possession_model.py fits the negative binomial model of catches per possession, separately from any plotting.
+
+The catch counts come from convert_date_sequences_to_list_and_count (utils.py).  Moments are computed from
+np.bincount of the counts, so a fit costs one pass over the data plus work proportional to the longest possession.
+
+Example:
+        from possession_model import fit_possession_model
+        passing_stats = fit_possession_model(counts)
+
+"""
+
+import numpy as np
+
+from scipy.optimize import minimize_scalar
+from scipy.special import gammaln
+from scipy.stats import nbinom
+
+from profiling import profile_stage
+
+def get_count_frequencies(counts):
+    ''' Histogram of catch counts
+
+        Parameters:
+            counts           -     list/array of non-negative integer catch counts (one per possession)
+
+        Returns:
+            n_k              -     array where n_k[k] is the number of possessions with k catches
+    '''
+    return(np.bincount(np.asarray(counts, dtype=np.int64)))
+
+def get_count_histogram(counts):
+    ''' Relative frequency of each observed catch count, used for the bar plot
+
+        Parameters:
+            counts           -     list/array of catch counts
+
+        Returns:
+            x_values         -     array of the distinct catch counts, ascending
+            y_values         -     array of the share of possessions with each count
+    '''
+    n_k = get_count_frequencies(counts)
+    x_values = np.flatnonzero(n_k)
+    y_values = n_k[x_values] / n_k.sum()
+    return(x_values, y_values)
+
+def get_count_moments(n_k):
+    ''' Mean and sample variance (ddof=1) of the counts described by a bincount histogram
+    '''
+    k = np.arange(len(n_k))
+    n = n_k.sum()
+    mu = (k * n_k).sum() / n
+    var = (n_k * (k - mu)**2).sum() / (n - 1)
+    return(mu, var)
+
+def fit_nb_moments(n_k):
+    ''' Method of moments negative binomial fit (as originally done in collect_and_plot_passes_nb)
+
+        Parameters:
+            n_k              -     bincount histogram of the catch counts
+
+        Returns:
+            r                -     number of successes parameter
+            p                -     success probability parameter
+    '''
+    mu, var = get_count_moments(n_k)
+    r = (mu**2)/(var - mu)
+    p = (mu)/(var)
+    return(r, p)
+
+def get_nb_loglikelihood(n_k, r, p):
+    ''' Negative binomial log likelihood of the counts described by a bincount histogram
+    '''
+    k = np.arange(len(n_k))
+    observed = n_k > 0
+    k, n_k = k[observed], n_k[observed]
+    logpmf = gammaln(k + r) - gammaln(k + 1) - gammaln(r) + r*np.log(p) + k*np.log1p(-p)
+    return((n_k * logpmf).sum())
+
+def fit_nb_mle(n_k, r_bounds=(1e-6, 1e6)):
+    ''' Maximum likelihood negative binomial fit
+         - for a fixed r the likelihood is maximized by p = r/(r + mean), so only r is searched (on a log scale)
+
+        Parameters:
+            n_k              -     bincount histogram of the catch counts
+            r_bounds         -     search bounds for r
+
+        Returns:
+            r                -     number of successes parameter
+            p                -     success probability parameter
+    '''
+    mu, _ = get_count_moments(n_k)
+    result = minimize_scalar(lambda log_r: -get_nb_loglikelihood(n_k, np.exp(log_r), np.exp(log_r)/(np.exp(log_r) + mu)),
+                             bounds=np.log(r_bounds), method='bounded')
+    r = float(np.exp(result.x))
+    p = r/(r + mu)
+    return(r, p)
+
+def get_nb_pmf_grid(r, p, lower=0.01, upper=0.9999):
+    ''' Negative binomial pmf over the integer grid between two quantiles, used for the fitted line
+
+        Returns:
+            x_values         -     array of catch counts from ppf(lower) up to (not including) ppf(upper)
+            y_values         -     pmf at x_values
+    '''
+    x_values = np.arange(nbinom.ppf(lower, r, p), nbinom.ppf(upper, r, p))
+    y_values = nbinom.pmf(x_values, r, p)
+    return(x_values, y_values)
+
+@profile_stage('nb_fit', rows=lambda counts, method='moments': len(counts))
+def fit_possession_model(counts, method='moments'):
+    ''' Fit the negative binomial model of catches per possession
+
+        Parameters:
+            counts           -     list/array of catch counts (one per possession)
+            method           -     'moments' (method of moments) or 'mle' (maximum likelihood)
+
+        Returns:
+            passing_stats    -     dictionary with nb_probability, nb_r, avg_passes (model mean), var_passes (sample variance),
+                                   nb_skew and nb_kurtosis
+    '''
+    n_k = get_count_frequencies(counts)
+    if method == 'moments':
+        r, p = fit_nb_moments(n_k)
+    elif method == 'mle':
+        r, p = fit_nb_mle(n_k)
+    else:
+        raise ValueError("method must be 'moments' or 'mle', not {!r}".format(method))
+    _, var = get_count_moments(n_k)
+
+    mean, _, skew, kurt = nbinom.stats(r, p, moments='mvsk')
+
+    passing_stats = {}
+    passing_stats['nb_probability']=p
+    passing_stats['nb_r']=r
+    passing_stats['avg_passes']=mean
+    passing_stats['var_passes']=var
+    passing_stats['nb_skew']=skew
+    passing_stats['nb_kurtosis']=kurt
+    return(passing_stats)
+
+def fit_team_possession_models(team_counts, method='moments', include_league=True):
+    ''' Fit the possession model for every team (and the whole league) in one batch, without building any figures
+
+        Parameters:
+            team_counts      -     dictionary key: team, value: list/array of catch counts
+            method           -     'moments' or 'mle' (see fit_possession_model)
+            include_league   -     also fit all teams' counts pooled together, under the key 'all'
+
+        Returns:
+            dict_of_passing_stats  -   dictionary key: team (and 'all'), value: fit_possession_model output
+    '''
+    dict_of_passing_stats = {tm:fit_possession_model(counts, method=method) for tm, counts in team_counts.items()}
+    if include_league:
+        all_counts = np.concatenate([np.asarray(counts, dtype=np.int64) for counts in team_counts.values()])
+        dict_of_passing_stats['all'] = fit_possession_model(all_counts, method=method)
+    return(dict_of_passing_stats)
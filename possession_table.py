@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""possession_table.py keeps the possessions of a season as typed arrays instead of lists of action strings.
+
+The table has one row per possession (a numpy structured array, see POSSESSION_DTYPE) and a single contiguous int8
+array with the action codes (see ACTIONS) of every possession, one possession after the other.  A possession's actions
+are the slice action_codes[start_row:end_row], so get_possession_actions returns views, never copies.  Possessions are cut by the
+same rules as get_sequences (utils.get_possession_segments), and the 'recorded' column says how many times
+get_sequences lists each one, so get_team_catch_counts gives the counts of convert_date_sequences_to_list_and_count.
+
+Example:
+        from possession_table import create_possession_table, get_possession_actions, get_team_catch_counts
+        table = create_possession_table(teams_dict)
+        table['possessions'][table['possessions']['outcome'] == ACTIONS.index('Goal')]
+        decode_actions(get_possession_actions(table, 0))
+        fit_team_possession_models(get_team_catch_counts(table))
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from point_table import get_league_frame, get_point_ids
+from utils import get_possession_segments
+
+## Action codes: the position in ACTIONS (-1 for an action outside of the list)
+ACTIONS = ['Catch', 'Goal', 'Throwaway', 'Drop', 'D', 'Pull', 'PullOb', 'OpponentPull', 'OpponentPullOb', 'OpponentCatch',
+           'Stall', 'Callahan', 'MiscPenalty', 'EndOfFirstQuarter', 'Halftime', 'EndOfThirdQuarter', 'EndOfFourthQuarter',
+           'EndOfOvertime', 'GameOver']
+START_REASONS = ['game_start', 'after_defense', 'after_turnover']
+
+POSSESSION_DTYPE = np.dtype([('game_id', np.int32),
+                             ('point_id', np.int32),
+                             ('start_row', np.int64),
+                             ('end_row', np.int64),
+                             ('catch_count', np.int16),
+                             ('outcome', np.int8),
+                             ('start_reason', np.int8),
+                             ('recorded', np.int8)])
+
+def get_action_codes(actions):
+    ''' int8 code (position in ACTIONS) of every action, -1 for unknown actions
+    '''
+    return(pd.Categorical(actions, categories=ACTIONS).codes.astype(np.int8))
+
+def decode_actions(codes):
+    ''' Action names of an array of action codes
+    '''
+    return(np.array(ACTIONS + [None], dtype=object)[np.asarray(codes)].tolist())
+
+def create_possession_table(teams_dict, teams_list=None):
+    ''' Segment every game of the teams into possessions and store them as typed arrays
+         - 'Cessation' rows are dropped and each team's games are made contiguous, as in get_season_sequences
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            teams_list       -     optional list of teams to process.  Leave blank for every team in teams_dict
+
+        Returns:
+            table            -     dictionary with:
+                                    - possessions: structured array (POSSESSION_DTYPE), one row per possession, in game order
+                                        game_id, point_id: rows of games and of point_table.get_point_table(df_league)
+                                        start_row, end_row: the possession's slice of action_codes
+                                        catch_count: number of actions after the first one (len(possession) - 1)
+                                        outcome: action code of the last action
+                                        start_reason: position in START_REASONS
+                                        recorded: times the possession appears in the get_sequences output
+                                    - action_codes: int8 array, the actions of every possession one after the other
+                                    - source_rows: int64 array, the df_league position of every action of action_codes
+                                    - games: dataframe of the Team, Date/Time and Opponent of every game_id
+                                    - df_league: the league frame (see point_table.get_league_frame)
+    '''
+    if teams_list is None:
+        teams_list = list(teams_dict.keys())
+    df_league = get_league_frame({tm:teams_dict[tm] for tm in teams_list})
+    point_ids = get_point_ids(df_league)
+
+    source_rows = np.flatnonzero((df_league['Event Type'] != 'Cessation').to_numpy())
+    df_rows = df_league.iloc[source_rows]
+    game_codes = df_rows.groupby(['Team','Date/Time'], sort=False, observed=True).ngroup().to_numpy()
+    order = np.argsort(game_codes, kind='stable')
+    source_rows, game_codes = source_rows[order], game_codes[order]
+    df_rows = df_league.iloc[source_rows]
+
+    segments = get_possession_segments(df_rows, game_codes)
+
+    ## The action stream holds the rows that belong to a possession; a possession is a run of rows sharing a list id
+    member_rows = np.flatnonzero(segments['members'])
+    member_ids = segments['possession_ids'][member_rows]
+    action_codes = get_action_codes(df_rows['Action'].iloc[member_rows])
+    start_rows = np.flatnonzero(np.r_[True, member_ids[1:] != member_ids[:-1]])[:len(member_rows)]
+    end_rows = np.r_[start_rows[1:], len(member_rows)]
+    first_rows = member_rows[start_rows]
+
+    recorded = np.bincount(segments['possession_ids'][segments['event_rows']], minlength=segments['possession_ids'].max() + 1)
+    start_reason = np.select([segments['game_start'][first_rows], segments['after_defense'][first_rows]], [0, 1], 2)
+
+    possessions = np.empty(len(start_rows), dtype=POSSESSION_DTYPE)
+    possessions['game_id'] = game_codes[first_rows]
+    possessions['point_id'] = point_ids[source_rows[first_rows]]
+    possessions['start_row'] = start_rows
+    possessions['end_row'] = end_rows
+    possessions['catch_count'] = end_rows - start_rows - 1
+    possessions['outcome'] = action_codes[end_rows - 1]
+    possessions['start_reason'] = start_reason
+    possessions['recorded'] = recorded[member_ids[start_rows]]
+
+    games = df_rows[['Team','Date/Time','Opponent']].iloc[np.flatnonzero(np.r_[True, game_codes[1:] != game_codes[:-1]])]
+    table = {'possessions':possessions,
+             'action_codes':action_codes,
+             'source_rows':source_rows[member_rows],
+             'games':games.reset_index(drop=True).rename_axis('game_id'),
+             'df_league':df_league}
+    return(table)
+
+def get_possession_actions(table, i):
+    ''' Action codes of possession i, as a view of table['action_codes'] (no copy)
+    '''
+    possession = table['possessions'][i]
+    return(table['action_codes'][possession['start_row']:possession['end_row']])
+
+def iter_possession_actions(table, possessions=None):
+    ''' Views of the action codes of every possession (of the table, or of a filtered selection of its rows)
+    '''
+    if possessions is None:
+        possessions = table['possessions']
+    action_codes = table['action_codes']
+    for start, end in zip(possessions['start_row'].tolist(), possessions['end_row'].tolist()):
+        yield(action_codes[start:end])
+
+def get_team_possessions(table, team):
+    ''' Rows of the possession table that belong to a team
+    '''
+    game_ids = np.flatnonzero((table['games']['Team'] == team).to_numpy())
+    return(table['possessions'][np.isin(table['possessions']['game_id'], game_ids)])
+
+def get_team_catch_counts(table, teams_list=None):
+    ''' Catch counts of every team, as convert_date_sequences_to_list_and_count computes them from get_season_sequences
+         - each possession counts as many times as get_sequences records it; the largest count of a team is left out
+
+        Returns:
+            team_counts      -     dictionary key: team, value: sorted int array of catch counts
+    '''
+    possessions = table['possessions']
+    teams = table['games']['Team'].to_numpy(dtype=object)[possessions['game_id']]
+    if teams_list is None:
+        teams_list = table['games']['Team'].unique().tolist()
+    team_counts = {}
+    for tm in teams_list:
+        rows = possessions[teams == tm]
+        counts = np.sort(np.repeat(rows['catch_count'].astype(np.int64), rows['recorded']))
+        team_counts[tm] = counts[:-1]
+    return(team_counts)
+
+def get_possession_frame(table):
+    ''' The possession table as a dataframe (a copy), with the team, date, opponent, outcome and start reason spelled out
+    '''
+    df_possessions = pd.DataFrame(table['possessions'])
+    df_possessions = df_possessions.join(table['games'], on='game_id')
+    df_possessions['Outcome'] = decode_actions(df_possessions['outcome'].to_numpy())
+    df_possessions['StartReason'] = np.array(START_REASONS, dtype=object)[df_possessions['start_reason'].to_numpy()]
+    return(df_possessions)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""profiling.py is the opt-in instrumentation of the pipeline stages (load, game filter, event counts, hangtime,
+flatten, sequences, NB fit, figure build).
+
+Functions decorated with profile_stage report a record per call to every enabled sink: the stage name, the function,
+the wall time, the rows processed and, with memory=True, the peak traced memory (tracemalloc) of the call.  A sink
+is any callable taking the record dictionary; create_log_sink and create_jsonl_sink build the usual ones, and a list's
+append method collects records in memory (see get_profile_summary).  While profiling is disabled a decorated function
+costs one extra call and one flag check.
+
+Stages run inside pool workers (backend='process' of team_executor, load_league processes) are not reported.
+
+Example:
+        from profiling import enable_profiling, disable_profiling, create_jsonl_sink, get_profile_summary
+        records = []
+        enable_profiling(records.append, create_jsonl_sink("profile.jsonl"), memory=True)
+        game_dict, df_stats = get_game_stats(teams_dict)
+        disable_profiling()
+        get_profile_summary(records)
+
+"""
+
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+import pandas as pd
+
+## Stage names used by the instrumented functions
+STAGES = ['load', 'game_filter', 'event_counts', 'hangtime', 'flatten', 'sequences', 'nb_fit', 'figure']
+
+_PROFILING = {'enabled':False,
+              'sinks':[],
+              'memory':False,
+              'started_tracemalloc':False}
+_LOCAL = threading.local()
+
+def enable_profiling(*sinks, memory=False):
+    ''' Start reporting the profiled stages
+
+        Parameters:
+            sinks            -     callables receiving one record dictionary per stage call
+            memory           -     also trace the peak memory of every stage (tracemalloc, slows the pipeline down)
+    '''
+    _PROFILING['sinks'] = list(sinks)
+    _PROFILING['memory'] = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _PROFILING['started_tracemalloc'] = True
+    _PROFILING['enabled'] = True
+
+def disable_profiling():
+    ''' Stop reporting the profiled stages (and stop tracemalloc if enable_profiling started it)
+    '''
+    _PROFILING['enabled'] = False
+    _PROFILING['sinks'] = []
+    if _PROFILING['started_tracemalloc']:
+        tracemalloc.stop()
+        _PROFILING['started_tracemalloc'] = False
+    _PROFILING['memory'] = False
+
+def is_profiling():
+    return(_PROFILING['enabled'])
+
+@contextmanager
+def profiling(*sinks, memory=False):
+    ''' enable_profiling for the duration of a with block
+    '''
+    enable_profiling(*sinks, memory=memory)
+    try:
+        yield
+    finally:
+        disable_profiling()
+
+def _get_stack():
+    if not hasattr(_LOCAL, 'stack'):
+        _LOCAL.stack = []
+    return(_LOCAL.stack)
+
+def _emit(record):
+    for sink in _PROFILING['sinks']:
+        sink(record)
+
+@contextmanager
+def stage(name, rows=None, function=None):
+    ''' Report the block as one call of a stage (see profile_stage).  Does nothing while profiling is disabled
+         - the with block gets a dictionary whose 'rows' entry can be set once the number of rows is known
+
+        Parameters:
+            name             -     stage name
+            rows             -     rows processed by the block
+            function         -     name of the profiled function
+    '''
+    if not _PROFILING['enabled']:
+        yield({})
+        return
+    memory = _PROFILING['memory'] and tracemalloc.is_tracing()
+    stack = _get_stack()
+    frame = {'name':name, 'rows':rows, 'peak':0, 'current':0}
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame['current'] = current
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield(frame)
+    finally:
+        wall_time = time.perf_counter() - start
+        stack.pop()
+        record = {'stage':name,
+                  'function':function,
+                  'wall_time':wall_time,
+                  'rows':frame['rows'],
+                  'peak_memory':None,
+                  'depth':len(stack),
+                  'parent':stack[-1]['name'] if stack else None,
+                  'timestamp':time.time()}
+        if memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_memory'] = peak - frame['current']
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+        _emit(record)
+
+def profile_stage(name, rows=None, result_rows=None):
+    ''' Decorator reporting every call of a function as a call of a pipeline stage
+
+        Parameters:
+            name             -     stage name (see STAGES)
+            rows             -     optional function of the call's arguments giving the number of rows processed
+            result_rows      -     optional function of the call's result giving the number of rows processed
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _PROFILING['enabled']:
+                return(func(*args, **kwargs))
+            n_rows = rows(*args, **kwargs) if rows is not None else None
+            with stage(name, rows=n_rows, function=func.__module__ + '.' + func.__qualname__) as frame:
+                result = func(*args, **kwargs)
+                if result_rows is not None:
+                    frame['rows'] = result_rows(result)
+            return(result)
+        return(wrapper)
+    return(decorator)
+
+def count_frame_rows(frames):
+    ''' Rows of a dataframe, or of the dataframes of a teams_dict
+    '''
+    if frames is None:
+        return(None)
+    if isinstance(frames, dict):
+        return(sum(len(df) for df in frames.values()))
+    return(len(frames))
+
+def create_log_sink(logger=None, level=logging.INFO):
+    ''' Sink writing one log line per record
+
+        Parameters:
+            logger           -     logging.Logger.  Leave blank for the 'audl.profiling' logger
+            level            -     logging level of the lines
+    '''
+    if logger is None:
+        logger = logging.getLogger('audl.profiling')
+    def sink(record):
+        logger.log(level, "%s%s: %.4fs rows=%s peak=%s", '  ' * record['depth'], record['stage'],
+                   record['wall_time'], record['rows'], record['peak_memory'])
+    return(sink)
+
+def create_jsonl_sink(path):
+    ''' Sink appending one JSON line per record to a file
+    '''
+    lock = threading.Lock()
+    def sink(record):
+        line = json.dumps(record)
+        with lock:
+            with open(path, 'a') as f:
+                f.write(line + '\n')
+    return(sink)
+
+def read_jsonl_records(path):
+    ''' Records written by a create_jsonl_sink sink
+    '''
+    with open(path) as f:
+        return([json.loads(line) for line in f if line.strip()])
+
+def get_profile_summary(records):
+    ''' Per-stage totals of a list of records
+
+        Returns:
+            df_summary       -     dataframe indexed by stage with calls, total/mean/max wall time, rows and max peak memory,
+                                   sorted by total wall time
+    '''
+    df_records = pd.DataFrame(records, columns=['stage', 'function', 'wall_time', 'rows', 'peak_memory'])
+    grouped = df_records.groupby('stage', sort=False)
+    df_summary = pd.DataFrame({'calls':grouped.size(),
+                               'total_time':grouped['wall_time'].sum(),
+                               'mean_time':grouped['wall_time'].mean(),
+                               'max_time':grouped['wall_time'].max(),
+                               'rows':grouped['rows'].sum(min_count=1),
+                               'peak_memory':grouped['peak_memory'].max()})
+    return(df_summary.sort_values('total_time', ascending=False))
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""query_server.py serves the season stats over a local HTTP/JSON API, keeping the league warm in memory.
+
+The league is loaded and the season report (see season_report.compute_season_report: game_dict, df_stats, team
+summaries, possession counts and fits) is computed once.  Requests are answered from that report by a threaded HTTP
+server, so slow requests do not hold up the others.  The team files are watched (mtime and size): only the files
+that changed are read again (through league_loader.load_league, with the same cache and validation options as the
+first load), and a new report is built next to the live one and swapped in, so requests never see a half updated
+state.  A reload that fails (e.g. on a file caught half written) keeps the live state, is logged, and is tried again
+on the next check; POST /reload answers it with a 500.
+
+Endpoints (GET unless noted):
+        /health                          season, number of teams and games, load time and reload count
+        /teams                           list of teams
+        /teams/<team>                    season summary, season turnovers and possession fit of a team
+        /teams/<team>/possessions        possession fit and catch count histogram of a team
+        /league/possessions              league wide possession fit and histogram
+        /games?team=<team>               game keys ('date|team1|team2'), optionally of one team
+        /games/<date|team1|team2>        stats of one game (game_dict entry)
+        POST /reload                     reload the team files that changed (and drop the removed ones) now
+
+Example:
+        python query_server.py --data data --season 2019 --port 8050
+        curl 'http://127.0.0.1:8050/games/4%2F20%2F2019%7CSan%20Diego%20Growlers%7CSan%20Jose%20Spiders'
+
+"""
+
+import argparse
+import json
+import logging
+import math
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from league_loader import find_team_files, load_league
+from possession_model import get_count_histogram
+from season_report import compute_season_report, update_season_report
+from season_store import get_file_signature
+from utils import get_team_rows
+
+logger = logging.getLogger('audl.query_server')
+
+def get_team_file_signatures(directory="data", season=2019):
+    ''' mtime/size signature of every team file of a season
+
+        Returns:
+            signatures       -     dictionary key: path, value: (team, signature)
+    '''
+    return({path:(tm, get_file_signature(path, with_hash=False)) for tm, _, path in find_team_files(directory, season=season)})
+
+def create_server_state(directory="data", season=2019, method='moments', processes=None, use_cache=False, validate=False):
+    ''' Load the league and compute the season report the server answers from
+
+        Parameters:
+            directory        -     directory holding the <TeamName><season>-stats.csv files
+            season           -     season (year) to serve
+            method           -     possession model fit, 'moments' or 'mle'
+            processes        -     worker processes used for the first load (see league_loader.load_league)
+            use_cache        -     load through the season_store cache (see league_loader.load_league), also on reload
+            validate         -     clean the frames with validation.validate_league, also on reload
+
+        Returns:
+            state            -     dictionary with the settings, the teams_dict, the report, the file signatures and a
+                                   reload lock.  'teams_dict', 'report' and 'signatures' are replaced together on reload
+    '''
+    signatures = get_team_file_signatures(directory, season)
+    teams_dict = load_league(directory, season=season, processes=processes, use_cache=use_cache, validate=validate)
+    state = {'directory':directory,
+             'season':season,
+             'method':method,
+             'use_cache':use_cache,
+             'validate':validate,
+             'teams_dict':teams_dict,
+             'report':compute_season_report(teams_dict, method=method),
+             'signatures':signatures,
+             'loaded_at':time.time(),
+             'reloads':0,
+             'lock':threading.Lock()}
+    return(state)
+
+def reload_changed_teams(state):
+    ''' Read again the team files whose mtime or size changed (and new team files), drop the teams whose files were
+        all removed, and swap in a refreshed report
+
+        Returns:
+            changed_teams    -     list of the reloaded and removed teams (empty if nothing changed)
+    '''
+    with state['lock']:
+        signatures = get_team_file_signatures(state['directory'], state['season'])
+        changed_teams = set(tm for path, (tm, signature) in signatures.items()
+                            if path not in state['signatures'] or state['signatures'][path][1] != signature)
+        ## a team that lost one of its files (season=None) but still has others is reloaded from the rest
+        teams_with_files = set(tm for tm, _ in signatures.values())
+        for path in set(state['signatures']) - set(signatures):
+            changed_teams.add(state['signatures'][path][0])
+        removed_teams = sorted(changed_teams - teams_with_files)
+        changed_teams = sorted(changed_teams & teams_with_files)
+        if not changed_teams and not removed_teams:
+            return([])
+        teams_dict = {tm:df for tm, df in state['teams_dict'].items() if tm not in removed_teams}
+        if changed_teams:
+            teams_dict.update(load_league(state['directory'], season=state['season'], processes=1, use_cache=state['use_cache'],
+                                          validate=state['validate'], teams=changed_teams))
+        report = update_season_report(state['report'], teams_dict, changed_teams, method=state['method'],
+                                      removed_teams=removed_teams)
+        state.update({'teams_dict':teams_dict, 'report':report, 'signatures':signatures,
+                      'loaded_at':time.time(), 'reloads':state['reloads'] + 1})
+    return(sorted(changed_teams + removed_teams))
+
+def start_reload_watcher(state, interval=5.0):
+    ''' Check the team files for changes every interval seconds, in a daemon thread
+         - a failed reload is logged and the live state kept; the files are checked again on the next interval
+
+        Returns:
+            stop             -     threading.Event, set it to stop the watcher
+    '''
+    stop = threading.Event()
+    def watch():
+        while not stop.wait(interval):
+            try:
+                reload_changed_teams(state)
+            except Exception:
+                logger.exception("reload of the %s team files failed", state['directory'])
+    threading.Thread(target=watch, name='reload-watcher', daemon=True).start()
+    return(stop)
+
+def to_jsonable(obj):
+    ''' Convert numpy/pandas values (and NaN) in a nested structure into plain JSON values
+    '''
+    if isinstance(obj, dict):
+        return({str(k):to_jsonable(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return([to_jsonable(v) for v in obj])
+    if isinstance(obj, np.ndarray):
+        return(to_jsonable(obj.tolist()))
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return(None)
+    return(obj)
+
+def get_possession_payload(counts, passing_stats):
+    x_values, y_values = get_count_histogram(counts) if len(counts) > 0 else ([], [])
+    return({'fit':passing_stats, 'n_possessions':len(counts), 'histogram':{'catches':x_values, 'share':y_values}})
+
+def handle_query(report, method, path, query=None):
+    ''' Answer one API request from a season report (see the module docstring for the endpoints)
+
+        Parameters:
+            report           -     output of compute_season_report
+            method           -     HTTP method
+            path             -     request path, URL-encoded
+            query            -     dictionary of query string parameters, key: name, value: list of values
+
+        Returns:
+            status           -     HTTP status code
+            payload          -     JSON-serializable answer
+    '''
+    if query is None:
+        query = {}
+    parts = [unquote(part) for part in path.strip('/').split('/') if part]
+    if method != 'GET':
+        return(405, {'error':"method {} not allowed on {}".format(method, path)})
+
+    if parts == ['teams']:
+        return(200, {'teams':report['teams_list']})
+
+    if len(parts) in [2, 3] and parts[0] == 'teams':
+        tm = parts[1]
+        if tm not in report['teams_list']:
+            return(404, {'error':"unknown team {!r}".format(tm)})
+        if len(parts) == 3 and parts[2] == 'possessions':
+            return(200, get_possession_payload(report['team_counts'][tm], report['passing_stats'][tm]))
+        if len(parts) == 2:
+            summary = report['team_summary'].loc[tm].to_dict()
+            df_team = get_team_rows(report['team_games'], tm)
+            return(200, {'team':tm, 'games_played':len(df_team), 'summary':summary,
+                         'season_turnovers':summary['SeasonTurnovers'], 'possessions':report['passing_stats'][tm]})
+
+    if parts == ['league', 'possessions']:
+        return(200, get_possession_payload(report['all_counts'], report['passing_stats']['all']))
+
+    if parts == ['games']:
+        keys = list(report['game_dict'].keys())
+        if 'team' in query:
+            teams = set(query['team'])
+            keys = [kee for kee in keys if teams & set(kee.split('|')[1:])]
+        return(200, {'games':keys})
+
+    if len(parts) == 2 and parts[0] == 'games':
+        kee = parts[1]
+        if kee not in report['game_dict']:
+            return(404, {'error':"unknown game {!r}, expected 'date|team1|team2' with the teams sorted".format(kee)})
+        return(200, {'game':kee, 'stats':report['game_dict'][kee]})
+
+    return(404, {'error':"unknown endpoint {}".format(path)})
+
+def create_request_handler(state):
+    ''' BaseHTTPRequestHandler class answering from the server state
+    '''
+    class SeasonRequestHandler(BaseHTTPRequestHandler):
+
+        def _send(self, status, payload):
+            body = json.dumps(to_jsonable(payload)).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.strip('/') == 'health':
+                report = state['report']
+                self._send(200, {'status':'ok', 'season':state['season'], 'teams':len(report['teams_list']),
+                                 'games':len(report['game_dict']), 'loaded_at':state['loaded_at'], 'reloads':state['reloads']})
+                return
+            ## the report is read once, so a concurrent reload cannot mix two versions in one answer
+            status, payload = handle_query(state['report'], 'GET', url.path, parse_qs(url.query))
+            self._send(status, payload)
+
+        def do_POST(self):
+            if urlsplit(self.path).path.strip('/') != 'reload':
+                self._send(405, {'error':"method POST not allowed on {}".format(self.path)})
+                return
+            try:
+                reloaded = reload_changed_teams(state)
+            except Exception as e:
+                logger.exception("reload of the %s team files failed", state['directory'])
+                self._send(500, {'error':"reload failed: {}: {}".format(type(e).__name__, e)})
+                return
+            self._send(200, {'reloaded':reloaded})
+
+        def log_message(self, format, *args):
+            pass
+
+    return(SeasonRequestHandler)
+
+def create_server(state, host='127.0.0.1', port=8050):
+    ''' Threaded HTTP server (one thread per request) answering from the server state
+    '''
+    server = ThreadingHTTPServer((host, port), create_request_handler(state))
+    server.daemon_threads = True
+    return(server)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the season stats over a local HTTP/JSON API")
+    parser.add_argument('--data', default='data', help="directory holding the <Team><season>-stats.csv files")
+    parser.add_argument('--season', type=int, default=2019)
+    parser.add_argument('--method', default='moments', choices=['moments','mle'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--reload-interval', type=float, default=5.0, help="seconds between team file checks, 0 to disable")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--use-cache', action='store_true', help="load through the season_store columnar cache")
+    parser.add_argument('--validate', action='store_true', help="clean the frames with validation.validate_league")
+    args = parser.parse_args(argv)
+
+    state = create_server_state(args.data, season=args.season, method=args.method, processes=args.processes,
+                                use_cache=args.use_cache, validate=args.validate)
+    if args.reload_interval > 0:
+        start_reload_watcher(state, args.reload_interval)
+    server = create_server(state, args.host, args.port)
+    print("Serving {} season on http://{}:{}".format(args.season, args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""reconciliation.py matches the two teams' records of each game across the team files.
+
+Every game is recorded twice, once in each team's file, and the two records do not always agree (missing points,
+opponents recorded under the wrong name, a file that only has one side's view of a game...).  This module
+ - builds an index of the games across all files (get_game_index), keyed like utils.get_game_key,
+ - aligns the points of the two records by their end of point score (get_point_alignment),
+ - reports what does not agree, per game (get_game_discrepancies), instead of silently taking the max of the two views,
+ - builds one canonical event stream per game (get_merged_game_events), so downstream code can process each game once.
+
+Example:
+        from reconciliation import get_game_discrepancies
+        df_discrepancies = get_game_discrepancies(teams_dict)
+        df_discrepancies[~df_discrepancies['consistent']]
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from point_table import get_league_frame, get_point_ids, get_point_table
+from utils import collect_stats_for_teams, get_incomplete_games
+
+TURNOVER_ACTIONS = ['D', 'Callahan']
+PULL_ACTIONS = ['Pull', 'PullOb']
+OPPONENT_PULL_ACTIONS = ['OpponentPull', 'OpponentPullOb']
+
+def get_canonical_opponents(df_league):
+    ''' The Opponent column mapped onto the team names of the loaded files, ignoring case and extra spaces
+         (e.g. 'Philadelphia phoenix' -> 'Philadelphia Phoenix').  Opponents without a file are left as they are
+    '''
+    lookup = {' '.join(tm.split()).lower():tm for tm in df_league['Team'].unique()}
+    normalized = df_league['Opponent'].astype(str).str.split().str.join(' ').str.lower()
+    return(normalized.map(lookup).fillna(df_league['Opponent']))
+
+def get_game_keys(df):
+    ''' Game key ('date|team1|team2', see utils.get_game_key) and side (1 or 2) of every row of a frame with
+        Team, Date/Time and Opponent columns
+    '''
+    team = df['Team'].astype(str)
+    opponent = df['Opponent'].astype(str)
+    first = team <= opponent
+    team1 = team.where(first, opponent)
+    team2 = opponent.where(first, team)
+    keys = df['Date/Time'].astype(str).str.split(' ').str[0] + '|' + team1 + '|' + team2
+    return(keys.to_numpy(dtype=object), np.where(first, 1, 2))
+
+def _with_canonical_opponents(df_league):
+    df_league = df_league.reset_index(drop=True)
+    return(df_league.assign(Opponent=get_canonical_opponents(df_league)))
+
+def get_game_index(teams_dict=None, df_league=None):
+    ''' One row per game found in any of the team files
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+
+        Returns:
+            df_games         -     dataframe indexed by game key with date, team1, team2, team1_views and team2_views (number of
+                                   distinct Date/Time values the game has in each team's file) and complete (both files have it)
+    '''
+    if df_league is None:
+        df_league = get_league_frame(teams_dict)
+    df_league = _with_canonical_opponents(df_league)
+
+    df_views = df_league.drop_duplicates(['Team', 'Date/Time', 'Opponent'])[['Team', 'Date/Time', 'Opponent']]
+    keys, sides = get_game_keys(df_views)
+    df_views = df_views.assign(game=keys, side=sides)
+    df_views['date'] = df_views['Date/Time'].astype(str).str.split(' ').str[0]
+    df_views['team1'] = np.where(sides == 1, df_views['Team'], df_views['Opponent'])
+    df_views['team2'] = np.where(sides == 1, df_views['Opponent'], df_views['Team'])
+
+    games = df_views.groupby('game', sort=False)
+    df_games = games[['date', 'team1', 'team2']].first()
+    df_games['team1_views'] = games['side'].agg(lambda side: int((side == 1).sum()))
+    df_games['team2_views'] = games['side'].agg(lambda side: int((side == 2).sum()))
+    df_games['complete'] = (df_games['team1_views'] > 0) & (df_games['team2_views'] > 0)
+    return(df_games)
+
+def get_point_alignment(teams_dict=None, df_league=None, point_ids=None, df_points=None):
+    ''' Match the points of the two records of each game by their end of point score
+         - the n-th point ending at a given score in one file is matched with the n-th one in the other file,
+           so points that did not change the score (end of quarter) are matched in order
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+            point_ids        -     optional output of point_table.get_point_ids(df_league)
+            df_points        -     optional output of point_table.get_point_table(df_league, point_ids)
+
+        Returns:
+            df_alignment     -     dataframe, one row per point of either record, in game and score order: game, team1_score,
+                                   team2_score, occurrence, point_id_team1/2, line_team1/2, possessions_team1/2 and status
+                                   ('matched', 'team1_only' or 'team2_only')
+    '''
+    if df_points is None:
+        if df_league is None:
+            df_league = get_league_frame(teams_dict)
+        df_league = _with_canonical_opponents(df_league)
+        if point_ids is None:
+            point_ids = get_point_ids(df_league)
+        df_points = get_point_table(df_league, point_ids)
+    else:
+        df_points = df_points.assign(Opponent=get_canonical_opponents(df_points))
+
+    keys, sides = get_game_keys(df_points)
+    df_sides = pd.DataFrame({'game':keys, 'side':sides,
+                             'team1_score':np.where(sides == 1, df_points['EndOurScore'], df_points['EndTheirScore']),
+                             'team2_score':np.where(sides == 1, df_points['EndTheirScore'], df_points['EndOurScore']),
+                             'point_id':df_points.index.to_numpy(),
+                             'line':df_points['Line'].to_numpy(),
+                             'possessions':df_points['Possessions'].to_numpy()})
+    df_sides['occurrence'] = df_sides.groupby(['game', 'side', 'team1_score', 'team2_score'], sort=False).cumcount()
+
+    on = ['game', 'team1_score', 'team2_score', 'occurrence']
+    df_alignment = pd.merge(df_sides[df_sides['side'] == 1].drop(columns='side'), df_sides[df_sides['side'] == 2].drop(columns='side'),
+                            on=on, how='outer', suffixes=('_team1', '_team2'), indicator=True, sort=False)
+    df_alignment['status'] = df_alignment['_merge'].map({'both':'matched', 'left_only':'team1_only',
+                                                         'right_only':'team2_only'}).astype(object)
+
+    game_order = pd.Series(np.arange(len(pd.unique(keys))), index=pd.unique(keys))
+    df_alignment['game_order'] = game_order.loc[df_alignment['game'].to_numpy()].to_numpy()
+    df_alignment['total_score'] = df_alignment['team1_score'] + df_alignment['team2_score']
+    df_alignment = df_alignment.sort_values(['game_order', 'total_score', 'occurrence', 'team1_score'], kind='stable')
+    for col in ['point_id_team1', 'point_id_team2', 'possessions_team1', 'possessions_team2']:
+        df_alignment[col] = df_alignment[col].astype('Int64')
+    return(df_alignment[on + ['point_id_team1', 'point_id_team2', 'line_team1', 'line_team2',
+                              'possessions_team1', 'possessions_team2', 'status']].reset_index(drop=True))
+
+def get_view_discrepancies(game_dict):
+    ''' The turnover and goal counts of each game as seen by both teams' files (the values flatten_out_games takes the max of)
+
+        Parameters:
+            game_dict        -     a dictionary that contains game stats for each game, from collect_stats_for_teams
+
+        Returns:
+            df_views         -     dataframe indexed by game key with, for each team, its turnovers/goals from its own file and
+                                   from the opponent's file, and turnover_diff/goal_diff (total absolute disagreement)
+    '''
+    incomplete_games = set(get_incomplete_games(game_dict))
+    games = [game for game in game_dict.keys() if game not in incomplete_games]
+    columns = {}
+    for side, other in [('team1', 'team2'), ('team2', 'team1')]:
+        own = [game_dict[game][side]['stats']['team_offensive_stats'] for game in games]
+        seen = [game_dict[game][other]['stats']['team_defensive_stats'] for game in games]
+        columns[side + '_turnovers'] = [stats['turnovers'] for stats in own]
+        columns[side + '_turnovers_opponent_view'] = [stats['turnovers'] for stats in seen]
+        columns[side + '_goals'] = [stats['goal'] for stats in own]
+        columns[side + '_goals_opponent_view'] = [stats['goal'] for stats in seen]
+
+    df_views = pd.DataFrame(columns, index=pd.Index(games, name='game'), dtype=np.int64)
+    df_views['turnover_diff'] = ((df_views['team1_turnovers'] - df_views['team1_turnovers_opponent_view']).abs() +
+                                 (df_views['team2_turnovers'] - df_views['team2_turnovers_opponent_view']).abs())
+    df_views['goal_diff'] = ((df_views['team1_goals'] - df_views['team1_goals_opponent_view']).abs() +
+                             (df_views['team2_goals'] - df_views['team2_goals_opponent_view']).abs())
+    return(df_views)
+
+def get_game_discrepancies(teams_dict=None, df_league=None, game_dict=None):
+    ''' Data quality report: how far apart the two records of each game are
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+            game_dict        -     optional output of collect_stats_for_teams (computed from teams_dict/df_league if blank)
+
+        Returns:
+            df_discrepancies -     dataframe indexed by game key: the get_game_index columns, the point counts of each record,
+                                   matched/unmatched points, line_conflicts (matched points both files played on the same line),
+                                   possession_mismatches, the final score in each file, score_agrees, the get_view_discrepancies
+                                   columns and consistent (complete with no discrepancy at all)
+    '''
+    if df_league is None:
+        df_league = get_league_frame(teams_dict)
+    df_league = _with_canonical_opponents(df_league)
+    if game_dict is None:
+        game_dict = collect_stats_for_teams({tm:df for tm, df in df_league.groupby('Team', sort=False)})
+
+    df_games = get_game_index(df_league=df_league)
+    df_alignment = get_point_alignment(df_league=df_league)
+
+    matched = df_alignment['status'] == 'matched'
+    by_game = df_alignment.assign(
+        team1_points=df_alignment['point_id_team1'].notna(),
+        team2_points=df_alignment['point_id_team2'].notna(),
+        matched_points=matched,
+        team1_only_points=df_alignment['status'] == 'team1_only',
+        team2_only_points=df_alignment['status'] == 'team2_only',
+        line_conflicts=matched & (df_alignment['line_team1'] == df_alignment['line_team2']),
+        possession_mismatches=matched & (df_alignment['possessions_team1'] != df_alignment['possessions_team2']).fillna(False),
+    ).groupby('game', sort=False)
+    counts = by_game[['team1_points', 'team2_points', 'matched_points', 'team1_only_points', 'team2_only_points',
+                      'line_conflicts', 'possession_mismatches']].sum().astype(np.int64)
+
+    finals = {}
+    for side in ('team1', 'team2'):
+        in_file = df_alignment[df_alignment['point_id_' + side].notna()]
+        last = in_file.groupby('game', sort=False)[['team1_score', 'team2_score']].max()
+        finals[side + '_file_final'] = last['team1_score'].astype(str) + '-' + last['team2_score'].astype(str)
+
+    df_discrepancies = df_games.join(counts).join(pd.DataFrame(finals))
+    df_discrepancies['score_agrees'] = df_discrepancies['team1_file_final'] == df_discrepancies['team2_file_final']
+    df_discrepancies = df_discrepancies.join(get_view_discrepancies(game_dict))
+
+    df_discrepancies['consistent'] = (df_discrepancies['complete'] & df_discrepancies['score_agrees'] &
+                                      (df_discrepancies['team1_views'] == 1) & (df_discrepancies['team2_views'] == 1) &
+                                      (df_discrepancies[['team1_only_points', 'team2_only_points', 'line_conflicts',
+                                                         'possession_mismatches']].fillna(0).sum(axis=1) == 0) &
+                                      (df_discrepancies[['turnover_diff', 'goal_diff']].fillna(0).sum(axis=1) == 0))
+    return(df_discrepancies)
+
+def _get_runs(df_rows, point_ids):
+    ''' Runs of rows with the same Event Type within a point: run position in its point, kind, and ordinal among the
+        non-pull runs of the same kind in the point
+    '''
+    offense = (df_rows['Event Type'] == 'Offense').to_numpy()
+    pull = df_rows['Action'].isin(PULL_ACTIONS + OPPONENT_PULL_ACTIONS).to_numpy()
+    run_starts = np.r_[True, (point_ids[1:] != point_ids[:-1]) | (offense[1:] != offense[:-1])]
+    run_ids = np.cumsum(run_starts) - 1
+
+    df_runs = pd.DataFrame({'point_id':point_ids[run_starts], 'offense':offense[run_starts]})
+    df_runs['pull_only'] = np.bincount(run_ids, weights=~pull) == 0
+    df_runs['position'] = df_runs.groupby('point_id', sort=False).cumcount()
+    df_runs['ordinal'] = -1
+    played = ~df_runs['pull_only']
+    df_runs.loc[played, 'ordinal'] = df_runs[played].groupby(['point_id', 'offense'], sort=False).cumcount()
+    return(run_ids, df_runs)
+
+def get_merged_game_events(teams_dict=None, df_league=None):
+    ''' One canonical event stream per game, built from both teams' records
+         - on matched points whose possessions line up, each possession is taken from the file of the team that had the disc
+           (its Offense rows, with every catch), followed by the other file's D/Callahan row that ended it; both teams'
+           pulls open the point
+         - points whose possessions do not line up, and points/games only one file has, are taken from one record as is
+         - rows keep the columns of the file they were taken from, so Line and the scores are from the 'Team' perspective
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+
+        Returns:
+            df_merged        -     dataframe of the selected rows in game order, with added columns game (key), point (order of
+                                   the point in the game) and source ('merged' or the status of a single-record point)
+    '''
+    if df_league is None:
+        df_league = get_league_frame(teams_dict)
+    df_league = _with_canonical_opponents(df_league)
+    point_ids = get_point_ids(df_league)
+    df_points = get_point_table(df_league, point_ids)
+    df_alignment = get_point_alignment(df_league=df_league, point_ids=point_ids, df_points=df_points)
+    df_alignment['point'] = df_alignment.groupby('game', sort=False).cumcount()
+
+    in_point = np.flatnonzero(point_ids >= 0)
+    df_rows = df_league.iloc[in_point]
+    run_ids, df_runs = _get_runs(df_rows, point_ids[in_point])
+    df_row_runs = df_runs.iloc[run_ids].reset_index(drop=True)
+    df_row_runs['row'] = in_point
+    df_row_runs['action'] = df_rows['Action'].to_numpy()
+
+    ## possessions per point and kind, to tell which matched points line up
+    played_runs = df_runs[~df_runs['pull_only']]
+    n_offense = played_runs[played_runs['offense']].groupby('point_id').size()
+    n_defense = played_runs[~played_runs['offense']].groupby('point_id').size()
+    matched = df_alignment[df_alignment['status'] == 'matched']
+    p1 = matched['point_id_team1'].astype(np.int64).to_numpy()
+    p2 = matched['point_id_team2'].astype(np.int64).to_numpy()
+    lined_up = ((n_offense.reindex(p1, fill_value=0).to_numpy() == n_defense.reindex(p2, fill_value=0).to_numpy()) &
+                (n_defense.reindex(p1, fill_value=0).to_numpy() == n_offense.reindex(p2, fill_value=0).to_numpy()))
+    merged_points = matched[lined_up]
+
+    selections = []
+    ## single-record points: the team1 record of matched points that do not line up, and the one-file points
+    single = pd.concat([matched[~lined_up].assign(point_id=matched[~lined_up]['point_id_team1'], source='team1_view'),
+                        df_alignment[df_alignment['status'] == 'team1_only'].assign(point_id=lambda d: d['point_id_team1'], source='team1_only'),
+                        df_alignment[df_alignment['status'] == 'team2_only'].assign(point_id=lambda d: d['point_id_team2'], source='team2_only')])
+    single_rows = df_row_runs.merge(single[['game', 'point', 'point_id', 'source']].astype({'point_id':np.int64}), on='point_id')
+    single_rows['sub'] = 0
+    selections.append(single_rows)
+
+    ## merged points: team1's runs order the point.  A team2 row takes the position of the team1 run of the other kind with
+    ## the same ordinal: its possessions fill team1's Defense runs, and its D rows follow the team1 possession they ended
+    team1_runs = df_runs[df_runs['ordinal'] >= 0][['point_id', 'offense', 'ordinal', 'position']]
+    for side in ('team1', 'team2'):
+        point_map = pd.DataFrame({'point_id':merged_points['point_id_' + side].astype(np.int64).to_numpy(),
+                                  'point_id_team1':merged_points['point_id_team1'].astype(np.int64).to_numpy(),
+                                  'game':merged_points['game'].to_numpy(), 'point':merged_points['point'].to_numpy()})
+        rows = df_row_runs.merge(point_map, on='point_id')
+
+        possession = rows['offense'] & (rows['ordinal'] >= 0) & ~rows['action'].isin(OPPONENT_PULL_ACTIONS)
+        ended_by = ~rows['offense'] & (rows['ordinal'] >= 0) & rows['action'].isin(TURNOVER_ACTIONS)
+        pulls = ~rows['offense'] & rows['action'].isin(PULL_ACTIONS)
+        if side == 'team2':
+            targets = pd.DataFrame({'point_id':rows['point_id_team1'], 'offense':~rows['offense'], 'ordinal':rows['ordinal']})
+            rows['position'] = targets.merge(team1_runs, on=['point_id', 'offense', 'ordinal'], how='left')['position'].to_numpy()
+        rows['sub'] = np.where(ended_by, 1, 0)
+        rows.loc[pulls, 'position'] = -1
+        selections.append(rows[possession | ended_by | pulls].assign(source='merged'))
+
+    df_selected = pd.concat(selections, ignore_index=True)
+    game_order = pd.Series(np.arange(len(pd.unique(df_alignment['game']))), index=pd.unique(df_alignment['game']))
+    df_selected['game_order'] = game_order.loc[df_selected['game'].to_numpy()].to_numpy()
+    df_selected = df_selected.sort_values(['game_order', 'point', 'position', 'sub', 'row'], kind='stable')
+
+    df_merged = df_league.iloc[df_selected['row'].to_numpy()].reset_index(drop=True)
+    df_merged['game'] = df_selected['game'].to_numpy()
+    df_merged['point'] = df_selected['point'].to_numpy()
+    df_merged['source'] = df_selected['source'].to_numpy()
+    return(df_merged)
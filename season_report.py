@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""season_report.py runs the season analysis headless: all computations once, figures only on request.
+
+compute_season_report produces every table behind the notebook plots (game stats, team summary, possession fits)
+without building any plotly figure.  The report can be cached to disk, and write_report_figures builds the figures
+in worker processes and writes them as static .html/.json files.
+
+Example:
+        python season_report.py --data data --season 2019 --out reports
+
+"""
+
+import argparse
+import os
+import pickle
+
+from concurrent.futures import ProcessPoolExecutor
+
+from league_loader import TEAM_COLORS, load_league
+from possession_model import fit_possession_model, fit_team_possession_models
+from utils import (build_possession_figure, convert_date_sequences_to_list_and_count, get_game_stats, get_season_sequences,
+                   get_team_games, get_team_season_summary, plot_goals, plot_turnovers)
+
+REPORT_FIGURES = ['turnovers', 'goals', 'possessions', 'league_possessions']
+
+def compute_season_report(teams_dict, teams_list=None, method='moments'):
+    ''' Run every season computation once, without building figures
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            teams_list       -     list of teams to report on.  Leave blank for every team in teams_dict
+            method           -     possession model fit, 'moments' or 'mle' (see possession_model.fit_possession_model)
+
+        Returns:
+            report           -     dictionary of the intermediate tables: teams_list, game_dict, df_stats, team_games,
+                                   team_summary, team_sequences, team_counts, all_counts and passing_stats (with the league fit under 'all')
+    '''
+    if teams_list is None:
+        teams_list = list(teams_dict.keys())
+
+    game_dict, df_stats = get_game_stats(teams_dict)
+    team_games = get_team_games(df_stats)
+
+    team_sequences = get_season_sequences(teams_dict, teams_list)
+    team_counts = {tm:convert_date_sequences_to_list_and_count(team_sequences[tm]) for tm in teams_list}
+    all_counts = sorted(count for tm in teams_list for count in team_counts[tm])
+    passing_stats = fit_team_possession_models(team_counts, method=method, include_league=False)
+    passing_stats['all'] = fit_possession_model(all_counts, method=method)
+
+    report = {'teams_list':list(teams_list),
+              'game_dict':game_dict,
+              'df_stats':df_stats,
+              'team_games':team_games,
+              'team_summary':get_team_season_summary(team_games).reindex(teams_list),
+              'team_sequences':team_sequences,
+              'team_counts':team_counts,
+              'all_counts':all_counts,
+              'passing_stats':passing_stats}
+    return(report)
+
+def update_season_report(report, teams_dict, changed_teams, method='moments', removed_teams=None):
+    ''' Refresh a report after some team files changed (or were removed)
+         - game stats and team summaries are rebuilt (they pair up both teams' files); possessions are only
+           re-segmented and refit for the changed teams
+         - the given report is left unmodified
+
+        Parameters:
+            report           -     output of compute_season_report
+            teams_dict       -     the teams_dict with the changed teams' frames replaced (or added)
+            changed_teams    -     teams whose frame changed
+            method           -     possession model fit, 'moments' or 'mle' (see possession_model.fit_possession_model)
+            removed_teams    -     teams whose files were removed (and are no longer in teams_dict)
+
+        Returns:
+            report           -     new report dictionary
+    '''
+    removed_teams = set(removed_teams or [])
+    teams_list = report['teams_list'] + [tm for tm in changed_teams if tm not in report['teams_list']]
+    teams_list = [tm for tm in teams_list if tm not in removed_teams]
+    changed_teams = [tm for tm in teams_list if tm in changed_teams]
+
+    game_dict, df_stats = get_game_stats(teams_dict)
+    team_games = get_team_games(df_stats)
+
+    team_sequences = {tm:sequences for tm, sequences in report['team_sequences'].items() if tm not in removed_teams}
+    team_counts = {tm:counts for tm, counts in report['team_counts'].items() if tm not in removed_teams}
+    passing_stats = {tm:stats for tm, stats in report['passing_stats'].items() if tm not in removed_teams}
+    if changed_teams:
+        team_sequences.update(get_season_sequences(teams_dict, changed_teams))
+        team_counts.update({tm:convert_date_sequences_to_list_and_count(team_sequences[tm]) for tm in changed_teams})
+        passing_stats.update(fit_team_possession_models({tm:team_counts[tm] for tm in changed_teams}, method=method,
+                                                        include_league=False))
+    all_counts = sorted(count for tm in teams_list for count in team_counts[tm])
+    passing_stats['all'] = fit_possession_model(all_counts, method=method)
+
+    report = {'teams_list':teams_list,
+              'game_dict':game_dict,
+              'df_stats':df_stats,
+              'team_games':team_games,
+              'team_summary':get_team_season_summary(team_games).reindex(teams_list),
+              'team_sequences':team_sequences,
+              'team_counts':team_counts,
+              'all_counts':all_counts,
+              'passing_stats':passing_stats}
+    return(report)
+
+def save_season_report(report, path):
+    ''' Cache a compute_season_report output to disk (pickle)
+    '''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump(report, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_season_report(path):
+    ''' Load a report cached by save_season_report
+    '''
+    with open(path, 'rb') as f:
+        return(pickle.load(f))
+
+def get_figure_tasks(report, figures=REPORT_FIGURES, teams_col_dict=TEAM_COLORS):
+    ''' Describe each requested figure as a self-contained task: (file name, figure kind, the data the figure needs)
+         - tasks only carry the small tables a figure needs, so they are cheap to send to worker processes
+    '''
+    teams_list = report['teams_list']
+    tasks = []
+    if 'turnovers' in figures:
+        tasks.append(('turnovers', 'turnovers', {'df_stats':report['df_stats'], 'teams_list':teams_list,
+                                                  'teams_col_dict':teams_col_dict}))
+    if 'goals' in figures:
+        tasks.append(('goals', 'goals', {'df_stats':report['df_stats'], 'teams_list':teams_list,
+                                          'teams_col_dict':teams_col_dict}))
+    if 'possessions' in figures:
+        for tm in teams_list:
+            tasks.append(('possessions_' + tm.replace(' ', '_'), 'possessions',
+                          {'counts':report['team_counts'][tm], 'passing_stats':report['passing_stats'][tm],
+                           'color':teams_col_dict.get(tm),
+                           'title':"{}: Catch Counts, with Negative Binomial Estimation".format(tm),
+                           'xaxis_title':"n Number of Catches"}))
+    if 'league_possessions' in figures:
+        tasks.append(('league_possessions', 'possessions',
+                      {'counts':report['all_counts'], 'passing_stats':report['passing_stats']['all'],
+                       'color':"oldlace",
+                       'title':"League Wide Catch Counts Per Possession, with Negative Binomial Estimation",
+                       'xaxis_title':"n Number of Catches in a Possession"}))
+    return(tasks)
+
+def build_figure(kind, data):
+    ''' Build one report figure from its task data (see get_figure_tasks)
+    '''
+    if kind == 'turnovers':
+        return(plot_turnovers(data['df_stats'], data['teams_list'], data['teams_col_dict'], sort_by='offense'))
+    if kind == 'goals':
+        return(plot_goals(data['teams_list'], data['df_stats'], data['teams_col_dict']))
+    if kind == 'possessions':
+        return(build_possession_figure(data['counts'], data['passing_stats']['nb_r'], data['passing_stats']['nb_probability'],
+                                       color=data['color'], title=data['title'], xaxis_title=data['xaxis_title']))
+    raise ValueError("Unknown figure kind {!r}".format(kind))
+
+def build_report_figures(report, figures=REPORT_FIGURES, teams_col_dict=TEAM_COLORS):
+    ''' Build the requested report figures in-process (e.g. for display in a notebook)
+
+        Returns:
+            figs             -     dictionary key: figure name, value: plotly figure
+    '''
+    return({name:build_figure(kind, data) for name, kind, data in get_figure_tasks(report, figures, teams_col_dict)})
+
+def _write_figure_task(task):
+    name, kind, data, directory, formats = task
+    fig = build_figure(kind, data)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(directory, "{}.{}".format(name, fmt))
+        if fmt == 'html':
+            fig.write_html(path, include_plotlyjs='cdn')
+        elif fmt == 'json':
+            fig.write_json(path)
+        else:
+            raise ValueError("Unknown figure format {!r}".format(fmt))
+        paths.append(path)
+    return(paths)
+
+def write_report_figures(report, directory, figures=REPORT_FIGURES, teams_col_dict=TEAM_COLORS, formats=('html','json'), processes=None):
+    ''' Build the requested figures in worker processes and write them to static files
+
+        Parameters:
+            report           -     output of compute_season_report
+            directory        -     output directory
+            figures          -     figure kinds to write (see REPORT_FIGURES)
+            teams_col_dict   -     dictionary of colors, key: team_name
+            formats          -     file formats to write, 'html' and/or 'json'
+            processes        -     number of worker processes.  Leave blank for one per CPU; 1 builds serially
+
+        Returns:
+            paths            -     list of the written file paths
+    '''
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(name, kind, data, directory, formats) for name, kind, data in get_figure_tasks(report, figures, teams_col_dict)]
+    if processes == 1:
+        written = [_write_figure_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            written = list(executor.map(_write_figure_task, tasks))
+    return([path for paths in written for path in paths])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute the season report and write its figures as static files")
+    parser.add_argument('--data', default='data', help="directory holding the <Team><season>-stats.csv files")
+    parser.add_argument('--season', type=int, default=2019)
+    parser.add_argument('--out', default='reports', help="output directory for the figures and the cached report")
+    parser.add_argument('--method', default='moments', choices=['moments','mle'])
+    parser.add_argument('--formats', default='html,json', help="comma separated figure formats (html, json)")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--no-figures', action='store_true', help="only compute and cache the report tables")
+    args = parser.parse_args(argv)
+
+    teams_dict = load_league(args.data, season=args.season, processes=args.processes)
+    teams_list = [tm for tm in TEAM_COLORS.keys() if tm in teams_dict] + [tm for tm in teams_dict.keys() if tm not in TEAM_COLORS]
+    report = compute_season_report(teams_dict, teams_list, method=args.method)
+    save_season_report(report, os.path.join(args.out, 'season_report.pkl'))
+    if not args.no_figures:
+        write_report_figures(report, args.out, formats=tuple(args.formats.split(',')), processes=args.processes)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""season_store.py converts the data/<Team>2019-stats.csv files into a typed, memory-mappable columnar cache.
+
+Each source file gets a cache directory holding a manifest.json and a data directory with one .npy file per column:
+    - text columns (Date/Time, Opponent, Line, Event Type, Action, ...) are stored as categorical codes
+    - Passer, Receiver, Defender and the 28 "Player N" slots are packed into one integer player id matrix,
+      sharing a single roster of player names
+    - Date/Time is also parsed into a datetime column (PARSED_DATE_COLUMN)
+    - numeric columns are downcast to the smallest integer type that holds them
+
+The cache is rebuilt when the source file changes (mtime/size, confirmed with a sha1 hash of the contents).
+Every rebuild writes its column files into a fresh data directory (v<timestamp>-<pid>), then swaps in the manifest that
+names it with a single os.replace.  A reader always decodes the column files of the manifest it parsed, with that
+manifest's categories and roster, and column files are never rewritten in place, so memory-mapped readers are not
+disturbed.  The previous data directory is kept for readers that parsed the old manifest but have not opened its files
+yet; older ones are removed.
+
+Example:
+        from season_store import load_season_csv
+        atl = load_season_csv("data/AtlantaHustle2019-stats.csv")
+
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+STORE_VERSION = 2
+PARSED_DATE_COLUMN = 'Date/Time Parsed'
+DATE_FORMAT = '%m/%d/%Y %H:%M'
+PLAYER_COLUMNS = ['Passer', 'Receiver', 'Defender'] + ['Player {}'.format(i) for i in range(28)]
+
+def get_file_signature(path, with_hash=True):
+    ''' Describe a source file so that a cache built from it can be invalidated
+
+        Parameters:
+            path             -     path to the source .csv file
+            with_hash        -     also compute the sha1 of the file contents
+
+        Returns:
+            signature        -     dictionary with the file's mtime_ns, size and (optionally) sha1
+    '''
+    stat = os.stat(path)
+    signature = {'mtime_ns':stat.st_mtime_ns, 'size':stat.st_size}
+    if with_hash:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        signature['sha1'] = sha1.hexdigest()
+    return(signature)
+
+def get_store_dir(csv_path, cache_dir=None):
+    ''' Cache directory used for a given source file: <cache_dir>/<file name without extension>
+    '''
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(csv_path), ".cache")
+    return(os.path.join(cache_dir, os.path.splitext(os.path.basename(csv_path))[0]))
+
+def _as_text(series):
+    ''' Text column values as str (keeping missing values missing), so categories sort and serialize cleanly
+    '''
+    return(series.where(series.isna(), series.astype(str)))
+
+def _replace_file(path, write):
+    ''' Write a file through a temporary file in the same directory and atomically move it over path
+    '''
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _save_manifest(path, manifest):
+    _replace_file(path, lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+
+def _get_data_dir_time(name):
+    return(int(name[1:].split('-')[0]))
+
+def _remove_old_data_dirs(store_dir, previous_dir):
+    ''' Delete the data directories of store_dir created before previous_dir
+         - newer ones are kept: they may belong to a rebuild still being written by another process
+    '''
+    if previous_dir is None:
+        return
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        if re.match(r'^v\d+-\d+$', name) and _get_data_dir_time(name) < _get_data_dir_time(previous_dir) and os.path.isdir(path):
+            for file_name in os.listdir(path):
+                os.remove(os.path.join(path, file_name))
+            os.rmdir(path)
+
+def write_season_store(df, store_dir, source_signature=None):
+    ''' Write a season play-by-play dataframe into a columnar store directory
+
+        Parameters:
+            df                -     pandas dataframe of season play-by-play stats (as read from the .csv)
+            store_dir         -     directory to write manifest.json and the data directory of .npy column files to
+            source_signature  -     output of get_file_signature for the source file, saved for cache invalidation
+
+        Returns:
+            manifest          -     dictionary describing the stored columns
+    '''
+    os.makedirs(store_dir, exist_ok=True)
+    manifest_path = os.path.join(store_dir, 'manifest.json')
+    previous_dir = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous_dir = json.load(f).get('data_dir')
+    data_name = 'v{}-{}'.format(time.time_ns(), os.getpid())
+    data_dir = os.path.join(store_dir, data_name)
+    os.makedirs(data_dir)
+
+    player_cols = [c for c in PLAYER_COLUMNS if c in df.columns]
+    player_values = pd.concat([_as_text(df[c]) for c in player_cols], ignore_index=True) if player_cols else pd.Series([], dtype=object)
+    roster = sorted(player_values.dropna().unique().tolist())
+    roster_index = pd.Index(roster)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        entry = {'name':col}
+        if col in player_cols:
+            entry['kind'] = 'player'
+            columns.append(entry)
+            continue
+
+        series = df[col]
+        file_name = 'col{}.npy'.format(i)
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            if pd.api.types.is_integer_dtype(series):
+                values = pd.to_numeric(series, downcast='integer').to_numpy()
+            else:
+                values = series.to_numpy(dtype=np.float64)
+            entry['kind'] = 'numeric'
+        else:
+            categorical = pd.Categorical(_as_text(series))
+            values = categorical.codes
+            entry['kind'] = 'category'
+            entry['categories'] = categorical.categories.tolist()
+        entry['file'] = file_name
+        np.save(os.path.join(data_dir, file_name), values)
+        columns.append(entry)
+
+    if player_cols:
+        player_ids = np.full((len(df), len(player_cols)), -1, dtype=np.int32 if len(roster) >= 32767 else np.int16)
+        for j, col in enumerate(player_cols):
+            names = _as_text(df[col])
+            present = names.notna().to_numpy()
+            player_ids[present, j] = roster_index.get_indexer(names[present])
+        np.save(os.path.join(data_dir, 'players.npy'), player_ids)
+
+    if 'Date/Time' in df.columns:
+        parsed = pd.to_datetime(df['Date/Time'], format=DATE_FORMAT, errors='coerce')
+        np.save(os.path.join(data_dir, 'parsed_date.npy'), parsed.to_numpy(dtype='datetime64[ns]'))
+        columns.append({'name':PARSED_DATE_COLUMN, 'kind':'datetime', 'file':'parsed_date.npy'})
+
+    manifest = {'version':STORE_VERSION,
+                'data_dir':data_name,
+                'n_rows':len(df),
+                'source':source_signature,
+                'columns':columns,
+                'player_columns':player_cols,
+                'roster':roster}
+    _save_manifest(manifest_path, manifest)
+    _remove_old_data_dirs(store_dir, previous_dir)
+    return(manifest)
+
+def read_season_store(store_dir, mmap=True):
+    ''' Load a columnar store back into a dataframe with the original column names
+         - numeric and datetime columns are memory-mapped (read-only) when mmap=True
+         - text columns come back as categoricals, player slots as categoricals sharing the store roster
+
+        Parameters:
+            store_dir        -     directory written by write_season_store
+            mmap             -     memory-map the column files instead of reading them into memory
+
+        Returns:
+            df               -     pandas dataframe of season play-by-play stats
+    '''
+    with open(os.path.join(store_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    mmap_mode = 'r' if mmap else None
+    data_dir = os.path.join(store_dir, manifest['data_dir'])
+
+    roster = pd.Index(manifest['roster'], dtype=object)
+    player_ids = None
+    if manifest['player_columns']:
+        player_ids = np.load(os.path.join(data_dir, 'players.npy'), mmap_mode=mmap_mode)
+    player_slot = {c:j for j, c in enumerate(manifest['player_columns'])}
+
+    data = {}
+    for entry in manifest['columns']:
+        col = entry['name']
+        if entry['kind'] == 'player':
+            data[col] = pd.Categorical.from_codes(np.asarray(player_ids[:, player_slot[col]]), categories=roster)
+            continue
+        values = np.load(os.path.join(data_dir, entry['file']), mmap_mode=mmap_mode)
+        if entry['kind'] == 'category':
+            data[col] = pd.Categorical.from_codes(np.asarray(values), categories=pd.Index(entry['categories'], dtype=object))
+        else:
+            data[col] = values
+
+    df = pd.DataFrame(data, copy=False)
+    return(df)
+
+def is_store_current(store_dir, csv_path):
+    ''' Check whether the store directory was built from the current contents of csv_path
+         - matching mtime and size is trusted; otherwise the sha1 of the contents decides
+    '''
+    manifest_path = os.path.join(store_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return(False)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    source = manifest.get('source') or {}
+    if manifest.get('version') != STORE_VERSION:
+        return(False)
+
+    signature = get_file_signature(csv_path, with_hash=False)
+    if signature['mtime_ns'] == source.get('mtime_ns') and signature['size'] == source.get('size'):
+        return(True)
+    if signature['size'] != source.get('size'):
+        return(False)
+
+    ## Touched but possibly unchanged: compare contents and refresh the saved mtime if they match
+    signature = get_file_signature(csv_path)
+    if signature['sha1'] != source.get('sha1'):
+        return(False)
+    manifest['source'] = signature
+    _save_manifest(manifest_path, manifest)
+    return(True)
+
+def load_season_csv(csv_path, cache_dir=None, refresh=False, mmap=True):
+    ''' Load a team's season .csv through the columnar cache, (re)building the cache when the source changed
+
+        Parameters:
+            csv_path         -     path to a data/<Team>2019-stats.csv file
+            cache_dir        -     directory holding the caches.  Leave blank for a .cache directory next to the .csv
+            refresh          -     force a rebuild of the cache
+            mmap             -     memory-map the cached columns
+
+        Returns:
+            df               -     pandas dataframe of season play-by-play stats (see read_season_store)
+    '''
+    store_dir = get_store_dir(csv_path, cache_dir)
+    if refresh or not is_store_current(store_dir, csv_path):
+        signature = get_file_signature(csv_path)
+        write_season_store(pd.read_csv(csv_path), store_dir, source_signature=signature)
+    return(read_season_store(store_dir, mmap=mmap))
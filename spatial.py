@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""spatial.py aggregates the field coordinate columns (Begin/End X/Y and the distance columns) of a season.
+
+Only some teams track coordinates, so every function works on the throws whose coordinates are present and ignores
+the rest.  Begin/End Y is the normalized position across the width (0-1 over FIELD_WIDTH yards).  Begin/End X is the
+normalized position along the length within the Begin/End Area: 'Field' spans FIELD_LENGTH yards from the Endzone A
+goal line, 'Endzone A' and 'Endzone B' span ENDZONE_DEPTH yards, X increasing toward Endzone B in all three.
+Distances are converted to yards using the 'Distance Unit of Measure' column.  All aggregates are np.histogram/
+np.histogram2d/np.bincount over the whole league at once.
+
+The file positions are absolute, and the end zone a team attacks changes from point to point.  get_throws adds
+Begin/End Depth, the position along the length seen from the team with the disc: 0 is the back line of the end zone
+it defends, 1 the back line of the end zone it attacks (so the attacked end zone is Depth >= ATTACKING_ENDZONE_DEPTH).
+The direction of each point comes from the 'Toward Our Goal Distance' of its throws (see get_attack_directions).
+The zone grids bin Y across the field and Depth along it.
+
+Example:
+        from spatial import get_throws, get_zone_completion_grid
+        throws = get_throws(teams_dict)
+        grid = get_zone_completion_grid(throws)
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from point_table import GAME_COLUMNS, get_league_frame, get_point_ids
+
+## Offense actions that are throw attempts, and the ones that are completions
+THROW_ACTIONS = ['Catch', 'Goal', 'Throwaway', 'Drop', 'Callahan']
+COMPLETED_ACTIONS = ['Catch', 'Goal']
+
+COORDINATE_COLUMNS = ['Begin X', 'Begin Y', 'End X', 'End Y']
+DISTANCE_COLUMNS = ['Absolute Distance', 'Lateral Distance', 'Toward Our Goal Distance']
+
+## Multiply distances in each unit by this to get yards
+YARDS_PER_UNIT = {'yds':1.0, 'm':1.0936133}
+
+## Field dimensions in yards
+FIELD_LENGTH = 80.0
+ENDZONE_DEPTH = 20.0
+FIELD_WIDTH = 160.0 / 3
+TOTAL_LENGTH = FIELD_LENGTH + 2 * ENDZONE_DEPTH
+ATTACKING_ENDZONE_DEPTH = (ENDZONE_DEPTH + FIELD_LENGTH) / TOTAL_LENGTH
+
+def get_distances_in_yards(df):
+    ''' The DISTANCE_COLUMNS of df converted to yards (NaN where the unit is missing or unknown)
+    '''
+    factor = df['Distance Unit of Measure'].map(YARDS_PER_UNIT).to_numpy(dtype=float)
+    return(df[DISTANCE_COLUMNS].to_numpy(dtype=float) * factor[:, None])
+
+def get_length_positions(area, x):
+    ''' Position along the length in yards from the back line of Endzone A (0 to TOTAL_LENGTH), NaN for unknown areas
+
+        Parameters:
+            area             -     'Begin Area' or 'End Area' values
+            x                -     the matching 'Begin X' or 'End X' values
+    '''
+    area = np.asarray(area, dtype=object)
+    x = np.asarray(x, dtype=float)
+    offset = np.select([area == 'Endzone A', area == 'Field', area == 'Endzone B'],
+                       [0.0, ENDZONE_DEPTH, ENDZONE_DEPTH + FIELD_LENGTH], np.nan)
+    length = np.where(area == 'Field', FIELD_LENGTH, ENDZONE_DEPTH)
+    return(offset + x * length)
+
+def get_attack_directions(df_league, point_ids=None):
+    ''' End zone the team attacks on each row's point: 1 for Endzone B, -1 for Endzone A, 0 when it cannot be told
+         - 'Toward Our Goal Distance' has the sign of the move toward the attacked end zone, so on every row with
+           coordinates (the team's throws and the opponent's) toward * (End - Begin position) is positive when the team
+           attacks Endzone B and negative when it attacks Endzone A
+         - the products are summed over the point, which lets the long throws outweigh the sideways ones
+
+        Parameters:
+            df_league        -     dataframe of play-by-play rows with a 'Team' column, in file order
+            point_ids        -     output of point_table.get_point_ids.  Leave blank to compute it
+
+        Returns:
+            directions       -     integer array aligned with df_league
+    '''
+    if point_ids is None:
+        point_ids = get_point_ids(df_league)
+    moved = get_length_positions(df_league['End Area'], df_league['End X']) - \
+            get_length_positions(df_league['Begin Area'], df_league['Begin X'])
+    toward = df_league['Toward Our Goal Distance'].to_numpy(dtype=float)
+    agreement = moved * toward
+    known = np.isfinite(agreement) & (point_ids >= 0)
+
+    directions = np.zeros(len(df_league), dtype=np.int64)
+    if not known.any():
+        return(directions)
+    point_agreement = np.bincount(point_ids[known], weights=agreement[known], minlength=point_ids.max() + 1)
+    in_point = point_ids >= 0
+    directions[in_point] = np.sign(point_agreement[point_ids[in_point]]).astype(np.int64)
+    return(directions)
+
+def get_attacking_depth(area, x, directions):
+    ''' Normalized position along the length seen from the team with the disc (see the module docstring), NaN when
+        the direction is unknown
+    '''
+    position = get_length_positions(area, x) / TOTAL_LENGTH
+    return(np.select([directions > 0, directions < 0], [position, 1.0 - position], np.nan))
+
+def get_throws(teams_dict=None, df_league=None):
+    ''' Every offensive throw attempt that has field coordinates
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+
+        Returns:
+            throws           -     dataframe with the GAME_COLUMNS, Action, Completed (bool), the COORDINATE_COLUMNS,
+                                   Begin/End Depth (NaN when the point's direction is unknown) and the DISTANCE_COLUMNS
+                                   in yards, one row per throw
+    '''
+    if df_league is None:
+        df_league = get_league_frame(teams_dict)
+    df_league = df_league.reset_index(drop=True)
+
+    rows = ((df_league['Event Type'] == 'Offense') & df_league['Action'].isin(THROW_ACTIONS)).to_numpy() & \
+           np.isfinite(df_league[COORDINATE_COLUMNS].to_numpy(dtype=float)).all(axis=1)
+    directions = get_attack_directions(df_league)[rows]
+    df = df_league.loc[rows]
+
+    throws = df[GAME_COLUMNS + ['Action']].reset_index(drop=True)
+    throws['Completed'] = df['Action'].isin(COMPLETED_ACTIONS).to_numpy()
+    throws[COORDINATE_COLUMNS] = df[COORDINATE_COLUMNS].to_numpy(dtype=float)
+    throws['Begin Depth'] = get_attacking_depth(df['Begin Area'], df['Begin X'], directions)
+    throws['End Depth'] = get_attacking_depth(df['End Area'], df['End X'], directions)
+    throws[DISTANCE_COLUMNS] = get_distances_in_yards(df)
+    return(throws)
+
+def get_throw_distance_distribution(throws, column='Absolute Distance', bins=np.arange(0, 125, 5)):
+    ''' Distribution of throw distances and the completion rate of each distance bin
+
+        Parameters:
+            throws           -     output of get_throws
+            column           -     distance column to bin, one of DISTANCE_COLUMNS
+            bins             -     bin edges in yards (np.histogram convention)
+
+        Returns:
+            df_distances     -     dataframe indexed by bin start with Attempts, Completions, Share (of attempts) and CompletionRate
+    '''
+    distance = throws[column].to_numpy()
+    known = np.isfinite(distance)
+    attempts, edges = np.histogram(distance[known], bins=bins)
+    completions, _ = np.histogram(distance[known], bins=bins, weights=throws['Completed'].to_numpy(dtype=float)[known])
+
+    df_distances = pd.DataFrame({'Attempts':attempts, 'Completions':completions.astype(np.int64)},
+                                index=pd.Index(edges[:-1], name=column))
+    df_distances['Share'] = df_distances['Attempts'] / max(attempts.sum(), 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        df_distances['CompletionRate'] = completions / attempts
+    return(df_distances)
+
+def get_zone_completion_grid(throws, x_bins=5, y_bins=10, position='Begin'):
+    ''' Throw attempts, completions and completion rate on a 2D grid of field zones
+         - x is the position across the field (Y), y the position along it toward the attacked end zone (Depth), so
+           the last y zones are the attacked end zone whichever way the team was going; throws without a Depth are left out
+
+        Parameters:
+            throws           -     output of get_throws
+            x_bins           -     number of zones across the field (or bin edges, in normalized 0-1 units)
+            y_bins           -     number of zones along the field (or bin edges).  With 6 zones the last one is the
+                                   attacked end zone
+            position         -     bin by where the throw was released ('Begin') or where it ended ('End')
+
+        Returns:
+            grid             -     dictionary with x_edges, y_edges and the (x, y) arrays attempts, completions and
+                                   completion_rate (NaN for zones without throws)
+    '''
+    oriented = np.isfinite(throws[position + ' Depth'].to_numpy())
+    x = throws[position + ' Y'].to_numpy()[oriented]
+    y = throws[position + ' Depth'].to_numpy()[oriented]
+    completed = throws['Completed'].to_numpy().astype(float)[oriented]
+    bins = [x_bins, y_bins]
+    field = [[0, 1], [0, 1]]
+
+    attempts, x_edges, y_edges = np.histogram2d(x, y, bins=bins, range=field)
+    completions, _, _ = np.histogram2d(x, y, bins=bins, range=field, weights=completed)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        completion_rate = completions / attempts
+
+    grid = {'x_edges':x_edges, 'y_edges':y_edges,
+            'attempts':attempts.astype(np.int64), 'completions':completions.astype(np.int64),
+            'completion_rate':completion_rate}
+    return(grid)
+
+def get_team_zone_completion_grids(throws, x_bins=5, y_bins=10, position='Begin'):
+    ''' get_zone_completion_grid for every team, computed in one np.bincount over (team, x zone, y zone)
+
+        Returns:
+            grids            -     dictionary key: team, value: grid dictionary (see get_zone_completion_grid)
+    '''
+    team_codes, teams = pd.factorize(throws['Team'], sort=True)
+    oriented = np.isfinite(throws[position + ' Depth'].to_numpy())
+    team_codes = team_codes[oriented]
+    x_edges = np.linspace(0, 1, x_bins + 1)
+    y_edges = np.linspace(0, 1, y_bins + 1)
+    ## same bin convention as np.histogram2d: the last bin includes its right edge
+    x_zone = np.clip(np.searchsorted(x_edges, throws[position + ' Y'].to_numpy()[oriented], side='right') - 1, 0, x_bins - 1)
+    y_zone = np.clip(np.searchsorted(y_edges, throws[position + ' Depth'].to_numpy()[oriented], side='right') - 1, 0, y_bins - 1)
+
+    cell = (team_codes * x_bins + x_zone) * y_bins + y_zone
+    size = len(teams) * x_bins * y_bins
+    shape = (len(teams), x_bins, y_bins)
+    attempts = np.bincount(cell, minlength=size).reshape(shape)
+    completions = np.bincount(cell, weights=throws['Completed'].to_numpy().astype(float)[oriented], minlength=size).reshape(shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        completion_rate = completions / attempts
+
+    grids = {}
+    for i, tm in enumerate(teams):
+        grids[tm] = {'x_edges':x_edges, 'y_edges':y_edges,
+                     'attempts':attempts[i], 'completions':completions[i].astype(np.int64),
+                     'completion_rate':completion_rate[i]}
+    return(grids)
+
+def get_possession_yardage(teams_dict=None, df_league=None):
+    ''' Yards gained toward the attacking end zone on each possession of the games with field coordinates
+         - a possession is a run of consecutive Offense rows within a point
+         - yards gained is the sum of 'Toward Our Goal Distance' over the possession's completed throws
+         - possessions with any throw missing its coordinates are left out
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+
+        Returns:
+            df_possessions   -     dataframe with the GAME_COLUMNS, Throws, Completions, Yards and Scored, one row per possession
+    '''
+    if df_league is None:
+        df_league = get_league_frame(teams_dict)
+    df_league = df_league.reset_index(drop=True)
+
+    point_ids = get_point_ids(df_league)
+    offense = (df_league['Event Type'] == 'Offense').to_numpy() & (point_ids >= 0)
+    ## a new possession starts on an Offense row whose previous row is not an Offense row of the same point
+    starts = offense.copy()
+    starts[1:] &= ~(offense[:-1] & (point_ids[1:] == point_ids[:-1]))
+    possession = np.cumsum(starts) - 1
+
+    rows = np.flatnonzero(offense)
+    action = df_league['Action'].to_numpy()[rows]
+    is_throw = np.isin(action, THROW_ACTIONS)
+    completed = np.isin(action, COMPLETED_ACTIONS)
+    located = np.isfinite(df_league[COORDINATE_COLUMNS].to_numpy(dtype=float)[rows]).all(axis=1)
+    gained = get_distances_in_yards(df_league.iloc[rows])[:, DISTANCE_COLUMNS.index('Toward Our Goal Distance')]
+
+    ids, first = np.unique(possession[rows], return_index=True)
+    index = np.searchsorted(ids, possession[rows])
+    n = len(ids)
+    throws = np.bincount(index, weights=is_throw, minlength=n)
+    missing = np.bincount(index, weights=is_throw & ~located, minlength=n)
+    completions = np.bincount(index, weights=completed, minlength=n)
+    yards = np.bincount(index, weights=np.where(completed & located, gained, 0.0), minlength=n)
+    scored = np.bincount(index, weights=(action == 'Goal'), minlength=n) > 0
+
+    df_possessions = df_league.iloc[rows[first]][GAME_COLUMNS].reset_index(drop=True)
+    df_possessions['Throws'] = throws.astype(np.int64)
+    df_possessions['Completions'] = completions.astype(np.int64)
+    df_possessions['Yards'] = yards
+    df_possessions['Scored'] = scored
+    keep = (missing == 0) & (throws > 0)
+    return(df_possessions[keep].reset_index(drop=True))
+
+def get_team_yardage_summary(df_possessions):
+    ''' Yards per possession by team, and for scoring vs non-scoring possessions
+
+        Returns:
+            df_yardage       -     dataframe indexed by team with Possessions, YardsPerPossession, YardsPerScoringPossession
+                                   and YardsPerNonScoringPossession
+    '''
+    teams = df_possessions.groupby('Team', sort=True)
+    df_yardage = pd.DataFrame({'Possessions':teams.size(), 'YardsPerPossession':teams['Yards'].mean()})
+    by_outcome = df_possessions.groupby(['Team', 'Scored'], sort=True)['Yards'].mean().unstack('Scored')
+    df_yardage['YardsPerScoringPossession'] = by_outcome.get(True)
+    df_yardage['YardsPerNonScoringPossession'] = by_outcome.get(False)
+    return(df_yardage)
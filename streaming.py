@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""streaming.py computes the season game stats and possession counts without loading whole team files.
+
+The <Team><season>-stats.csv files are read in chunks (pd.read_csv(chunksize=...)) and cut into runs of rows with the
+same Date/Time and Opponent.  The last, possibly unfinished, run of a chunk is carried over to the next chunk, so every
+run is yielded complete.  The runs feed an aggregator that only keeps counts: the per-game action counts and pull
+hangtimes behind game_dict, and the catch counts of every possession.
+
+The aggregator uses the game key of the batch path, (team, Date/Time), as collect_stats_for_teams and
+get_season_sequences do.  Some files have several opponents under one Date/Time (e.g. '5/4/2019 0:00' in the DC Breeze
+and Montreal Royal files), possibly in several places of the file; all those rows make up one game.  To segment such a
+game's possessions like get_season_sequences, the few columns the segmentation needs (SEQUENCE_COLUMNS) are buffered
+until the team's file is done, so memory stays bounded by one chunk plus those columns of one team file.
+
+The results match get_game_stats (up to float rounding of the average hangtimes) and the collect_and_plot_passes_nb
+counts.
+
+Example:
+        python streaming.py --data data --season 2019 --out stats_2019
+
+        from streaming import stream_season
+        game_dict, df_stats, team_counts = stream_season("data", season=2019)
+
+"""
+
+import argparse
+
+import pandas as pd
+
+from league_loader import find_team_files
+from utils import build_game_dict, flatten_out_games, get_season_sequences, save_game_stats
+
+## Columns the aggregators need, read by default to keep chunks small
+STREAM_COLUMNS = ['Date/Time', 'Opponent', 'Line', 'Event Type', 'Action', 'Hang Time (secs)',
+                  'Our Score - End of Point', 'Their Score - End of Point']
+## Columns get_season_sequences needs, buffered per team until its file is done
+SEQUENCE_COLUMNS = ['Date/Time', 'Opponent', 'Event Type', 'Action', 'Our Score - End of Point', 'Their Score - End of Point']
+
+def iter_games(path, chunksize=50000, usecols=STREAM_COLUMNS):
+    ''' Read a team file in chunks and yield its games one at a time, in file order
+
+        Parameters:
+            path             -     path to a <Team><season>-stats.csv file
+            chunksize        -     rows read per chunk
+            usecols          -     columns to read.  Use None for every column
+
+        Yields:
+            date_time, opponent, df_game   -   the game's Date/Time and Opponent, and its rows
+    '''
+    carry = None
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=usecols):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        game_key = chunk['Date/Time'].astype(str) + '\x1f' + chunk['Opponent'].astype(str)
+        starts = (game_key != game_key.shift()).to_numpy().nonzero()[0]
+        for begin, end in zip(starts[:-1], starts[1:]):
+            df_game = chunk.iloc[begin:end]
+            yield(df_game['Date/Time'].iloc[0], df_game['Opponent'].iloc[0], df_game)
+        carry = chunk.iloc[starts[-1]:]
+    if carry is not None and len(carry) > 0:
+        yield(carry['Date/Time'].iloc[0], carry['Opponent'].iloc[0], carry)
+
+def iter_league_games(directory="data", season=2019, chunksize=50000, usecols=STREAM_COLUMNS):
+    ''' iter_games over every team file of a season (see league_loader.find_team_files)
+
+        Yields:
+            team, date_time, opponent, df_game
+    '''
+    for team, _, path in find_team_files(directory, season=season):
+        for date_time, opponent, df_game in iter_games(path, chunksize=chunksize, usecols=usecols):
+            yield(team, date_time, opponent, df_game)
+
+def create_season_aggregator():
+    ''' Empty state for add_game / finish_season_aggregator
+         - games: (team, Date/Time) -> Opponent, in the order the games were first seen
+         - action_counts: (team, Date/Time, Line, Event Type, Action) -> count
+         - pull_hangtime: (team, Date/Time) -> [sum, count] of the timed pulls
+         - team_counts: team -> list of catch counts per possession
+         - pending: team -> SEQUENCE_COLUMNS pieces of the team's games not segmented yet (see flush_team_possessions)
+    '''
+    aggregator = {'games':{},
+                  'action_counts':{},
+                  'pull_hangtime':{},
+                  'team_counts':{},
+                  'pending':{},
+                  'n_games':0,
+                  'n_rows':0,
+                  'max_game_rows':0}
+    return(aggregator)
+
+def add_game(aggregator, team, df_game):
+    ''' Accumulate one game (or one piece of a game) of a team's file into the aggregator
+    '''
+    dte = df_game['Date/Time'].iloc[0]
+    aggregator['games'].setdefault((team, dte), df_game['Opponent'].iloc[0])
+    aggregator['n_games'] += 1
+    aggregator['n_rows'] += len(df_game)
+    aggregator['max_game_rows'] = max(aggregator['max_game_rows'], len(df_game))
+
+    df_events = df_game[df_game['Event Type'].isin(['Offense','Defense'])]
+    action_counts = aggregator['action_counts']
+    counts = df_events.groupby(['Date/Time','Line','Event Type','Action'], sort=False, dropna=False).size()
+    for (dte_i, line, event_type, action), n in counts.items():
+        kee = (team, dte_i, line, event_type, action)
+        action_counts[kee] = action_counts.get(kee, 0) + int(n)
+
+    pulls = df_game[(df_game['Event Type'] == 'Defense') & (df_game['Action'] == 'Pull')]['Hang Time (secs)'].dropna()
+    if len(pulls) > 0:
+        hangtime = aggregator['pull_hangtime'].setdefault((team, dte), [0.0, 0])
+        hangtime[0] += pulls.sum()
+        hangtime[1] += len(pulls)
+
+    aggregator['pending'].setdefault(team, []).append(df_game[SEQUENCE_COLUMNS])
+
+def flush_team_possessions(aggregator, team):
+    ''' Segment the buffered games of a team into possessions (as get_season_sequences, one game per Date/Time) and
+        add their catch counts.  Call it once the team's file is done
+    '''
+    pieces = aggregator['pending'].pop(team, [])
+    team_counts = aggregator['team_counts'].setdefault(team, [])
+    if not pieces:
+        return
+    date_sequences = get_season_sequences({team:pd.concat(pieces, ignore_index=True)}, [team])[team]
+    for sequences in date_sequences.values():
+        for point_sequences in sequences.values():
+            team_counts.extend(len(possession) - 1 for possession in point_sequences)
+
+def finish_season_aggregator(aggregator):
+    ''' Turn the aggregated counts into the batch outputs
+
+        Returns:
+            game_dict        -     as collect_stats_for_teams
+            df_stats         -     as flatten_out_games
+            team_counts      -     dictionary key: team, value: sorted catch counts (as convert_date_sequences_to_list_and_count)
+    '''
+    for team in list(aggregator['pending'].keys()):
+        flush_team_possessions(aggregator, team)
+    df_games = pd.DataFrame([(tm, dte, opponent) for (tm, dte), opponent in aggregator['games'].items()],
+                            columns=['Team','Date/Time','Opponent'])
+    index_names = ['Team','Date/Time','Line','Event Type','Action']
+    action_counts = pd.Series(list(aggregator['action_counts'].values()), dtype='int64',
+                              index=pd.MultiIndex.from_tuples(list(aggregator['action_counts'].keys()), names=index_names))
+    hangtimes = pd.Series({kee:total / n for kee, (total, n) in aggregator['pull_hangtime'].items()}, dtype=float)
+
+    game_dict = build_game_dict(df_games, action_counts, hangtimes)
+    df_stats = flatten_out_games(game_dict)
+    ## convert_date_sequences_to_list_and_count sorts a team's counts and leaves out the last (largest) one
+    team_counts = {tm:sorted(counts)[:-1] for tm, counts in aggregator['team_counts'].items()}
+    return(game_dict, df_stats, team_counts)
+
+def stream_season(directory="data", season=2019, chunksize=50000):
+    ''' Compute game_dict, df_stats and the possession catch counts of a season by streaming its team files
+
+        Parameters:
+            directory        -     directory holding the <TeamName><season>-stats.csv files
+            season           -     season (year) to process.  Use None for the files of every season
+            chunksize        -     rows read per chunk
+
+        Returns:
+            game_dict, df_stats, team_counts   -   see finish_season_aggregator
+    '''
+    aggregator = create_season_aggregator()
+    previous_team = None
+    for team, _, _, df_game in iter_league_games(directory, season=season, chunksize=chunksize):
+        if previous_team is not None and team != previous_team:
+            flush_team_possessions(aggregator, previous_team)
+        previous_team = team
+        add_game(aggregator, team, df_game)
+    return(finish_season_aggregator(aggregator))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream the team files of a season and save its game stats")
+    parser.add_argument('--data', default='data', help="directory holding the <Team><season>-stats.csv files")
+    parser.add_argument('--season', type=int, default=2019)
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--out', default='stats', help="output directory for game_dict.json and df_stats.csv")
+    args = parser.parse_args(argv)
+
+    game_dict, df_stats, _ = stream_season(args.data, season=args.season, chunksize=args.chunksize)
+    save_game_stats(game_dict, df_stats, args.out)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""team_executor.py runs a per-team function over the teams of a teams_dict, serially or in a thread or process pool.
+
+Results always come back in teams_list order, so callers can merge them deterministically.  With the process backend
+the team frames are not sent with every task: they are handed to each worker once through the pool initializer
+(inherited without a copy by forked workers, pickled once per worker otherwise), and each task only carries the team
+name.  Nothing is shared between calls, so map_teams can be called from several threads at once.  Fork is only used
+while the calling process has a single thread; otherwise the pool starts its workers with forkserver (or spawn).
+
+Example:
+        from team_executor import map_teams
+        results = map_teams(func, teams_dict, teams_list, backend='process', workers=8)
+
+"""
+
+import multiprocessing
+import threading
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+BACKENDS = ['serial', 'thread', 'process']
+
+## Team frames of the process pool workers
+_WORKER_TEAMS = {}
+
+def _init_worker(teams_dict):
+    global _WORKER_TEAMS
+    _WORKER_TEAMS = teams_dict
+
+def _run_team_task(task):
+    func, tm = task
+    return(func(tm, _WORKER_TEAMS[tm]))
+
+def get_process_context(mp_context=None):
+    ''' multiprocessing context of the process pools
+         - mp_context can be a context or a start method name ('fork', 'forkserver', 'spawn')
+         - left blank: 'fork' when available and this process runs a single thread (forking a multithreaded process
+           can deadlock the child), else 'forkserver' when available, else 'spawn'
+    '''
+    if mp_context is not None and not isinstance(mp_context, str):
+        return(mp_context)
+    methods = multiprocessing.get_all_start_methods()
+    if mp_context is None:
+        if 'fork' in methods and threading.active_count() == 1:
+            mp_context = 'fork'
+        elif 'forkserver' in methods:
+            mp_context = 'forkserver'
+        else:
+            mp_context = 'spawn'
+    return(multiprocessing.get_context(mp_context))
+
+def map_teams(func, teams_dict, teams_list=None, backend='serial', workers=None, mp_context=None):
+    ''' Run func(team, team_frame) for every team
+
+        Parameters:
+            func             -     module level function of (team name, team dataframe)
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            teams_list       -     teams to run.  Leave blank for every team in teams_dict
+            backend          -     'serial', 'thread' or 'process'
+            workers          -     pool size.  Leave blank for one per CPU
+            mp_context       -     multiprocessing context or start method of the process pool (see get_process_context)
+
+        Returns:
+            results          -     list of func outputs, in teams_list order
+    '''
+    if teams_list is None:
+        teams_list = list(teams_dict.keys())
+    if backend not in BACKENDS:
+        raise ValueError("backend must be one of {}, not {!r}".format(BACKENDS, backend))
+
+    if backend == 'serial' or len(teams_list) <= 1:
+        return([func(tm, teams_dict[tm]) for tm in teams_list])
+
+    if backend == 'thread':
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return(list(executor.map(lambda tm: func(tm, teams_dict[tm]), teams_list)))
+
+    team_frames = {tm:teams_dict[tm] for tm in teams_list}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_process_context(mp_context),
+                             initializer=_init_worker, initargs=(team_frames,)) as executor:
+        return(list(executor.map(_run_team_task, [(func, tm) for tm in teams_list])))
@@ -0,0 +1,60 @@
+
+import pytest
+
+from game_cache import cached_avg_hangtime, cached_event_counts, create_game_cache, get_cache_stats, get_game_rows
+from league_loader import load_league
+from utils import get_avg_hangtime, get_event_counts
+
+
+@pytest.fixture(scope='module')
+def team_dict():
+    return(load_league("data", season=2019, processes=1))
+
+
+def test_cached_stats_equal_direct_stats(team_dict):
+    cache = create_game_cache()
+    for team, df in team_dict.items():
+        for (date_time, opponent), df_game in df.groupby(['Date/Time', 'Opponent'], sort=False):
+            ## the same filtering as unit_test_gamestat.game_stat_test
+            df_direct = df[df['Opponent'] == opponent]
+            df_direct = df_direct[df_direct['Date/Time'] == date_time]
+            assert cached_avg_hangtime(team_dict, team, date_time, opponent, cache=cache) == get_avg_hangtime(df_direct)
+            for line in [None, 'offense', 'defense']:
+                direct = get_event_counts(df_direct) if line is None else get_event_counts(df_direct, line=line)
+                assert cached_event_counts(team_dict, team, date_time, opponent, line=line, cache=cache) == direct
+
+    ## every result is served from the cache the second time
+    misses = get_cache_stats(cache)['misses']
+    df = team_dict['San Jose Spiders']
+    date_time, opponent = df['Date/Time'].iloc[0], df['Opponent'].iloc[0]
+    cached_event_counts(team_dict, 'San Jose Spiders', date_time, opponent, cache=cache)
+    assert get_cache_stats(cache)['misses'] == misses
+
+
+def test_game_rows_by_date_and_opponent(team_dict):
+    cache = create_game_cache()
+    df = team_dict['Seattle Cascades']
+    date_time, opponent = df['Date/Time'].iloc[0], df['Opponent'].iloc[0]
+    expected = df[(df['Date/Time'] == date_time) & (df['Opponent'] == opponent)]
+
+    assert get_game_rows(team_dict, 'Seattle Cascades', date_time, opponent, cache=cache).equals(expected)
+    assert get_game_rows(team_dict, 'Seattle Cascades', date_time, cache=cache).equals(df[df['Date/Time'] == date_time])
+    assert len(get_game_rows(team_dict, 'Seattle Cascades', date_time, 'Nobody', cache=cache)) == 0
+    assert len(get_game_rows(team_dict, 'Seattle Cascades', '1/1/1900 0:00', cache=cache)) == 0
+
+
+def test_replaced_frame_is_rehashed(team_dict):
+    cache = create_game_cache()
+    df = team_dict['Seattle Cascades']
+    date_time, opponent = df['Date/Time'].iloc[0], df['Opponent'].iloc[0]
+    teams = {'Seattle Cascades':df.copy()}
+    before = cached_event_counts(teams, 'Seattle Cascades', date_time, opponent, cache=cache)
+
+    ## a new frame of the same shape (which may get the id of the collected one) with the game's actions changed
+    del teams['Seattle Cascades']
+    df_new = df.copy()
+    df_new.loc[(df_new['Date/Time'] == date_time) & (df_new['Action'] == 'Catch'), 'Action'] = 'Drop'
+    teams['Seattle Cascades'] = df_new
+    after = cached_event_counts(teams, 'Seattle Cascades', date_time, opponent, cache=cache)
+    assert after == get_event_counts(df_new[(df_new['Date/Time'] == date_time) & (df_new['Opponent'] == opponent)])
+    assert after != before
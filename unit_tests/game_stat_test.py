@@ -66,7 +66,7 @@ def game_stat_test(team1_name, team2_name, team_dict, datetime_of_game):
     print("SEA D-Line Stats: \n")
 
     print("OFFENSE:")
-    print(team2_dcounts_o])
+    print(team2_dcounts_o)
     print("DEFENSE:")
     print(team2_dcounts_d)
     print("--------------\n")
\ No newline at end of file
@@ -0,0 +1,18 @@
+
+import shutil
+
+from league_loader import load_league
+
+
+def test_every_season_keeps_each_team_file(tmp_path):
+    shutil.copy("data/AtlantaHustle2019-stats.csv", tmp_path / "AtlantaHustle2019-stats.csv")
+    shutil.copy("data/AtlantaHustle2019-stats.csv", tmp_path / "AtlantaHustle2018-stats.csv")
+    shutil.copy("data/AustinSol2019-stats.csv", tmp_path / "AustinSol2019-stats.csv")
+
+    teams_dict = load_league(str(tmp_path), season=None, processes=1)
+    season_dict = load_league(str(tmp_path), season=2019, processes=1)
+
+    assert sorted(teams_dict) == ['Atlanta Hustle', 'Austin Sol']
+    assert len(teams_dict['Atlanta Hustle']) == 2 * len(season_dict['Atlanta Hustle'])
+    assert teams_dict['Atlanta Hustle']['Season'].drop_duplicates().tolist() == [2018, 2019]
+    assert 'Season' not in season_dict['Atlanta Hustle']
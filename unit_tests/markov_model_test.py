@@ -0,0 +1,34 @@
+
+import numpy as np
+import pytest
+
+from league_loader import load_league
+from markov_model import get_possession_context, get_team_absorption, get_transition_matrices
+from possession_table import create_possession_table
+
+
+@pytest.fixture(scope='module')
+def table():
+    return(create_possession_table(load_league("data", season=2019, processes=1)))
+
+
+def test_cache_key_reused_with_another_mask(table):
+    context = get_possession_context(table)
+    o_line = (context['Line'] == 'O').to_numpy()
+    d_line = (context['Line'] == 'D').to_numpy()
+
+    o_matrices = get_transition_matrices(table, mask=o_line, cache_key='line')
+    d_matrices = get_transition_matrices(table, mask=d_line, cache_key='line')
+    assert (d_matrices['all'] != get_transition_matrices(table, mask=d_line)['all']).nnz == 0
+    assert (o_matrices['all'] != d_matrices['all']).nnz > 0
+    assert get_transition_matrices(table, mask=o_line, cache_key='line') is o_matrices
+
+
+def test_teams_without_possessions_get_nan(table):
+    context = get_possession_context(table)
+    df_teams = get_team_absorption(table, mask=(context['Team'] == 'Austin Sol').to_numpy())
+    empty = df_teams[df_teams['Possessions'] == 0]
+    assert len(empty) == len(df_teams) - 2
+    assert empty[['Goal', 'Turnover', 'End', 'ExpectedActions']].isna().all().all()
+    assert set(df_teams.index[:2]) == {'Austin Sol', 'all'}
+    assert np.isfinite(df_teams.loc['Austin Sol', 'Goal'])
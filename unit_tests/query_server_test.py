@@ -0,0 +1,81 @@
+
+import json
+import shutil
+import threading
+import time
+
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from query_server import create_server, create_server_state, handle_query, reload_changed_teams, start_reload_watcher
+
+
+@pytest.fixture
+def server_state(tmp_path):
+    for path in ["data/SanJoseSpiders2019-stats.csv", "data/SeattleCascades2019-stats.csv"]:
+        shutil.copy(path, tmp_path)
+    return(create_server_state(str(tmp_path), season=2019, processes=1, validate=True))
+
+
+def post_reload(server):
+    request = Request("http://127.0.0.1:{}/reload".format(server.server_address[1]), method='POST')
+    try:
+        with urlopen(request) as response:
+            return(response.status, json.loads(response.read()))
+    except HTTPError as e:
+        return(e.code, json.loads(e.read()))
+
+
+def write_broken_file(tmp_path):
+    with open(tmp_path / "SanJoseSpiders2019-stats.csv", 'w') as f:
+        f.write('Date/Time,Opponent\n"4/20/2019 0:00,Seattle')
+
+
+def test_failed_reload_answers_500_and_keeps_the_state(server_state, tmp_path):
+    server = create_server(server_state, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        report = server_state['report']
+        write_broken_file(tmp_path)
+        status, payload = post_reload(server)
+        assert status == 500 and 'error' in payload
+        assert server_state['report'] is report and server_state['reloads'] == 0
+
+        shutil.copy("data/SanJoseSpiders2019-stats.csv", tmp_path)
+        status, payload = post_reload(server)
+        assert (status, payload) == (200, {'reloaded':['San Jose Spiders']})
+        assert server_state['teams_dict']['San Jose Spiders'].attrs.get('validated')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_watcher_survives_a_failed_reload(server_state, tmp_path):
+    stop = start_reload_watcher(server_state, interval=0.05)
+    try:
+        write_broken_file(tmp_path)
+        time.sleep(0.3)
+        assert server_state['reloads'] == 0
+
+        shutil.copy("data/SanJoseSpiders2019-stats.csv", tmp_path)
+        deadline = time.time() + 10
+        while server_state['reloads'] == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        assert server_state['reloads'] == 1
+    finally:
+        stop.set()
+
+
+def test_removed_team_file_drops_the_team(server_state, tmp_path):
+    (tmp_path / "SeattleCascades2019-stats.csv").unlink()
+    assert reload_changed_teams(server_state) == ['Seattle Cascades']
+
+    report = server_state['report']
+    assert 'Seattle Cascades' not in server_state['teams_dict']
+    assert report['teams_list'] == ['San Jose Spiders']
+    assert 'Seattle Cascades' not in report['passing_stats'] and 'Seattle Cascades' not in report['team_counts']
+    assert handle_query(report, 'GET', '/teams/Seattle%20Cascades')[0] == 404
+    assert handle_query(report, 'GET', '/teams/San%20Jose%20Spiders')[0] == 200
+    assert reload_changed_teams(server_state) == []
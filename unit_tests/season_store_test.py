@@ -0,0 +1,27 @@
+
+import json
+import os
+
+import pandas as pd
+
+from season_store import read_season_store, write_season_store
+
+
+def test_rebuild_keeps_the_columns_of_the_previous_manifest(tmp_path):
+    df = pd.read_csv("data/AtlantaHustle2019-stats.csv")
+    store_dir = str(tmp_path / "store")
+    write_season_store(df, store_dir)
+    df_first = read_season_store(store_dir)
+    with open(os.path.join(store_dir, 'manifest.json')) as f:
+        old_manifest = json.load(f)
+
+    ## a rebuild with other categories and roster: the old manifest still points at its own column files
+    write_season_store(df.iloc[::-1].reset_index(drop=True), store_dir)
+    assert os.path.isdir(os.path.join(store_dir, old_manifest['data_dir']))
+    assert df_first['Action'].astype(object).tolist() == df['Action'].tolist()
+    assert read_season_store(store_dir)['Action'].astype(object).tolist() == df['Action'].tolist()[::-1]
+
+    ## the data directory from two builds ago is removed
+    write_season_store(df.iloc[:10], store_dir)
+    assert not os.path.exists(os.path.join(store_dir, old_manifest['data_dir']))
+    assert len(read_season_store(store_dir)) == 10
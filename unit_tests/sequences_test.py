@@ -0,0 +1,104 @@
+
+import numpy as np
+import pytest
+
+from league_loader import load_league
+from possession_table import create_possession_table, get_team_catch_counts
+from utils import convert_date_sequences_to_list_and_count, get_season_sequences, get_sequences, segment_possessions
+
+
+def reference_sequences(df_input):
+    ## The row by row get_sequences state machine that segment_possessions replaced, kept as the reference
+    beginning_of_point = '0-0'
+    sequences = {}
+    sequence = []
+
+    prev_event_type = None
+    prev_action = None
+    prev_point_index = None
+
+    for i in range(len(df_input)):
+        record = df_input.iloc[i]
+
+        current_event_type = record['Event Type']
+        end_of_point = str(record['Our Score - End of Point']) + '-' + str(record['Their Score - End of Point'])
+        action = record['Action']
+        point_index = beginning_of_point + "||" + end_of_point
+
+        if current_event_type == 'Offense':
+            if prev_event_type == 'Defense' or prev_event_type == None:
+                sequence = [action]
+                if (prev_action == 'D' or prev_action == 'Throwaway' or prev_action == 'Goal') and (action == 'Goal' or action == 'Throwaway' or action == 'Drop'):
+                    sequences.setdefault(point_index, []).append(sequence)
+
+            elif prev_event_type == 'Offense':
+                if prev_action == "Drop" or prev_action == "Throwaway":
+                    sequence = [action]
+                else:
+                    sequence.append(action)
+                if action != "Catch":
+                    sequences.setdefault(prev_point_index, []).append(sequence)
+
+        if current_event_type == 'Defense' and prev_event_type == 'Offense' and prev_action == "Catch":
+            sequences.setdefault(prev_point_index, []).append(sequence)
+
+        if action == 'Goal':
+            beginning_of_point = end_of_point
+
+        if i == (len(df_input)-1) and action == 'Catch':
+            sequences.setdefault(prev_point_index, []).append(sequence)
+
+        prev_event_type = current_event_type
+        prev_point_index = point_index
+        prev_action = action
+    return(sequences)
+
+
+def reference_date_sequences(df):
+    ## Per game loop of the original collect_and_plot_passes_nb
+    date_sequences = {}
+    for d in set(df['Date/Time']):
+        df_filter = df[df['Date/Time'] == d]
+        df_filter = df_filter[df_filter['Event Type'] != 'Cessation']
+        kee = str(d) + ' | ' + df_filter['Opponent'].iloc[0]
+        date_sequences[kee] = reference_sequences(df_filter)
+    return(date_sequences)
+
+
+@pytest.fixture(scope='module')
+def teams_dict():
+    return(load_league("data", season=2019, processes=1))
+
+
+@pytest.fixture(scope='module')
+def reference(teams_dict):
+    return({tm:reference_date_sequences(df) for tm, df in teams_dict.items()})
+
+
+def test_get_sequences_matches_reference_on_every_game(teams_dict, reference):
+    for tm, df in teams_dict.items():
+        df = df[df['Event Type'] != 'Cessation']
+        for d in df['Date/Time'].unique():
+            df_game = df[df['Date/Time'] == d]
+            kee = str(d) + ' | ' + df_game['Opponent'].iloc[0]
+            assert get_sequences(df_game) == reference[tm][kee], (tm, kee)
+
+
+def test_segment_possessions_matches_reference_over_the_season(teams_dict, reference):
+    team_sequences = get_season_sequences(teams_dict)
+    assert team_sequences == reference
+
+
+def test_segment_possessions_empty_frame(teams_dict):
+    df = next(iter(teams_dict.values()))
+    assert segment_possessions(df.iloc[:0]) == []
+    assert get_sequences(df.iloc[:0]) == {}
+
+
+def test_team_catch_counts_match_converted_sequences(teams_dict, reference):
+    team_counts = get_team_catch_counts(create_possession_table(teams_dict))
+    team_sequences = get_season_sequences(teams_dict)
+    for tm in teams_dict:
+        expected = convert_date_sequences_to_list_and_count(reference[tm])
+        assert convert_date_sequences_to_list_and_count(team_sequences[tm]) == expected, tm
+        assert np.array_equal(team_counts[tm], np.array(expected, dtype=np.int64)), tm
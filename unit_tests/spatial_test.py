@@ -0,0 +1,34 @@
+
+import numpy as np
+import pytest
+
+from league_loader import load_league
+from spatial import ATTACKING_ENDZONE_DEPTH, get_team_zone_completion_grids, get_throws, get_zone_completion_grid
+
+
+@pytest.fixture(scope='module')
+def throws():
+    return(get_throws(load_league("data", season=2019, processes=1)))
+
+
+def test_depth_follows_the_attack_direction(throws):
+    gained = (throws['End Depth'] - throws['Begin Depth']).to_numpy()
+    toward = throws['Toward Our Goal Distance'].to_numpy()
+    assert np.isfinite(gained).all()
+    assert np.corrcoef(gained, toward)[0, 1] > 0.99
+
+
+def test_goals_concentrate_in_the_attacking_zone(throws):
+    goals = throws[throws['Action'] == 'Goal']
+    assert len(goals) > 0
+    assert (goals['End Depth'] >= ATTACKING_ENDZONE_DEPTH).all()
+
+    ## with 6 zones along the field the last one is the attacked end zone
+    grid = get_zone_completion_grid(goals, y_bins=6, position='End')
+    assert grid['attempts'][:, -1].sum() == len(goals)
+    assert np.all(grid['completion_rate'][:, -1][grid['attempts'][:, -1] > 0] == 1.0)
+
+    grids = get_team_zone_completion_grids(goals, y_bins=6, position='End')
+    for tm, team_grid in grids.items():
+        assert team_grid['attempts'][:, -1].sum() == (goals['Team'] == tm).sum()
+        assert team_grid['attempts'][:, :-1].sum() == 0
@@ -0,0 +1,37 @@
+
+import pandas as pd
+import pytest
+
+from league_loader import load_league
+from streaming import stream_season
+from utils import convert_date_sequences_to_list_and_count, get_game_stats, get_season_sequences
+
+
+@pytest.fixture(scope='module')
+def teams_dict():
+    return(load_league("data", season=2019, processes=1))
+
+
+@pytest.fixture(scope='module')
+def streamed():
+    ## A small chunksize so games are carried over between chunks
+    return(stream_season("data", season=2019, chunksize=700))
+
+
+def test_streamed_counts_match_season_sequences_per_team(teams_dict, streamed):
+    ## DC Breeze and Montreal Royal have several opponents under '5/4/2019 0:00', one game for both paths
+    _, _, team_counts = streamed
+    team_sequences = get_season_sequences(teams_dict)
+    assert sorted(team_counts) == sorted(teams_dict)
+    for tm in teams_dict:
+        assert team_counts[tm] == convert_date_sequences_to_list_and_count(team_sequences[tm]), tm
+
+
+def test_streamed_games_match_get_game_stats(teams_dict, streamed):
+    ## Up to float rounding of the average hangtimes
+    game_dict, df_stats, _ = streamed
+    expected_dict, expected_stats = get_game_stats(teams_dict)
+    assert sorted(game_dict) == sorted(expected_dict)
+    pd.testing.assert_frame_equal(df_stats.sort_index(axis=1).sort_values(['date','team1','team2']).reset_index(drop=True),
+                                  expected_stats.sort_index(axis=1).sort_values(['date','team1','team2']).reset_index(drop=True),
+                                  check_exact=False)
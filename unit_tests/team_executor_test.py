@@ -0,0 +1,28 @@
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from team_executor import map_teams
+
+
+def count_rows(tm, df):
+    return((tm, len(df)))
+
+
+def make_teams(n_rows):
+    return({tm:pd.DataFrame({'x':range(n_rows + i)}) for i, tm in enumerate(['A', 'B', 'C'])})
+
+
+def test_process_backend_matches_serial():
+    teams_dict = make_teams(10)
+    expected = map_teams(count_rows, teams_dict)
+    for mp_context in [None, 'spawn']:
+        assert map_teams(count_rows, teams_dict, backend='process', workers=2, mp_context=mp_context) == expected
+
+
+def test_concurrent_process_calls_keep_their_own_frames():
+    calls = [make_teams(n_rows) for n_rows in [10, 20, 30, 40]]
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        results = list(executor.map(lambda teams_dict: map_teams(count_rows, teams_dict, backend='process', workers=2), calls))
+    assert results == [map_teams(count_rows, teams_dict) for teams_dict in calls]
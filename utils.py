@@ -12,14 +12,19 @@ Example:
 
 import pandas as pd
 import numpy as np
-import math
+import json
+import os
 import plotly.graph_objects as go
 import statistics
+import warnings
 
-from scipy.stats import nbinom
-from itertools import groupby
 from plotly.offline import plot, iplot
 
+from possession_model import fit_possession_model, fit_team_possession_models, get_count_histogram, get_nb_pmf_grid
+from profiling import count_frame_rows, profile_stage
+from team_executor import map_teams
+
+@profile_stage('event_counts', rows=lambda df, line=None: len(df))
 def get_event_counts(df,line=['offense','defense']):
     ''' Function to obtain offensive and defensive team stats
     
@@ -45,6 +50,22 @@ def get_event_counts(df,line=['offense','defense']):
         df1 = df
     
     dict_out_off = df1[df1['Event Type'] == 'Offense'].groupby('Action')['Event Type'].count().to_dict()
+    dict_out_def = df1[df1['Event Type'] == 'Defense'].groupby('Action')['Event Type'].count().to_dict()
+
+    return(format_event_counts(dict_out_off,dict_out_def))
+
+def format_event_counts(dict_out_off, dict_out_def):
+    ''' Function to shape raw action counts into the offensive and defensive stat dictionaries returned by get_event_counts
+
+        Parameters:
+            dict_out_off   -     dictionary of offensive action counts.  key:(action), value:(count)
+            dict_out_def   -     dictionary of defensive action counts.  key:(action), value:(count)
+
+        Returns:
+            dict_off       -     dictionary output of the offensive stats.  key:(event type), value:(count)
+            dict_def       -     dictionary output of the defensive stats.  key:(event type), value:(count)
+
+    '''
     dict_off = {}
     dict_off['catch'] = dict_out_off.get('Catch',0)
     dict_off['throwaway'] = dict_out_off.get('Throwaway',0)
@@ -52,7 +73,6 @@ def get_event_counts(df,line=['offense','defense']):
     dict_off['goal'] = dict_out_off.get('Goal',0)
     dict_off['turnovers'] = dict_off['drop'] + dict_off['throwaway']
 
-    dict_out_def = df1[df1['Event Type'] == 'Defense'].groupby('Action')['Event Type'].count().to_dict()
     dict_def = {}
     dict_def['d'] = dict_out_def.get('D',0)
     dict_def['throwaway'] = dict_out_def.get('Throwaway',0)
@@ -63,6 +83,7 @@ def get_event_counts(df,line=['offense','defense']):
 
     return(dict_off,dict_def)
 
+@profile_stage('hangtime', rows=lambda df: len(df))
 def get_avg_hangtime(df):
     ''' Function to obtain average hangtime (in seconds) of pulls
     
@@ -73,115 +94,171 @@ def get_avg_hangtime(df):
             avg_hangtime   -     float object for the average hangtime
             
     '''
-    df_d = df[df['Event Type'] == 'Defense']
-    df_d_pullhangtime = df_d[df_d['Action'] == 'Pull']['Hang Time (secs)']
-    
-    df_pullhangtime_nonan = [i for i in df_d_pullhangtime if (math.isnan(i) == False)]
-    
-    try:
-        avg_hangtime = sum(df_pullhangtime_nonan)/len(df_pullhangtime_nonan)
-    except:
+    pulls = (df['Event Type'] == 'Defense') & (df['Action'] == 'Pull')
+    df_pullhangtime_nonan = df.loc[pulls, 'Hang Time (secs)'].dropna()
+
+    if len(df_pullhangtime_nonan) > 0:
+        avg_hangtime = float(df_pullhangtime_nonan.mean())
+    else:
         avg_hangtime=None
     
     return(avg_hangtime)
 
-def collect_stats_for_teams(team_dict=None):
+@profile_stage('event_counts', rows=lambda team_dict=None: count_frame_rows(team_dict))
+def get_grouped_game_counts(team_dict=None):
+    ''' Function to compute every team's per-game action counts and pull hangtimes in one grouped aggregation
+         - groups over (Team, Date/Time, Line, Event Type, Action) instead of filtering each team frame once per game
+
+        Parameters:
+            team_dict         -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+
+        Returns:
+            df_games          -     dataframe with one row per (Team, Date/Time) and the Opponent of that game, in file order
+            action_counts     -     series of event counts indexed by (Team, Date/Time, Line, Event Type, Action)
+            hangtimes         -     series of average pull hangtime indexed by (Team, Date/Time), only for games with a timed pull
+    '''
+    cols = ['Date/Time','Opponent','Line','Event Type','Action','Hang Time (secs)']
+    df_all = pd.concat([team_dict[tm][cols].assign(Team=tm) for tm in team_dict.keys()], ignore_index=True)
+
+    df_games = df_all.drop_duplicates(['Team','Date/Time'])[['Team','Date/Time','Opponent']].reset_index(drop=True)
+
+    df_events = df_all[df_all['Event Type'].isin(['Offense','Defense'])]
+    action_counts = df_events.groupby(['Team','Date/Time','Line','Event Type','Action'],
+                                      sort=False, observed=True, dropna=False).size()
+
+    df_pulls = df_all[(df_all['Event Type'] == 'Defense') & (df_all['Action'] == 'Pull') & df_all['Hang Time (secs)'].notna()]
+    pull_totals = df_pulls.groupby(['Team','Date/Time'], sort=False, observed=True)['Hang Time (secs)'].agg(['sum','count'])
+    hangtimes = pull_totals['sum'] / pull_totals['count']
+
+    return(df_games, action_counts, hangtimes)
+
+def _get_team_game_counts(tm, df):
+    return(get_grouped_game_counts({tm:df}))
+
+def collect_stats_for_teams(team_dict=None, backend='serial', workers=None):
     ''' Function to collect the stats of each game into a json-type dictionary
         id: 'team1-team2-date'
          - team1 and team2 are first sorted alphabetically, in order to avoid double counting the same game
+         - the counts for every team and game come from a single grouped aggregation (see get_grouped_game_counts)
+         - with the 'thread' or 'process' backend the aggregation is run per team in a pool (see team_executor.map_teams),
+           and the per-team counts are concatenated in team_dict order, giving the same game_dict as 'serial'
     
         Parameters:
             team_dict         -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            backend           -     'serial', 'thread' or 'process'
+            workers           -     pool size for the 'thread' and 'process' backends.  Leave blank for one per CPU
             
         Returns:
             game_dict         -     a dictionary that contains game stats for each game of the season between all teams/games in the team_dict
             
     '''
-    game_dict = {}
-
-    for tm in team_dict.keys():
-        df = team_dict[tm]
-
-        for dte in list(set(df['Date/Time'])):
-            df_dte = df[df['Date/Time'] == dte ]
-
-            teamz = [tm, df_dte['Opponent'].iloc[0]]
-            teamz.sort()
-            kee = str(dte.split(" ")[0]) + "|" + teamz[0] + "|" + teamz[1]
-
-            team_offensive_stats, team_defensive_stats = get_event_counts(df_dte)
-            oline_offensive_stats, oline_defensive_stats = get_event_counts(df_dte, line="offense")
-            dline_offensive_stats, dline_defensive_stats = get_event_counts(df_dte, line="defense")
-
-            if kee not in game_dict.keys():
-                game_dict[kee] = {}
-                game_dict[kee]["game_date"] = dte
-                game_dict[kee]["team1"] = {}
-                game_dict[kee]["team2"] = {}
-
-                game_dict[kee]["team1"]["team"] = teamz[0]
-                game_dict[kee]["team2"]["team"] = teamz[1]
+    if backend == 'serial':
+        df_games, action_counts, hangtimes = get_grouped_game_counts(team_dict)
+    else:
+        team_counts = map_teams(_get_team_game_counts, team_dict, backend=backend, workers=workers)
+        df_games = pd.concat([c[0] for c in team_counts], ignore_index=True)
+        action_counts = pd.concat([c[1] for c in team_counts])
+        hangtimes = pd.concat([c[2] for c in team_counts])
+    return(build_game_dict(df_games, action_counts, hangtimes))
 
-                game_dict[kee]["team1"]["stats"] = {}
-                game_dict[kee]["team2"]["stats"] = {}
+def build_game_dict(df_games, action_counts, hangtimes):
+    ''' Assemble game_dict from the per-game counts of get_grouped_game_counts (or of an incremental aggregation of them,
+        see streaming.py)
 
-                if game_dict[kee]["team1"]["team"] == tm:
+        Parameters:
+            df_games          -     dataframe with one row per (Team, Date/Time) and the Opponent of that game, in file order
+            action_counts     -     series of event counts indexed by (Team, Date/Time, Line, Event Type, Action)
+            hangtimes         -     series of average pull hangtime indexed by (Team, Date/Time)
 
-                    game_dict[kee]["team1"]["stats"]["avg_hangtime_pull"] = get_avg_hangtime(df_dte)
+        Returns:
+            game_dict         -     a dictionary that contains game stats for each game (see collect_stats_for_teams)
+    '''
+    hangtime_dict = hangtimes.to_dict()
 
-                    game_dict[kee]["team1"]["stats"]["team_offensive_stats"] = team_offensive_stats
-                    game_dict[kee]["team1"]["stats"]["team_defensive_stats"] = team_defensive_stats
+    ## key: (team, date), value: {line: {event type: {action: count}}}
+    line_counts_dict = {}
+    for (tm, dte, line, event_type, action), n in action_counts.items():
+        line_counts = line_counts_dict.setdefault((tm, dte), {}).setdefault(line, {'Offense':{}, 'Defense':{}})
+        line_counts[event_type][action] = int(n)
 
-                    game_dict[kee]["team1"]["stats"]["oline_offensive_stats"] = oline_offensive_stats
-                    game_dict[kee]["team1"]["stats"]["oline_defensive_stats"] = oline_defensive_stats
+    game_dict = {}
 
-                    game_dict[kee]["team1"]["stats"]["dline_offensive_stats"] = dline_offensive_stats
-                    game_dict[kee]["team1"]["stats"]["dline_defensive_stats"] = dline_defensive_stats
+    for tm, dte, opponent in df_games.itertuples(index=False):
+        line_counts = line_counts_dict.get((tm, dte), {})
+        oline_counts = line_counts.get('O', {'Offense':{}, 'Defense':{}})
+        dline_counts = line_counts.get('D', {'Offense':{}, 'Defense':{}})
 
-                elif game_dict[kee]["team2"]["team"] == tm:
+        total_counts = {'Offense':{}, 'Defense':{}}
+        for counts in line_counts.values():
+            for event_type in total_counts.keys():
+                for action, n in counts[event_type].items():
+                    total_counts[event_type][action] = total_counts[event_type].get(action,0) + n
 
-                    game_dict[kee]["team2"]["stats"]["avg_hangtime_pull"] = get_avg_hangtime(df_dte)
+        kee = get_game_key(dte, tm, opponent)
+        _, team1, team2 = kee.split("|")
 
-                    game_dict[kee]["team2"]["stats"]["team_offensive_stats"] = team_offensive_stats
-                    game_dict[kee]["team2"]["stats"]["team_defensive_stats"] = team_defensive_stats
+        team_offensive_stats, team_defensive_stats = format_event_counts(total_counts['Offense'], total_counts['Defense'])
+        oline_offensive_stats, oline_defensive_stats = format_event_counts(oline_counts['Offense'], oline_counts['Defense'])
+        dline_offensive_stats, dline_defensive_stats = format_event_counts(dline_counts['Offense'], dline_counts['Defense'])
 
-                    game_dict[kee]["team2"]["stats"]["oline_offensive_stats"] = oline_offensive_stats
-                    game_dict[kee]["team2"]["stats"]["oline_defensive_stats"] = oline_defensive_stats
+        if kee not in game_dict.keys():
+            game_dict[kee] = {}
+            game_dict[kee]["game_date"] = dte
+            game_dict[kee]["team1"] = {}
+            game_dict[kee]["team2"] = {}
 
-                    game_dict[kee]["team2"]["stats"]["dline_offensive_stats"] = dline_offensive_stats
-                    game_dict[kee]["team2"]["stats"]["dline_defensive_stats"] = dline_defensive_stats
+            game_dict[kee]["team1"]["team"] = team1
+            game_dict[kee]["team2"]["team"] = team2
 
+            game_dict[kee]["team1"]["stats"] = {}
+            game_dict[kee]["team2"]["stats"] = {}
 
-            elif kee in game_dict.keys():
+        if game_dict[kee]["team1"]["team"] == tm:
+            stats = game_dict[kee]["team1"]["stats"]
+        elif game_dict[kee]["team2"]["team"] == tm:
+            stats = game_dict[kee]["team2"]["stats"]
+        else:
+            continue
 
-                if game_dict[kee]["team1"]["team"] == tm:
-                    game_dict[kee]["team1"]["stats"]["avg_hangtime_pull"] = get_avg_hangtime(df_dte)
+        stats["avg_hangtime_pull"] = hangtime_dict.get((tm, dte))
 
-                    game_dict[kee]["team1"]["stats"]["team_offensive_stats"] = team_offensive_stats
-                    game_dict[kee]["team1"]["stats"]["team_defensive_stats"] = team_defensive_stats
+        stats["team_offensive_stats"] = team_offensive_stats
+        stats["team_defensive_stats"] = team_defensive_stats
 
-                    game_dict[kee]["team1"]["stats"]["oline_offensive_stats"] = oline_offensive_stats
-                    game_dict[kee]["team1"]["stats"]["oline_defensive_stats"] = oline_defensive_stats
+        stats["oline_offensive_stats"] = oline_offensive_stats
+        stats["oline_defensive_stats"] = oline_defensive_stats
 
-                    game_dict[kee]["team1"]["stats"]["dline_offensive_stats"] = dline_offensive_stats
-                    game_dict[kee]["team1"]["stats"]["dline_defensive_stats"] = dline_defensive_stats
+        stats["dline_offensive_stats"] = dline_offensive_stats
+        stats["dline_defensive_stats"] = dline_defensive_stats
 
-                elif game_dict[kee]["team2"]["team"] == tm:
-                    game_dict[kee]["team2"]["stats"]["avg_hangtime_pull"] = get_avg_hangtime(df_dte)
+    return(game_dict)
 
-                    game_dict[kee]["team2"]["stats"]["team_offensive_stats"] = team_offensive_stats
-                    game_dict[kee]["team2"]["stats"]["team_defensive_stats"] = team_defensive_stats
+GAME_STATS_COLUMNS = ['date','team1','team2',
+                      'team1_offensive_to_commited','team2_offensive_to_commited',
+                      'team1_points_scored','team2_points_scored',
+                      'team1_avg_hangtime_pull','team2_avg_hangtime_pull',
+                      'team1_catches','team2_catches']
 
-                    game_dict[kee]["team2"]["stats"]["oline_offensive_stats"] = oline_offensive_stats
-                    game_dict[kee]["team2"]["stats"]["oline_defensive_stats"] = oline_defensive_stats
+def get_incomplete_games(game_dict=None):
+    ''' List the games in game_dict that are missing one team's perspective (e.g. only one of the two team files was loaded)
 
-                    game_dict[kee]["team2"]["stats"]["dline_offensive_stats"] = dline_offensive_stats
-                    game_dict[kee]["team2"]["stats"]["dline_defensive_stats"] = dline_defensive_stats
+        Parameters:
+            game_dict         -     a dictionary that contains game stats for each game, from collect_stats_for_teams
 
-    return(game_dict)
+        Returns:
+            incomplete_games  -     list of game keys whose team1 or team2 stats are missing
+    '''
+    incomplete_games = [game for game in game_dict.keys()
+                        if not game_dict[game]['team1']['stats'] or not game_dict[game]['team2']['stats']]
+    return(incomplete_games)
 
+@profile_stage('flatten', rows=lambda game_dict=None: len(game_dict))
 def flatten_out_games(game_dict=None):
     ''' Transforms the game stats (calculated in collect_stats_for_teams) from a json-dictonary format to a pandas dataframe
+         - rows are collected into column lists and the dataframe is built once
+         - games missing one team's perspective are left out and reported with a warning (see get_incomplete_games)
+         - turnovers and goals take the max of the two teams' views; games where the views disagree are counted in a warning
+           (reconciliation.get_game_discrepancies has the details)
 
         Parameters:
             game_dict         -     a dictionary that contains game stats for each game of the season between all teams/games in the team_dict
@@ -191,102 +268,245 @@ def flatten_out_games(game_dict=None):
             df_stats         -     pandas dataframe of the stats
             
     '''
-    i = 0
+    incomplete_games = set(get_incomplete_games(game_dict))
+    if incomplete_games:
+        warnings.warn("{} game(s) missing one team's stats were left out of df_stats: {}".format(
+                      len(incomplete_games), ", ".join(sorted(incomplete_games))))
+
+    columns = {col:[] for col in GAME_STATS_COLUMNS}
+    disagreements = 0
     for game in game_dict.keys():
+        if game in incomplete_games:
+            continue
+        team1_stats = game_dict[game]['team1']['stats']
+        team2_stats = game_dict[game]['team2']['stats']
+
+        columns['date'].append(game_dict[game]['game_date'])
+        columns['team1'].append(game_dict[game]['team1']['team'])
+        columns['team2'].append(game_dict[game]['team2']['team'])
+
+        columns['team1_offensive_to_commited'].append(max([team1_stats['team_offensive_stats']['turnovers'],team2_stats['team_defensive_stats']['turnovers']]))
+        columns['team2_offensive_to_commited'].append(max([team2_stats['team_offensive_stats']['turnovers'],team1_stats['team_defensive_stats']['turnovers']]))
+
+        columns['team1_points_scored'].append(max([team1_stats['team_offensive_stats']['goal'],team2_stats['team_defensive_stats']['goal']]))
+        columns['team2_points_scored'].append(max([team2_stats['team_offensive_stats']['goal'],team1_stats['team_defensive_stats']['goal']]))
+
+        if (team1_stats['team_offensive_stats']['turnovers'] != team2_stats['team_defensive_stats']['turnovers'] or
+            team2_stats['team_offensive_stats']['turnovers'] != team1_stats['team_defensive_stats']['turnovers'] or
+            team1_stats['team_offensive_stats']['goal'] != team2_stats['team_defensive_stats']['goal'] or
+            team2_stats['team_offensive_stats']['goal'] != team1_stats['team_defensive_stats']['goal']):
+            disagreements += 1
+
+        columns['team1_avg_hangtime_pull'].append(team1_stats['avg_hangtime_pull'])
+        columns['team2_avg_hangtime_pull'].append(team2_stats['avg_hangtime_pull'])
 
-        try:
-            team1_to_commited = max([game_dict[game]['team1']['stats']['team_offensive_stats']['turnovers'],game_dict[game]['team2']['stats']['team_defensive_stats']['turnovers']])
-       
-            team2_to_commited = max([game_dict[game]['team2']['stats']['team_offensive_stats']['turnovers'],game_dict[game]['team1']['stats']['team_defensive_stats']['turnovers']])
-
-            team1_points_scored = max([game_dict[game]['team1']['stats']['team_offensive_stats']['goal'],game_dict[game]['team2']['stats']['team_defensive_stats']['goal']])
-            team2_points_scored = max([game_dict[game]['team2']['stats']['team_offensive_stats']['goal'],game_dict[game]['team1']['stats']['team_defensive_stats']['goal']])
-
-            team1_avg_hangtime= game_dict[game]['team1']['stats']['avg_hangtime_pull']
-            team2_avg_hangtime = game_dict[game]['team2']['stats']['avg_hangtime_pull']
-
-            team1_catches= game_dict[game]['team1']['stats']['team_offensive_stats']['catch']
-            team2_catches = game_dict[game]['team2']['stats']['team_offensive_stats']['catch']
-
-
-            dict_row = {'date':game_dict[game]['game_date'],
-                        'team1':game_dict[game]['team1']['team'],
-                        'team2':game_dict[game]['team2']['team'],
-                        'team1_offensive_to_commited': team1_to_commited,
-                        'team2_offensive_to_commited': team2_to_commited,
-                        'team1_points_scored':team1_points_scored,
-                        'team2_points_scored':team2_points_scored,
-                        'team1_avg_hangtime_pull':team1_avg_hangtime,
-                        'team2_avg_hangtime_pull':team2_avg_hangtime,
-                        'team1_catches':team1_catches,
-                        'team2_catches':team2_catches}
-
-            df_row = pd.DataFrame.from_dict(dict_row, orient='index').transpose()
-
-            if i == 0:
-                df_stats = df_row
-            else:
-                df_stats = df_stats.append(df_row)
-            i = 1
-        except:
-            pass
-    df_stats = df_stats.reset_index(drop=True)
+        columns['team1_catches'].append(team1_stats['team_offensive_stats']['catch'])
+        columns['team2_catches'].append(team2_stats['team_offensive_stats']['catch'])
+
+    if disagreements:
+        warnings.warn("{} game(s) where the two team files disagree on turnovers or goals were reconciled with max(); "
+                      "see reconciliation.get_game_discrepancies".format(disagreements))
+
+    df_stats = pd.DataFrame(columns).astype({col:(float if 'hangtime' in col else np.int64) for col in GAME_STATS_COLUMNS[3:]})
     return(df_stats)
 
-def get_game_stats(team_dict):
+def get_game_stats(team_dict, game_dict=None, df_stats=None):
     ''' Obtain dictionary and data frame of stats
+         - incremental mode: pass the game_dict and df_stats of an earlier run (see load_game_stats) and only the
+           games not in them yet are computed and merged in (see update_game_stats)
     
         Parameters:
             team_dict         -     a dictionary that contains key team_name, value dataframe of season play-by-play stats
+            game_dict         -     optional game_dict from an earlier run
+            df_stats          -     optional df_stats from an earlier run
             
         Returns:
             game_dict         -     dictionary
             df_stats          -     dataframe
     '''
+    if game_dict is not None:
+        return(update_game_stats(team_dict, game_dict, df_stats))
     game_dict = collect_stats_for_teams(team_dict)
     df_stats = flatten_out_games(game_dict)
     return(game_dict,df_stats)
 
-def get_turnover_plot_data(df_stats=None,team=None):
+def get_game_key(dte, team, opponent):
+    ''' game_dict key of a game: 'date|team1|team2', with the two teams sorted alphabetically
+    '''
+    teamz = [team, opponent]
+    teamz.sort()
+    return(str(dte.split(" ")[0]) + "|" + teamz[0] + "|" + teamz[1])
+
+def has_team_stats(game_dict, kee, team):
+    ''' Whether game_dict already holds the stats of game kee from team's perspective
+    '''
+    if kee not in game_dict.keys():
+        return(False)
+    for team_slot in ["team1","team2"]:
+        if game_dict[kee][team_slot]["team"] == team and game_dict[kee][team_slot]["stats"]:
+            return(True)
+    return(False)
+
+def get_new_game_rows(team_dict, game_dict):
+    ''' Restrict each team frame to the games (Date/Time) whose stats from that team's perspective are not in game_dict yet
+
+        Parameters:
+            team_dict         -     a dictionary that contains key team_name, value dataframe of season play-by-play stats
+            game_dict         -     game_dict from an earlier run
+
+        Returns:
+            new_team_dict     -     dictionary key: team_name, value: the rows of that team's new games (teams with no new games are left out)
+    '''
+    new_team_dict = {}
+    for tm in team_dict.keys():
+        df = team_dict[tm]
+        df_games = df.drop_duplicates('Date/Time')
+        new_dates = [dte for dte, opponent in zip(df_games['Date/Time'], df_games['Opponent'])
+                     if not has_team_stats(game_dict, get_game_key(dte, tm, opponent), tm)]
+        if new_dates:
+            new_team_dict[tm] = df[df['Date/Time'].isin(new_dates)]
+    return(new_team_dict)
+
+def update_game_stats(team_dict, game_dict, df_stats=None):
+    ''' Incrementally update game_dict and df_stats with the games in team_dict that they do not cover yet
+         - stats are only computed for the new (date, team pair) games, from the perspective of the team files that contain them
+         - a game seen in only one team file so far stays in game_dict with the other team's stats empty and is added to
+           df_stats once the other team's file arrives
+         - games already in game_dict are not recomputed; rebuild from scratch with get_game_stats(team_dict) after corrections
+
+        Parameters:
+            team_dict         -     a dictionary that contains key team_name, value dataframe of season play-by-play stats
+            game_dict         -     game_dict from an earlier run (left unmodified)
+            df_stats          -     df_stats from an earlier run.  Leave blank to rebuild it from game_dict
+
+        Returns:
+            game_dict         -     dictionary with the new games merged in
+            df_stats          -     dataframe with the newly completed games appended
+    '''
+    new_team_dict = get_new_game_rows(team_dict, game_dict)
+    new_game_dict = collect_stats_for_teams(new_team_dict) if new_team_dict else {}
+
+    game_dict = dict(game_dict)
+    for kee in new_game_dict.keys():
+        if kee not in game_dict.keys():
+            game_dict[kee] = new_game_dict[kee]
+            continue
+        game = {"game_date":game_dict[kee]["game_date"],
+                "team1":dict(game_dict[kee]["team1"]),
+                "team2":dict(game_dict[kee]["team2"])}
+        for team_slot in ["team1","team2"]:
+            if new_game_dict[kee][team_slot]["stats"]:
+                game[team_slot]["stats"] = new_game_dict[kee][team_slot]["stats"]
+        game_dict[kee] = game
+
+    if df_stats is None:
+        return(game_dict, flatten_out_games(game_dict))
+
+    incomplete_games = set(get_incomplete_games(game_dict))
+    completed_games = {kee:game_dict[kee] for kee in new_game_dict.keys() if kee not in incomplete_games}
+    if completed_games:
+        stats_keys = df_stats['date'].str.split(" ").str[0] + "|" + df_stats['team1'] + "|" + df_stats['team2']
+        df_stats = pd.concat([df_stats[~stats_keys.isin(list(completed_games.keys()))], flatten_out_games(completed_games)],
+                             ignore_index=True)
+    return(game_dict, df_stats)
+
+def save_game_stats(game_dict, df_stats, directory):
+    ''' Persist game_dict (as game_dict.json) and df_stats (as df_stats.csv) for later incremental updates
+    '''
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "game_dict.json"), "w") as f:
+        json.dump(game_dict, f)
+    df_stats.to_csv(os.path.join(directory, "df_stats.csv"), index=False)
+
+def load_game_stats(directory):
+    ''' Load the game_dict and df_stats written by save_game_stats
+
+        Returns:
+            game_dict         -     dictionary
+            df_stats          -     dataframe
+    '''
+    with open(os.path.join(directory, "game_dict.json")) as f:
+        game_dict = json.load(f)
+    df_stats = pd.read_csv(os.path.join(directory, "df_stats.csv"), dtype={'date':str,'team1':str,'team2':str})
+    return(game_dict, df_stats)
+
+def get_team_games(df_stats=None):
+    ''' Reshape df_stats (one row per game) into a long table with one row per (game, team), indexed by team
+         - each row holds the game from that team's perspective, so per-team lookups are index lookups
+         - rows of each team keep the df_stats game order
+
+        Parameters:
+            df_stats         -     the dataframe output from flatten_out_games
+
+        Returns:
+            team_games       -     dataframe indexed by team with columns game, date, opponent, points_scored, points_allowed,
+                                   turnovers_committed, turnovers_forced
+    '''
+    perspectives = []
+    for us, them in [('team1','team2'),('team2','team1')]:
+        perspectives.append(pd.DataFrame({'team':df_stats[us].to_numpy(),
+                                          'game':np.arange(len(df_stats)),
+                                          'date':df_stats['date'].to_numpy(),
+                                          'opponent':df_stats[them].to_numpy(),
+                                          'points_scored':df_stats[us + '_points_scored'].to_numpy(),
+                                          'points_allowed':df_stats[them + '_points_scored'].to_numpy(),
+                                          'turnovers_committed':df_stats[us + '_offensive_to_commited'].to_numpy(),
+                                          'turnovers_forced':df_stats[them + '_offensive_to_commited'].to_numpy()}))
+    team_games = pd.concat(perspectives, ignore_index=True).sort_values(['team','game'], kind='stable')
+    team_games = team_games.set_index('team')
+    return(team_games)
+
+def get_team_rows(team_games=None, team=None):
+    ''' Games of a single team from the get_team_games table (empty if the team played no games)
+    '''
+    if team not in team_games.index:
+        return(team_games.iloc[:0])
+    return(team_games.loc[[team]])
+
+def get_team_season_summary(team_games=None):
+    ''' Season summary of every team from one grouped aggregation over the get_team_games table
+
+        Parameters:
+            team_games       -     the dataframe output from get_team_games
+
+        Returns:
+            df_summary       -     dataframe indexed by team with the median turnovers committed (Median_O) and forced (Median_D),
+                                   SeasonTurnovers, average goals scored/allowed per game and the season +/-
+    '''
+    grouped = team_games.groupby(level='team', sort=False)
+    df_summary = pd.DataFrame({'Median_O':grouped['turnovers_committed'].median(),
+                               'Median_D':grouped['turnovers_forced'].median(),
+                               'SeasonTurnovers':grouped['turnovers_committed'].sum() + grouped['turnovers_forced'].sum(),
+                               'GoalsScored':grouped['points_scored'].mean(),
+                               'GoalsAllowed':grouped['points_allowed'].mean(),
+                               'PlusMinus':grouped['points_scored'].sum() - grouped['points_allowed'].sum()})
+    return(df_summary)
+
+def get_turnover_plot_data(df_stats=None,team=None,team_games=None):
     ''' Obtain turnover stats used for boxplot
 
         Parameters:
             df_stats         -     the dataframe output from flatten_out_games
             team             -     a string indicating which team to produce the boxplot data for
+            team_games       -     optional output of get_team_games(df_stats), to avoid rebuilding it for every team
             
         Returns:
             plot_data       -      dataframe used for plotting
     '''
-    o_to_list = []
-    d_to_list = []
-    date_list = []
-    
-    for i in range(len(df_stats)):
-        df_to_row = df_stats.iloc[i]
+    if team_games is None:
+        team_games = get_team_games(df_stats)
+    df_team = get_team_rows(team_games, team)
 
-        team1 = df_to_row["team1"]
-        team2 = df_to_row["team2"]
+    dates = df_team['date'].str.split(" ").str[0].tolist()
+    o_to_list = df_team['turnovers_committed'].tolist()
+    d_to_list = df_team['turnovers_forced'].tolist()
 
-        
-        if team1 == team:
-            date_list.append(df_to_row["date"].split(" ")[0])
-            o_to_list.append(df_to_row["team1_offensive_to_commited"])
-            d_to_list.append(df_to_row["team2_offensive_to_commited"])
-
-        elif team2 == team:
-            date_list.append(df_to_row["date"].split(" ")[0])
-            d_to_list.append(df_to_row["team1_offensive_to_commited"])
-            o_to_list.append(df_to_row["team2_offensive_to_commited"])
-
-    date_list.extend(date_list)
-    oos = ["Offense" for i in range(len(o_to_list))]
-    dds = ["Defense" for i in range(len(d_to_list))]
-    oos.extend(dds)
     median_of_offense = statistics.median(o_to_list)
     median_of_defense = statistics.median(d_to_list)
-    o_to_list.extend(d_to_list)
 
-    plot_data = pd.DataFrame({"Date":date_list,"Line":oos, "Turnovers":o_to_list}).sort_values("Date")
+    plot_data = pd.DataFrame({"Date":dates + dates,
+                              "Line":["Offense"]*len(o_to_list) + ["Defense"]*len(d_to_list),
+                              "Turnovers":o_to_list + d_to_list}).sort_values("Date")
     return(plot_data,median_of_offense,median_of_defense)
 
 def plot_turnovers(df_stats,
@@ -306,15 +526,11 @@ def plot_turnovers(df_stats,
     '''
     plot_data_dict = {}
     fig = go.Figure()
-    j = 0
+    team_games = get_team_games(df_stats)
     for tm in teams_list:
-        plot_data_dict[tm],median_o,median_d = get_turnover_plot_data(df_stats, team=tm)
-        row_df = pd.DataFrame.from_dict({'Team':tm,'Median_O':median_o,'Median_D':median_d},orient='index').transpose()
-        if j == 0:
-            df_median = row_df
-        else:
-            df_median = df_median.append(row_df)
-        j+=1
+        plot_data_dict[tm],_,_ = get_turnover_plot_data(team=tm, team_games=team_games)
+    df_median = get_team_season_summary(team_games).reindex(teams_list)[['Median_O','Median_D']]
+    df_median.insert(0, 'Team', teams_list)
 
     if sort_by == "offense":
         df_median = df_median.sort_values('Median_O',ascending=True)
@@ -327,7 +543,7 @@ def plot_turnovers(df_stats,
         tm = row['Team']
         fig.add_trace(go.Box(x=plot_data_dict[tm]['Line'],
                             y=plot_data_dict[tm]['Turnovers'],
-                            marker_color=graph_colors_dict[tm],
+                            marker_color=graph_colors_dict.get(tm),
                             marker_line_color = "black",
                             name=tm)
                     )
@@ -340,49 +556,36 @@ def plot_turnovers(df_stats,
     return(fig)
 
 def get_season_total_turnovers(df_stats,teams_list):
-    j = 0
-    for tm in teams_list:
-        to_df, _, _ = get_turnover_plot_data(df_stats=df_stats,team=tm)
-        tos = sum(to_df['Turnovers'])
+    ''' Season total of turnovers committed plus turnovers forced, by team
 
-        row = pd.DataFrame.from_dict({"Team":tm,"SeasonTurnovers":tos},orient='index').transpose()
-
-        if j == 0:
-            df_out = row
-        else:
-            df_out = df_out.append(row)
+        Parameters:
+            df_stats         -     the dataframe output from flatten_out_games
+            teams_list       -     list of teams
 
-        j +=1
-    df_out = df_out.reset_index(drop=True)
+        Returns:
+            df_out           -     dataframe with columns Team, SeasonTurnovers
+    '''
+    df_summary = get_team_season_summary(get_team_games(df_stats)).reindex(teams_list)
+    df_out = pd.DataFrame({"Team":list(teams_list),"SeasonTurnovers":df_summary['SeasonTurnovers'].fillna(0).astype(np.int64).to_numpy()})
     return(df_out)
 
-def get_points_plot_data(df_stats=None,team=None):
+def get_points_plot_data(df_stats=None,team=None,team_games=None):
     ''' Obtain goals scored and allowed used for histogram
 
         Parameters:
             df_stats         -     the dataframe output from flatten_out_games
             team             -     a string indicating which team to produce the boxplot data for
+            team_games       -     optional output of get_team_games(df_stats), to avoid rebuilding it for every team
             
         Returns:
             plot_data       -      dataframe used for plotting
     '''
-    o_points_list = []
-    d_points_list = []
-    
-    for i in range(len(df_stats)):
-        df_points_row = df_stats.iloc[i]
-
-        team1 = df_points_row["team1"]
-        team2 = df_points_row["team2"]
-
-        
-        if team1 == team:
-            o_points_list.append(df_points_row["team1_points_scored"])
-            d_points_list.append(df_points_row["team2_points_scored"])
+    if team_games is None:
+        team_games = get_team_games(df_stats)
+    df_team = get_team_rows(team_games, team)
 
-        elif team2 == team:
-            d_points_list.append(df_points_row["team1_points_scored"])
-            o_points_list.append(df_points_row["team2_points_scored"])
+    o_points_list = df_team['points_scored'].tolist()
+    d_points_list = df_team['points_allowed'].tolist()
 
     o_points_count = sum(o_points_list)/len(o_points_list)
     d_points_count = sum(d_points_list)/len(d_points_list)
@@ -406,22 +609,14 @@ def plot_goals(teams_list=None,
         Returns:
             fig              -      plotly figure for plotting
     '''
-    plot_data_dict = {}
-    points_list_o = []
-    points_list_d = []
-    tm_colors = []
-    plus_minus_list = []
-    for tm in teams_list:
-        plot_data_dict[tm],plus_minus = get_points_plot_data(df_stats, team=tm)
-
-        points_list_o.append(plot_data_dict[tm]['Points'][0])
-        points_list_d.append(plot_data_dict[tm]['Points'][1])
-    
-        tm_colors.append(team_col_dict[tm])
-
-        plus_minus_list.append(plus_minus)
-
-    df_plot = pd.DataFrame.from_dict({"Team":teams_list,"GoalsScored":points_list_o,"GoalsAllowed":points_list_d,"PlusMinus":plus_minus_list, "Colors":tm_colors},orient='index').transpose()
+    df_summary = get_team_season_summary(get_team_games(df_stats)).reindex(teams_list)
+    tm_colors = [team_col_dict.get(tm) for tm in teams_list]
+
+    df_plot = pd.DataFrame({"Team":list(teams_list),
+                            "GoalsScored":df_summary['GoalsScored'].to_numpy(),
+                            "GoalsAllowed":df_summary['GoalsAllowed'].to_numpy(),
+                            "PlusMinus":df_summary['PlusMinus'].to_numpy(),
+                            "Colors":tm_colors})
     df_plot = df_plot.sort_values("PlusMinus",ascending=False)
     hover_text = [str(df_plot['Team'].iloc[i]) + " +/- : " + str(df_plot['PlusMinus'].iloc[i]) for i in range(len(df_plot))]
     df_plot['hover_text'] = hover_text
@@ -469,83 +664,195 @@ def plot_goals(teams_list=None,
 
     return(fig)
 
+def get_possession_segments(df_input, game_codes=None):
+    ''' Array part of segment_possessions: where possessions start, which rows they hold and where they are recorded
+
+        Parameters:
+            df_input         -     pandas dataframe of play-by-play stats (rows of each game contiguous, in play-by-play order)
+            game_codes       -     optional integer array (aligned with df_input) labelling the game of each row, codes 0..n_games-1.
+                                   Leave blank to treat df_input as a single game
+
+        Returns:
+            segments         -     dictionary of row-aligned arrays:
+                                    - game_codes, action: the game and Action of each row
+                                    - possession_ids: id of the possession list current at each row (ids increase with the row)
+                                    - members: rows whose action is appended to the current possession list
+                                    - game_start, after_defense, after_turnover: rows opening a new possession list, and why
+                                   and of arrays with one entry per recorded possession, in recording order:
+                                    - event_rows: row at which the possession list is recorded
+                                    - point_scores: (start our, start their, end our, end their) score of its point index
+    '''
+    n = len(df_input)
+    if game_codes is None:
+        game_codes = np.zeros(n, dtype=np.int64)
+    game_codes = np.asarray(game_codes)
+
+    rows = np.arange(n)
+    event_type = df_input['Event Type'].to_numpy(dtype=object)
+    action = df_input['Action'].to_numpy(dtype=object)
+    end_scores = df_input[['Our Score - End of Point','Their Score - End of Point']].to_numpy()
+
+    first = np.ones(n, dtype=bool)
+    first[1:] = game_codes[1:] != game_codes[:-1]
+    last = np.ones(n, dtype=bool)
+    last[:-1] = first[1:]
+
+    prev_action = np.empty(n, dtype=object)
+    prev_action[1:] = action[:-1]
+    prev_action[first] = None
+
+    is_offense = (event_type == 'Offense')
+    is_defense = (event_type == 'Defense')
+    prev_offense = np.zeros(n, dtype=bool)
+    prev_offense[1:] = is_offense[:-1]
+    prev_offense &= ~first
+    prev_defense = np.zeros(n, dtype=bool)
+    prev_defense[1:] = is_defense[:-1]
+    prev_defense &= ~first
+    prev_turnover = (prev_action == 'Drop') | (prev_action == 'Throwaway')
+    not_catch = (action != 'Catch')
+
+    ## Where a new possession list starts, and which rows extend the current one
+    new_after_defense = is_offense & (prev_defense | first)
+    new_after_turnover = is_offense & prev_offense & prev_turnover
+    continued = is_offense & prev_offense & ~prev_turnover
+
+    ## Where the current possession list gets recorded
+    record_new = new_after_defense & ((prev_action == 'D') | (prev_action == 'Throwaway') | (prev_action == 'Goal')) & \
+                 ((action == 'Goal') | (action == 'Throwaway') | (action == 'Drop'))
+    record_offense = (new_after_turnover | continued) & not_catch
+    record_defense = is_defense & prev_offense & (prev_action == 'Catch')
+    record_last = last & ~first & (action == 'Catch')
+
+    ## Point index "beginning||end": the beginning is the end score of the last Goal row before this one in the same game
+    goal_rows = np.maximum.accumulate(np.where(action == 'Goal', rows, -1))
+    prev_goal_rows = np.full(n, -1)
+    prev_goal_rows[1:] = goal_rows[:-1]
+    game_start_rows = np.maximum.accumulate(np.where(first, rows, 0))
+    has_prev_goal = prev_goal_rows >= game_start_rows
+
+    ## Each possession list gets an id; every game also opens with an (empty) list, as get_sequences does
+    possession_ids = np.cumsum(new_after_defense | new_after_turnover | first)
+    members = new_after_defense | new_after_turnover | continued
+
+    record_rows = np.flatnonzero(record_new | record_offense | record_defense)
+    last_rows = np.flatnonzero(record_last)
+    event_rows = np.concatenate([record_rows, last_rows])
+    index_rows = np.concatenate([np.where(record_new[record_rows], record_rows, record_rows - 1), last_rows - 1])
+    order = np.lexsort((np.r_[np.zeros(len(record_rows)), np.ones(len(last_rows))], event_rows))
+    event_rows = event_rows[order]
+    index_rows = index_rows[order]
+
+    ## Scores stay integers
+    point_scores = np.concatenate([np.where(has_prev_goal[index_rows, None], end_scores[prev_goal_rows[index_rows]], 0),
+                                   end_scores[index_rows]], axis=1)
+
+    segments = {'game_codes':game_codes,
+                'action':action,
+                'possession_ids':possession_ids,
+                'members':members,
+                'game_start':first,
+                'after_defense':new_after_defense & ~first,
+                'after_turnover':new_after_turnover,
+                'event_rows':event_rows,
+                'point_scores':point_scores}
+    return(segments)
+
+@profile_stage('sequences', rows=lambda df_input, game_codes=None: len(df_input))
+def segment_possessions(df_input, game_codes=None):
+    ''' Vectorized possession segmenter behind get_sequences
+         - works on whole columns of one or many games at once (shift and cumsum logic, no per-row iloc, see get_possession_segments)
+         - rows of each game must be contiguous and in play-by-play order
+         - reproduces the get_sequences state machine exactly: a possession list starts on the first Offense event after a
+           Defense event (or at the start of a game) and after an offensive Drop/Throwaway, it is recorded under the
+           "start score||end score" point index when the possession ends, and possessions recorded before their last
+           event keep collecting actions (the same list object is shared)
+
+        Parameters:
+            df_input         -     pandas dataframe of play-by-play stats
+            game_codes       -     optional integer array (aligned with df_input) labelling the game of each row, codes 0..n_games-1.
+                                   Leave blank to treat df_input as a single game
+
+        Returns:
+            game_sequences   -     list (indexed by game code) of dictionaries key: point index, value: list of possessions (lists of actions)
+    '''
+    n = len(df_input)
+    if game_codes is None:
+        game_codes = np.zeros(n, dtype=np.int64)
+    game_codes = np.asarray(game_codes)
+    n_games = int(game_codes.max()) + 1 if n > 0 else 0
+    game_sequences = [{} for g in range(n_games)]
+    if n == 0:
+        return(game_sequences)
+
+    segments = get_possession_segments(df_input, game_codes)
+    possession_ids = segments['possession_ids']
+    members = segments['members']
+    event_rows = segments['event_rows']
+
+    member_ids = possession_ids[members]
+    splits = np.flatnonzero(np.diff(member_ids)) + 1
+    possessions = {}
+    if len(member_ids) > 0:
+        for pid, acts in zip(member_ids[np.r_[0, splits]].tolist(), np.split(segments['action'][members], splits)):
+            possessions[pid] = acts.tolist()
+
+    ## The "beginning||end" key is only formatted once per distinct point
+    distinct_scores, point_codes = np.unique(segments['point_scores'], axis=0, return_inverse=True)
+    point_keys = ['{}-{}||{}-{}'.format(*scores) for scores in distinct_scores.tolist()]
+    point_index = [point_keys[code] for code in point_codes.ravel().tolist()]
+
+    for g, pid, kee in zip(game_codes[event_rows].tolist(), possession_ids[event_rows].tolist(), point_index):
+        game_sequences[g].setdefault(kee, []).append(possessions.setdefault(pid, []))
+
+    return(game_sequences)
+
 def get_sequences(df_input):
-    beginning_of_point = '0-0'
-    end_of_point = '0-0'
-    sequences = {}
-    sequences_index = 0
-    sequence = []
-
-    prev_event_type = None
-    current_event_type = None
-    prev_action = None
-
-    for i in range(len(df_input)):
-        record = df_input.iloc[i]
-
-        event_type = record['Event Type']
-        current_event_type = event_type
-
-        end_of_point = str(record['Our Score - End of Point']) + '-' + str(record['Their Score - End of Point'])
-        action = record['Action']
-        passer = record['Passer']
-        reciever = record['Receiver']
-        point_index = beginning_of_point + "||" + end_of_point
-
-        if current_event_type == 'Offense':
-            if prev_event_type == 'Defense' or prev_event_type == None:
-                sequence = []
-                sequence.append(action)
-
-                if (prev_action == 'D' or prev_action == 'Throwaway' or prev_action == 'Goal') and (action == 'Goal' or action == 'Throwaway' or action == 'Drop'):
-
-                    if point_index in sequences.keys():
-                        sequences[point_index].append(sequence)
-                    elif point_index not in sequences.keys():
-                        sequences[point_index] = [sequence]
-
-            elif prev_event_type == 'Offense':
-                if prev_action == "Drop" or prev_action == "Throwaway":
-                    sequence = []
-                    sequence.append(action)
-                    if action != "Catch":
-                        if prev_point_index in sequences.keys():
-                            sequences[prev_point_index].append(sequence)
-                        elif prev_point_index not in sequences.keys():
-                            sequences[prev_point_index] = [sequence]
-                else:
-                    sequence.append(action)
-                    if action != "Catch":
-                        if prev_point_index in sequences.keys():
-                            sequences[prev_point_index].append(sequence)
-                        elif prev_point_index not in sequences.keys():
-                            sequences[prev_point_index] = [sequence]
-
-        if current_event_type == 'Defense':
-            if prev_event_type =='Defense':
-                pass
-
-            elif prev_event_type == 'Offense':
-                if prev_action == "Catch":
-                    if prev_point_index in sequences.keys():
-                        sequences[prev_point_index].append(sequence)
-                    elif prev_point_index not in sequences.keys():
-                        sequences[prev_point_index] = [sequence]
-
-        if action == 'Goal':
-            beginning_of_point = end_of_point
-
-        if i == (len(df_input)-1):
-            if action == 'Catch':
-                if prev_point_index in sequences.keys():
-                    sequences[prev_point_index].append(sequence)
-                elif prev_point_index not in sequences.keys():
-                    sequences[prev_point_index] = [sequence]
-
-        prev_event_type = current_event_type
-        prev_point_index = point_index
-        prev_action = action
-    return(sequences)
+    ''' Split a single game's play-by-play into possessions, grouped by point
+    
+        Parameters:
+            df_input         -     pandas dataframe of a single game's stats (one team's perspective)
+
+        Returns:
+            sequences        -     dictionary key: point index ('our-their score at start||our-their score at end'), value: list of possessions (lists of actions)
+    '''
+    sequences = segment_possessions(df_input)
+    if len(sequences) == 0:
+        return({})
+    return(sequences[0])
+
+def get_season_sequences(teams_dict=None, teams_list=None):
+    ''' Split every game of one or many team seasons into possessions in a single vectorized pass (see segment_possessions)
+         - 'Cessation' events are dropped before segmenting, as in collect_and_plot_passes_nb
+    
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            teams_list       -     optional list of teams to process.  Leave blank for every team in teams_dict
+
+        Returns:
+            team_sequences   -     dictionary key: team, value: dictionary key: 'date | opponent', value: the get_sequences output for that game
+    '''
+    if teams_list is None:
+        teams_list = list(teams_dict.keys())
+
+    cols = ['Date/Time','Opponent','Event Type','Action','Our Score - End of Point','Their Score - End of Point']
+    df_all = pd.concat([teams_dict[tm][cols].assign(Team=tm) for tm in teams_list], ignore_index=True)
+    df_all = df_all[df_all['Event Type'] != 'Cessation']
+
+    game_codes = df_all.groupby(['Team','Date/Time'], sort=False, observed=True).ngroup().to_numpy()
+    order = np.argsort(game_codes, kind='stable')
+    df_all = df_all.iloc[order]
+    game_codes = game_codes[order]
+
+    game_sequences = segment_possessions(df_all, game_codes)
+
+    df_games = df_all.drop_duplicates(['Team','Date/Time'])
+    team_sequences = {tm:{} for tm in teams_list}
+    for g, (tm, d, opponent) in enumerate(zip(df_games['Team'], df_games['Date/Time'], df_games['Opponent'])):
+        kee = str(d) + ' | ' + opponent
+        team_sequences[tm][kee] = game_sequences[g]
+
+    return(team_sequences)
 
 def convert_date_sequences_to_list_and_count(date_sequences):
     list_of_sequences = []
@@ -564,117 +871,103 @@ def convert_date_sequences_to_list_and_count(date_sequences):
 
     return(counts)
 
+def _get_team_sequences(tm, df):
+    date_sequences = get_season_sequences({tm:df}, [tm])[tm]
+    return(date_sequences, convert_date_sequences_to_list_and_count(date_sequences))
+
+@profile_stage('figure', rows=lambda counts, *args, **kwargs: len(counts))
+def build_possession_figure(counts, r, p, color=None, title=None, xaxis_title=None):
+    ''' Produce the figure of the catch count histogram with the fitted negative binomial pmf overlayed
+
+        Parameters:
+            counts           -     list of catch counts (one per possession)
+            r, p             -     negative binomial parameters (see possession_model.fit_possession_model)
+            color            -     bar color
+            title            -     figure title
+            xaxis_title      -     x axis title
+
+        Returns:
+            fig              -      plotly figure for plotting
+    '''
+    x_values_for_barplot, y_values_for_barplot = get_count_histogram(counts)
+    x_values_for_nb, y_values_for_nb = get_nb_pmf_grid(r, p)
+
+    fig = go.Figure( data=[go.Bar(x=x_values_for_barplot, 
+                                  y=y_values_for_barplot,
+                                  marker_color=color,
+                                  marker_line_color = "black",
+                                  name="Passes Completed"
+                                  )
+                           ]
+                   )
+
+    fig.add_trace(go.Scatter(x=x_values_for_nb, 
+                             y=y_values_for_nb,
+                             marker_color="black",
+                             mode='lines',
+                             name='Negative Binomial Approximation'))
+
+    fig.update_layout(title=title,
+                      xaxis_title=xaxis_title,
+                      yaxis_title="Frequency",
+                      boxmode='group',
+                      plot_bgcolor='rgb(220,220,220)'
+                     )
+    return(fig)
+
 def collect_and_plot_passes_nb(teams_list=None,
                                teams_dict=None,
                                plot_output=['single','all'],
-                               teams_col_dict=None):
-    
-    team_sequences = {}
-    dict_of_passing_stats = {}
-    all_sequences = []
-
-    for tm in teams_list:
-        passing_stats = {}
-        df = teams_dict[tm]
-        list_of_dates = set(df['Date/Time'])
-        
-        date_sequences = {}
-        for d in list_of_dates:
-            df_filter = df[df['Date/Time'] == d]
-            df_filter = df_filter[df_filter['Event Type'] != 'Cessation']
-            opponent = df_filter['Opponent'].iloc[0]
-            kee = str(d) + ' | ' + opponent
-            date_sequences[kee] = get_sequences(df_filter)
-        team_sequences[tm] = date_sequences
-        counts = convert_date_sequences_to_list_and_count(date_sequences)
-        all_sequences.extend(counts)
-            
-        x_values_for_barplot = [key for key,group in groupby(counts)]
-        y_values_for_barplot = [i/sum([len(list(group)) for key,group in groupby(counts)]) for i in [len(list(group)) for key,group in groupby(counts)]]
+                               teams_col_dict=None,
+                               method='moments',
+                               backend='serial',
+                               workers=None):
+    ''' Fit the negative binomial model of catches per possession for each team, and plot it
+         - the fitting is done by possession_model; figures are only built for the requested plot_output
 
-        ## (GP) NB Estimation
-        mu = sum(counts) / len(counts)
-        sigma = math.sqrt(sum([(mu - float(i))**2 for i in counts]) / (len([(mu - float(i))**2 for i in counts])-1))
-        r = (mu**2)/(sigma**2 - mu)
-        p = (mu)/(sigma**2)
+        Parameters:
+            teams_list       -     list of teams
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            plot_output      -     'single' to plot every team, 'all' to plot the league-wide fit
+            teams_col_dict   -     dictionary of colors, key: team_name
+            method           -     'moments' or 'mle' fit (see possession_model.fit_possession_model)
+            backend          -     'serial' segments every team in one pass; 'thread' or 'process' segments each team in a pool
+                                   (see team_executor.map_teams).  The outputs are the same for every backend
+            workers          -     pool size for the 'thread' and 'process' backends.  Leave blank for one per CPU
 
-        mean, var, skew, kurt = nbinom.stats(r, p, moments='mvsk')
+        Returns:
+            dict_of_passing_stats  -   dictionary key: team, value: negative binomial fit stats
+            team_sequences         -   dictionary key: team, value: possessions of each game (see get_season_sequences)
+            all_sequences          -   sorted list of the catch counts of every team
+    '''
+    if backend == 'serial':
+        team_sequences = get_season_sequences(teams_dict, teams_list)
+        team_counts = {tm:convert_date_sequences_to_list_and_count(team_sequences[tm]) for tm in teams_list}
+    else:
+        results = map_teams(_get_team_sequences, teams_dict, teams_list, backend=backend, workers=workers)
+        team_sequences = {tm:sequences for tm, (sequences, _) in zip(teams_list, results)}
+        team_counts = {tm:counts for tm, (_, counts) in zip(teams_list, results)}
+    dict_of_passing_stats = fit_team_possession_models(team_counts, method=method, include_league=False)
 
-        passing_stats['nb_probability']=p
-        passing_stats['nb_r']=r
-        passing_stats['avg_passes']=mean
-        passing_stats['var_passes']=sigma**2
-        passing_stats['nb_skew']=skew
-        passing_stats['nb_kurtosis']=kurt
+    all_sequences = []
+    for tm in teams_list:
+        all_sequences.extend(team_counts[tm])
 
-        dict_of_passing_stats[tm] = passing_stats
-        
         if plot_output == 'single':
-            x_values_for_nb = np.arange(nbinom.ppf(0.01, r, p),nbinom.ppf(0.9999, r, p))
-            y_values_for_nb = nbinom.pmf(x_values_for_nb, r, p)
-
-            fig = go.Figure( data=[go.Bar(x=x_values_for_barplot, 
-                                          y=y_values_for_barplot,
-                                          marker_color=teams_col_dict[tm],
-                                          marker_line_color = "black",
-                                          name="Passes Completed"
-                                          )
-                                   ]
-                       )
-
-            fig.add_trace(go.Scatter(x=x_values_for_nb, 
-                                     y=y_values_for_nb,
-                                     marker_color="black",
-                                     mode='lines',
-                                     name='Negative Binomial Approximation'))
-
-            fig.update_layout(title="{}: Catch Counts, with Negative Binomial Estimation".format(tm),
-                              xaxis_title="n Number of Catches",
-                              yaxis_title="Frequency",
-                              boxmode='group',
-                              plot_bgcolor='rgb(220,220,220)'
-                             )
-
-            iplot(fig)
+            r = dict_of_passing_stats[tm]['nb_r']
+            p = dict_of_passing_stats[tm]['nb_probability']
+            iplot(build_possession_figure(team_counts[tm], r, p,
+                                          color=teams_col_dict.get(tm),
+                                          title="{}: Catch Counts, with Negative Binomial Estimation".format(tm),
+                                          xaxis_title="n Number of Catches"))
         
     all_sequences.sort()
     
     if plot_output == 'all':
-        mu_a = sum(all_sequences) / len(all_sequences)
-        sigma_a = math.sqrt(sum([(mu_a - float(i))**2 for i in all_sequences]) / (len([(mu_a - float(i))**2 for i in all_sequences])-1))
-        r_a = (mu_a**2)/(sigma_a**2 - mu_a)    
-        p_a = (mu_a)/(sigma_a**2)
-
-        mean_a, var_a, skew_a, kurt_a = nbinom.stats(r_a, p_a, moments='mvsk')
-        
-        x_values_for_barplot_a = [key for key,group in groupby(all_sequences)]
-        y_values_for_barplot_a = [i/sum([len(list(group)) for key,group in groupby(all_sequences)]) for i in [len(list(group)) for key,group in groupby(all_sequences)]]
-
-        x_values_for_nb_a = np.arange(nbinom.ppf(0.01, r_a, p_a),nbinom.ppf(0.9999, r_a, p_a))
-        y_values_for_nb_a = nbinom.pmf(x_values_for_nb_a, r_a, p_a)
-
-        fig = go.Figure( data=[go.Bar(x=x_values_for_barplot_a, 
-                                      y=y_values_for_barplot_a,
-                                      marker_color="oldlace",
-                                      marker_line_color = "black",
-                                      name="Passes Completed"
-                                      )
-                                ]
-                       )
-
-        fig.add_trace(go.Scatter(x=x_values_for_nb_a, 
-                                 y=y_values_for_nb_a,
-                                 marker_color="black",
-                                 mode='lines',
-                                 name='Negative Binomial Approximation'))
-
-        fig.update_layout(title="League Wide Catch Counts Per Possession, with Negative Binomial Estimation",
-                          xaxis_title="n Number of Catches in a Possession",
-                          yaxis_title="Frequency",
-                          boxmode='group',
-                          plot_bgcolor='rgb(220,220,220)'
-                        )
-
-        iplot(fig)
+        league_stats = fit_possession_model(all_sequences, method=method)
+        iplot(build_possession_figure(all_sequences, league_stats['nb_r'], league_stats['nb_probability'],
+                                      color="oldlace",
+                                      title="League Wide Catch Counts Per Possession, with Negative Binomial Estimation",
+                                      xaxis_title="n Number of Catches in a Possession"))
         
     return(dict_of_passing_stats, team_sequences, all_sequences)
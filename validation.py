@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""validation.py checks and cleans the raw team files once, at load time.
+
+The raw files have known quirks: the 'Tournamemnt' column name, several spellings of the tournament ('AUDL', 'Audl',
+'AUDL 2019', blank), opponents recorded with the wrong case ('Philadelphia phoenix'), 'Anonymous'/'Player'
+placeholder names, a 'Cessastion' event type and pulls without a hang time.  Every rule below is a vectorized
+column operation over a team's frame:
+ - schema: the expected columns are there (a ValueError otherwise), 'Tournamemnt' becomes 'Tournament' and the
+   numeric columns are numeric
+ - labels: tournament, opponent and event type labels are mapped onto one spelling, placeholder names become NaN
+ - whitelists: rows with an unknown Event Type, Action (for the Event Type) or Line are dropped
+ - scores: the end of point scores of a game never go down and move by at most one point per row (reported only)
+ - pulls without a hang time (reported only)
+Each rule that hits a row adds one line to a compact issue report (team, rule, severity, rows hit, first row).
+Cleaned frames are flagged with df.attrs['validated'].  The downstream functions keep their own filters: dropping
+the Cessation rows before segmenting possessions (get_season_sequences) is part of the segmentation, and the cleaned
+frames still hold those rows.
+
+Example:
+        from validation import validate_league, write_issue_report
+        teams_dict, df_issues = validate_league(teams_dict)
+        write_issue_report(df_issues, "reports/issues.csv")
+
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from player_stats import PLACEHOLDER_PLAYERS, PLAYER_COLUMNS
+from possession_table import ACTIONS
+
+EXPECTED_COLUMNS = ['Date/Time', 'Opponent', 'Point Elapsed Seconds', 'Line', 'Our Score - End of Point',
+                    'Their Score - End of Point', 'Event Type', 'Action', 'Passer', 'Receiver', 'Defender', 'Hang Time (secs)']
+NUMERIC_COLUMNS = ['Point Elapsed Seconds', 'Our Score - End of Point', 'Their Score - End of Point', 'Hang Time (secs)']
+SCORE_COLUMNS = ['Our Score - End of Point', 'Their Score - End of Point']
+NAME_COLUMNS = ['Passer', 'Receiver', 'Defender'] + PLAYER_COLUMNS
+
+## Misspelled column names of the raw files -> column name of the cleaned frames
+COLUMN_RENAMES = {'Tournamemnt':'Tournament'}
+## Lower case tournament label -> tournament (blank labels are filled with DEFAULT_TOURNAMENT)
+TOURNAMENT_LABELS = {'audl':'AUDL', 'audl 2019':'AUDL', 'audl west':'AUDL'}
+DEFAULT_TOURNAMENT = 'AUDL'
+EVENT_TYPE_LABELS = {'Cessastion':'Cessation'}
+
+## Actions allowed for each Event Type
+EVENT_ACTIONS = {'Offense':ACTIONS,
+                 'Defense':ACTIONS,
+                 'Cessation':['EndOfFirstQuarter', 'Halftime', 'EndOfThirdQuarter', 'EndOfFourthQuarter', 'EndOfOvertime', 'GameOver']}
+LINES = ['O', 'D']
+
+ISSUE_COLUMNS = ['Team', 'Rule', 'Severity', 'Rows', 'FirstRow', 'Detail']
+
+def add_issue(issues, team, rule, severity, hits, detail=''):
+    ''' Add one line to the issue list if the boolean array hits has any row set
+         - severity is 'fixed' (the rows were corrected), 'dropped' (the rows were removed) or 'warning' (kept as is)
+    '''
+    rows = np.flatnonzero(hits)
+    if len(rows) > 0:
+        issues.append((team, rule, severity, len(rows), int(rows[0]), detail))
+
+def get_score_issues(df):
+    ''' Rows whose end of point score goes down, or up by more than one point, from the previous row of their game
+        (games are the rows sharing Date/Time and Opponent, in row order)
+
+        Returns:
+            decreases        -     boolean array, a score went down
+            jumps            -     boolean array, a score went up by more than one point
+    '''
+    games = df.groupby(['Date/Time', 'Opponent'], sort=False, dropna=False)
+    steps = games[SCORE_COLUMNS].diff().to_numpy()
+    with np.errstate(invalid='ignore'):
+        decreases = (steps < 0).any(axis=1)
+        jumps = (steps > 1).any(axis=1)
+    return(decreases, jumps)
+
+def validate_team_frame(df, team=None, team_names=None):
+    ''' Check and clean one team's season frame (see the module docstring for the rules)
+
+        Parameters:
+            df               -     raw dataframe of a team's season play-by-play stats
+            team             -     team name, used in the issue report
+            team_names       -     canonical team names the Opponent column is mapped onto (ignoring case and extra
+                                   spaces).  Leave blank to keep the opponents as they are
+
+        Returns:
+            df_clean         -     cleaned dataframe, with a new RangeIndex and df_clean.attrs['validated'] set
+            issues           -     list of (Team, Rule, Severity, Rows, FirstRow, Detail) tuples, FirstRow being a
+                                   row position in df
+    '''
+    missing = [column for column in EXPECTED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError("{} is missing the columns {}".format(team or 'frame', missing))
+
+    issues = []
+    df = df.rename(columns=COLUMN_RENAMES).reset_index(drop=True)
+
+    for column in NUMERIC_COLUMNS:
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            values = pd.to_numeric(df[column], errors='coerce')
+            add_issue(issues, team, 'not_numeric', 'fixed', (values.isna() & df[column].notna()).to_numpy(), column)
+            df[column] = values
+
+    if 'Tournament' in df.columns:
+        labels = df['Tournament'].astype(str).str.strip().str.lower()
+        tournament = labels.map(TOURNAMENT_LABELS).where(df['Tournament'].notna(), DEFAULT_TOURNAMENT)
+        tournament = tournament.fillna(df['Tournament'])
+        add_issue(issues, team, 'tournament_label', 'fixed', (tournament != df['Tournament']).to_numpy(dtype=bool))
+        unknown = tournament.ne(DEFAULT_TOURNAMENT).to_numpy(dtype=bool)
+        add_issue(issues, team, 'unknown_tournament', 'warning', unknown, ', '.join(sorted(set(tournament[unknown].astype(str)))))
+        df['Tournament'] = tournament
+
+    if team_names is not None:
+        lookup = {' '.join(tm.split()).lower():tm for tm in team_names}
+        opponent = df['Opponent'].astype(str).str.split().str.join(' ').str.lower().map(lookup).fillna(df['Opponent'])
+        add_issue(issues, team, 'opponent_label', 'fixed', (opponent != df['Opponent']).to_numpy(dtype=bool))
+        df['Opponent'] = opponent
+
+    event_type = df['Event Type'].replace(EVENT_TYPE_LABELS)
+    add_issue(issues, team, 'event_type_label', 'fixed', (event_type != df['Event Type']).to_numpy(dtype=bool))
+    df['Event Type'] = event_type
+
+    name_columns = [column for column in NAME_COLUMNS if column in df.columns]
+    placeholders = df[name_columns].isin(PLACEHOLDER_PLAYERS)
+    add_issue(issues, team, 'placeholder_player', 'fixed', placeholders.any(axis=1).to_numpy())
+    df[name_columns] = df[name_columns].mask(placeholders)
+
+    ## whitelists: unknown rows are dropped
+    event_type = df['Event Type'].to_numpy(dtype=object)
+    known_action = np.zeros(len(df), dtype=bool)
+    for event, actions in EVENT_ACTIONS.items():
+        known_action |= (event_type == event) & df['Action'].isin(actions).to_numpy()
+    known_event = df['Event Type'].isin(list(EVENT_ACTIONS)).to_numpy()
+    known_line = df['Line'].isin(LINES).to_numpy()
+    add_issue(issues, team, 'unknown_event_type', 'dropped', ~known_event)
+    add_issue(issues, team, 'unknown_action', 'dropped', known_event & ~known_action)
+    add_issue(issues, team, 'unknown_line', 'dropped', known_action & ~known_line)
+    keep = known_action & known_line
+
+    decreases, jumps = get_score_issues(df)
+    add_issue(issues, team, 'score_decrease', 'warning', decreases & keep)
+    add_issue(issues, team, 'score_jump', 'warning', jumps & keep)
+
+    no_hang_time = (df['Action'] == 'Pull').to_numpy() & df['Hang Time (secs)'].isna().to_numpy()
+    add_issue(issues, team, 'missing_hang_time', 'warning', no_hang_time & keep)
+
+    df_clean = df[keep].reset_index(drop=True)
+    df_clean.attrs['validated'] = True
+    return(df_clean, issues)
+
+def validate_league(teams_dict, team_names=None):
+    ''' Check and clean every team's frame
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            team_names       -     canonical team names for the Opponent column.  Leave blank for the keys of teams_dict
+
+        Returns:
+            teams_dict       -     new dictionary of the cleaned frames
+            df_issues        -     issue report, one row per (team, rule) with the ISSUE_COLUMNS
+    '''
+    if team_names is None:
+        team_names = list(teams_dict.keys())
+    clean_dict, issues = {}, []
+    for tm, df in teams_dict.items():
+        clean_dict[tm], team_issues = validate_team_frame(df, tm, team_names)
+        issues.extend(team_issues)
+    return(clean_dict, pd.DataFrame(issues, columns=ISSUE_COLUMNS))
+
+def get_issue_summary(df_issues):
+    ''' Rows hit by each rule, over all teams
+    '''
+    return(df_issues.groupby(['Rule', 'Severity'], sort=False)['Rows'].agg(['sum', 'count'])
+           .rename(columns={'sum':'Rows', 'count':'Teams'}).reset_index())
+
+def write_issue_report(df_issues, path):
+    ''' Write an issue report to a .csv or .json file
+    '''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(df_issues.to_dict(orient='records'), f, indent=1, default=str)
+    else:
+        df_issues.to_csv(path, index=False)
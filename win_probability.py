@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""win_probability.py fits a win probability model of the game state and scores every event of the league with it.
+
+The state of an event row, from the perspective of the team whose file it is in:
+ - ScoreDiff: our score minus their score at the start of the point (the score columns hold the end of point score)
+ - HasDisc: +1 on an Offense row (we have the disc), -1 on a Defense row (they have it, or we are pulling)
+ - PointsRemaining: the points left in regulation, estimated from the quarter, the points already played in the
+   quarter and the league average points per quarter (1 in overtime)
+The model is a logistic regression without intercept on ScoreDiff and HasDisc, both as is and divided by
+sqrt(PointsRemaining + 1), so a lead counts more as the game runs out and the two perspectives of a game always add up
+to 1.  It is fit by Newton iterations on every event row of the games with a winner, and scoring is plain array math.
+
+The win probability added (WPA) of a row is the win probability of the next row of the game minus its own, and the
+last row of a game moves the win probability to the final result (1, 0, or 0.5 for a tie).  The state only changes on
+goals and changes of possession, so catches add nothing.
+
+Example:
+        from win_probability import fit_win_probability_model, score_win_probability, get_top_plays
+        model = fit_win_probability_model(teams_dict)
+        df_wp = score_win_probability(model, teams_dict)
+        get_top_plays(df_wp, 'San Jose Spiders', '4/20/2019 0:00')
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from point_table import GAME_COLUMNS, get_league_frame, get_point_ids, get_point_table
+
+FEATURES = ['ScoreDiff', 'HasDisc', 'ScaledScoreDiff', 'ScaledHasDisc']
+STATE_COLUMNS = ['game_id', 'point_id', 'Quarter', 'ScoreDiff', 'HasDisc', 'PointsRemaining', 'Result']
+
+def get_points_per_quarter(df_points):
+    ''' League average number of points per regulation quarter
+    '''
+    regulation = df_points[df_points['Quarter'] <= 4]
+    return(float(regulation.groupby(GAME_COLUMNS + ['Quarter'], sort=False, dropna=False).size().mean()))
+
+def get_game_states(df_league, point_ids=None, df_points=None, points_per_quarter=None):
+    ''' Game state of every event row
+
+        Parameters:
+            df_league          -     dataframe of play-by-play rows with a 'Team' column, in file order
+            point_ids          -     output of point_table.get_point_ids(df_league).  Leave blank to compute it
+            df_points          -     output of point_table.get_point_table(df_league, point_ids).  Leave blank to compute it
+            points_per_quarter -     points per quarter behind PointsRemaining.  Leave blank for the average of df_points
+
+        Returns:
+            df_states          -     dataframe with the STATE_COLUMNS, one row per event row (Cessation rows are left out),
+                                     indexed by the row's position in df_league.  Result is 1 for a win, 0 for a loss and
+                                     0.5 for a tie, from the row's team perspective
+    '''
+    if point_ids is None:
+        point_ids = get_point_ids(df_league)
+    if df_points is None:
+        df_points = get_point_table(df_league, point_ids)
+    if points_per_quarter is None:
+        points_per_quarter = get_points_per_quarter(df_points)
+
+    games = df_points.groupby(GAME_COLUMNS, sort=False, dropna=False)
+    game_ids = games.ngroup().to_numpy()
+    final_diff = (games['EndOurScore'].transform('last') - games['EndTheirScore'].transform('last')).to_numpy()
+    quarter = df_points['Quarter'].to_numpy()
+    played_in_quarter = df_points.groupby(GAME_COLUMNS + ['Quarter'], sort=False, dropna=False).cumcount().to_numpy()
+    remaining = np.where(quarter <= 4,
+                         points_per_quarter * (4 - quarter) + np.maximum(points_per_quarter - played_in_quarter, 1), 1)
+
+    rows = np.flatnonzero(point_ids >= 0)
+    points = point_ids[rows]
+    offense = (df_league['Event Type'].to_numpy(dtype=object)[rows] == 'Offense')
+    df_states = pd.DataFrame({'game_id':game_ids[points],
+                              'point_id':points,
+                              'Quarter':quarter[points],
+                              'ScoreDiff':(df_points['StartOurScore'] - df_points['StartTheirScore']).to_numpy()[points],
+                              'HasDisc':np.where(offense, 1, -1),
+                              'PointsRemaining':remaining[points],
+                              'Result':np.sign(final_diff[points]) / 2 + 0.5},
+                             index=pd.Index(rows, name='row'))
+    return(df_states)
+
+def get_state_features(score_diff, has_disc, points_remaining):
+    ''' Model features (FEATURES) of arrays of game states
+
+        Returns:
+            X                -     (n x len(FEATURES)) float array
+    '''
+    score_diff = np.asarray(score_diff, dtype=float)
+    has_disc = np.asarray(has_disc, dtype=float)
+    scale = 1 / np.sqrt(np.asarray(points_remaining, dtype=float) + 1)
+    return(np.column_stack([score_diff, has_disc, score_diff * scale, has_disc * scale]))
+
+def fit_logistic_regression(X, y, l2=1e-3, max_iter=50, tol=1e-10):
+    ''' Logistic regression without intercept, fit by Newton iterations (ridge penalty l2 on the coefficients)
+
+        Returns:
+            coef             -     array of coefficients, one per column of X
+    '''
+    coef = np.zeros(X.shape[1])
+    for _ in range(max_iter):
+        prob = 1 / (1 + np.exp(-X @ coef))
+        gradient = X.T @ (prob - y) + l2 * coef
+        hessian = (X * (prob * (1 - prob))[:, None]).T @ X + l2 * np.eye(X.shape[1])
+        step = np.linalg.solve(hessian, gradient)
+        coef -= step
+        if np.abs(step).max() < tol:
+            break
+    return(coef)
+
+def fit_win_probability_model(teams_dict=None, df_league=None, df_states=None, l2=1e-3):
+    ''' Fit the win probability model on every event row of the games with a winner
+
+        Parameters:
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+            df_states        -     alternatively, the output of get_game_states
+            l2               -     ridge penalty of the logistic regression
+
+        Returns:
+            model            -     dictionary with the coefficients (coef, in FEATURES order), points_per_quarter,
+                                   and the fit's n_states, n_games, log_loss and accuracy
+    '''
+    if df_states is None:
+        if df_league is None:
+            df_league = get_league_frame(teams_dict)
+        df_league = df_league.reset_index(drop=True)
+        point_ids = get_point_ids(df_league)
+        df_points = get_point_table(df_league, point_ids)
+        points_per_quarter = get_points_per_quarter(df_points)
+        df_states = get_game_states(df_league, point_ids, df_points, points_per_quarter)
+    else:
+        points_per_quarter = None
+
+    decided = df_states[df_states['Result'] != 0.5]
+    X = get_state_features(decided['ScoreDiff'], decided['HasDisc'], decided['PointsRemaining'])
+    y = decided['Result'].to_numpy()
+    coef = fit_logistic_regression(X, y, l2=l2)
+
+    prob = np.clip(1 / (1 + np.exp(-X @ coef)), 1e-12, 1 - 1e-12)
+    model = {'coef':coef,
+             'features':list(FEATURES),
+             'points_per_quarter':points_per_quarter,
+             'n_states':len(decided),
+             'n_games':decided['game_id'].nunique(),
+             'log_loss':float(-np.mean(y * np.log(prob) + (1 - y) * np.log(1 - prob))),
+             'accuracy':float(np.mean((prob > 0.5) == (y == 1)))}
+    return(model)
+
+def predict_win_probability(model, score_diff, has_disc, points_remaining):
+    ''' Win probability of arrays of game states (see get_game_states for their meaning)
+    '''
+    X = get_state_features(score_diff, has_disc, points_remaining)
+    return(1 / (1 + np.exp(-X @ model['coef'])))
+
+def score_win_probability(model, teams_dict=None, df_league=None, df_states=None):
+    ''' Win probability and win probability added of every event row
+
+        Parameters:
+            model            -     output of fit_win_probability_model
+            teams_dict       -     a dictionary that contains key: team_name, value: dataframe of season play-by-play stats
+            df_league        -     alternatively, the concatenated league frame with a 'Team' column
+            df_states        -     alternatively, the output of get_game_states (then the GAME_COLUMNS and play columns
+                                   are not added)
+
+        Returns:
+            df_wp            -     df_states with the GAME_COLUMNS, Line, Event Type, Action, Passer, Receiver and Defender
+                                   of each row, its win probability WP, the WP after the play (WPAfter) and WPA
+    '''
+    if df_states is None:
+        if df_league is None:
+            df_league = get_league_frame(teams_dict)
+        df_league = df_league.reset_index(drop=True)
+        df_states = get_game_states(df_league, points_per_quarter=model['points_per_quarter'])
+        play_columns = GAME_COLUMNS + ['Line', 'Event Type', 'Action', 'Passer', 'Receiver', 'Defender']
+        df_wp = df_league.loc[df_states.index, play_columns].join(df_states)
+    else:
+        df_wp = df_states.copy()
+
+    wp = predict_win_probability(model, df_wp['ScoreDiff'], df_wp['HasDisc'], df_wp['PointsRemaining'])
+    ## a game's rows may be split in several places of a file: follow each game in row order
+    order = np.argsort(df_wp['game_id'].to_numpy(), kind='stable')
+    game_ids = df_wp['game_id'].to_numpy()[order]
+    last = np.r_[game_ids[1:] != game_ids[:-1], True]
+    wp_after = np.empty(len(wp))
+    wp_after[order] = np.where(last, df_wp['Result'].to_numpy()[order], np.r_[wp[order][1:], 0])
+
+    df_wp['WP'] = wp
+    df_wp['WPAfter'] = wp_after
+    df_wp['WPA'] = wp_after - wp
+    return(df_wp)
+
+def get_game_win_probability(df_wp, team, date_time):
+    ''' Win probability curve of one game from a team's perspective (rows of df_wp in play order)
+    '''
+    return(df_wp[(df_wp['Team'] == team) & (df_wp['Date/Time'] == date_time)])
+
+def get_top_plays(df_wp, team, date_time, n=5):
+    ''' The n plays that moved a game's win probability the most (by absolute WPA), for a game recap
+    '''
+    df_game = get_game_win_probability(df_wp, team, date_time)
+    return(df_game.loc[df_game['WPA'].abs().sort_values(ascending=False, kind='stable').index[:n]])